@@ -0,0 +1,45 @@
+# benchmarks/bench_kinship.py (親等クエリエンジンのベンチマーク)
+
+import os
+import sys
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from kakeizu.kinship import KinshipIndex
+from kakeizu.synthetic_koseki import generate_family
+
+SIZES = [1000, 10000, 100000]
+QUERIES = 20000
+SEED = 26
+
+
+def run(n_persons):
+    rng = random.Random(SEED)
+    data = generate_family(n_persons, seed=SEED)
+    persons, relationships = data["persons"], data["relationships"]
+    start = time.perf_counter()
+    index = KinshipIndex(persons, relationships)
+    build_sec = time.perf_counter() - start
+
+    pairs = [(rng.randint(1, n_persons), rng.randint(1, n_persons)) for _ in range(QUERIES)]
+    start = time.perf_counter()
+    for a, b in pairs: index.lca(a, b)
+    lca_sec = time.perf_counter() - start
+    start = time.perf_counter()
+    found = sum(1 for a, b in pairs if index.blood_relation(a, b, max_degree=6))
+    degree_sec = time.perf_counter() - start
+    return {
+        "persons": n_persons,
+        "build_sec": round(build_sec, 4),
+        "lca_us_per_query": round(lca_sec / QUERIES * 1e6, 2),
+        "degree_us_per_query": round(degree_sec / QUERIES * 1e6, 2),
+        "related_within_6": found,
+    }
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or SIZES
+    results = [run(n) for n in sizes]
+    print(json.dumps({"benchmark": "kinship", "results": results}, ensure_ascii=False, indent=2))
@@ -0,0 +1,187 @@
+# benchmarks/bench_layout.py (レイアウト・描画・統合処理のベンチマーク)
+#
+# 使い方:
+#   python benchmarks/bench_layout.py --sizes 10 100 1000 10000 -o bench_results.json
+#   python benchmarks/bench_layout.py --compare old_results.json   # 前回の結果と比較
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from kakeizu.synthetic_koseki import generate_family, split_into_pages, write_pages
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+# 前のサイズでこの秒数を超えたケースは、より大きいサイズでは実行しない
+DEFAULT_BUDGET_SEC = 60.0
+
+
+# --- 各ケースの準備と実行 ---
+# setup(data, workdir) は計測対象外の準備を行い、引数なしで呼べる関数を返す
+
+def case_build_tree(data, workdir):
+    from kakeizu.draw_final_tree import build_tree
+    return lambda: build_tree(data["persons"], data["relationships"])
+
+def case_validate_graph(data, workdir):
+    from kakeizu.graph_validation import validate_graph
+    return lambda: validate_graph(data["persons"], data["relationships"])
+
+def case_calculate_layout(data, workdir):
+    from kakeizu.draw_final_tree import build_tree, calculate_layout
+    nodes = build_tree(data["persons"], data["relationships"])
+    return lambda: calculate_layout(nodes)
+
+def case_draw_tree(data, workdir):
+    from kakeizu.draw_final_tree import build_tree, calculate_layout, draw_tree
+    nodes = build_tree(data["persons"], data["relationships"])
+    positions = calculate_layout(nodes)
+    return lambda: draw_tree(nodes, positions, os.path.join(workdir, "tree.png"))
+
+def case_graphviz_layout(data, workdir):
+    from kakeizu.generate_final_tree import create_graph_from_json, get_hierarchical_layout
+    json_path = os.path.join(workdir, "merged.json")
+    with open(json_path, "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False)
+    graph, _ = create_graph_from_json(json_path)
+    def run():
+        if get_hierarchical_layout(graph) is None: raise RuntimeError("Graphvizによるレイアウトに失敗しました")
+    return run
+
+def case_visualize_layout(data, workdir):
+    from kakeizu.visualize_tree import FamilyTree, Person, Relationship, FamilyTreeVisualizer
+    tree = FamilyTree()
+    for p in data["persons"]: tree.add_person(Person(**p))
+    for r in data["relationships"]: tree.add_relationship(Relationship(r["source"], r["target"], r["type"]))
+    visualizer = FamilyTreeVisualizer(tree)
+    return visualizer._hierarchical_layout
+
+def case_focus_subtree(data, workdir):
+    from kakeizu.subtree import FamilyGraph
+    graph = FamilyGraph(data["persons"], data["relationships"])
+    p_id = data["persons"][len(data["persons"]) // 2]["id"]
+    return lambda: graph.subgraph(graph.focus(p_id, up=2, down=3))
+
+def case_clip_layout(data, workdir):
+    from kakeizu.draw_final_tree import build_tree, calculate_layout
+    from kakeizu.subtree import SpatialIndex, clip_layout
+    positions = calculate_layout(build_tree(data["persons"], data["relationships"]))
+    index = SpatialIndex(positions)
+    cx, cy = positions[data["persons"][len(data["persons"]) // 2]["id"]]
+    return lambda: clip_layout(positions, (cx - 1000, cy - 600, cx + 1000, cy + 600), index)
+
+def case_merge_pages(data, workdir):
+    from kakeizu.page_merge import merge_page_files
+    paths = write_pages(split_into_pages(data), os.path.join(workdir, "pages"))
+    return lambda: merge_page_files(paths)
+
+def case_external_merge(data, workdir):
+    from kakeizu.external_merge import merge_page_files_external
+    paths = write_pages(split_into_pages(data), os.path.join(workdir, "pages"))
+    return lambda: merge_page_files_external(paths, os.path.join(workdir, "merged.json"))
+
+CASES = {
+    "draw_final_tree.build_tree": case_build_tree,  # graph_validation の検査を含む
+    "graph_validation.validate_graph": case_validate_graph,
+    "draw_final_tree.calculate_layout": case_calculate_layout,
+    "draw_final_tree.draw_tree": case_draw_tree,
+    "generate_final_tree.get_hierarchical_layout": case_graphviz_layout,
+    "visualize_tree._hierarchical_layout": case_visualize_layout,
+    "subtree.focus_subgraph": case_focus_subtree,
+    "subtree.clip_layout": case_clip_layout,
+    "page_merge.merge_page_files": case_merge_pages,  # process_and_synthesize の統合処理
+    "external_merge.merge_page_files_external": case_external_merge,  # ページが多いときの統合処理
+}
+
+
+def measure(setup, data, memory=True):
+    """1ケースを実行し、経過時間と（必要なら）tracemallocのピークメモリを返す"""
+    workdir = tempfile.mkdtemp(prefix="kakeizu_bench_")
+    try:
+        result = {}
+        func = setup(data, workdir)
+        start = time.perf_counter()
+        func()
+        result["seconds"] = round(time.perf_counter() - start, 6)
+        if memory:
+            func = setup(data, workdir)
+            tracemalloc.start()
+            try:
+                func()
+                result["peak_kib"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            finally:
+                tracemalloc.stop()
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(sizes, cases, seed=0, memory=True, budget=DEFAULT_BUDGET_SEC):
+    results, over_budget = [], set()
+    for n in sizes:
+        data = generate_family(n, seed=seed)
+        for name in cases:
+            entry = {"case": name, "persons": n}
+            if name in over_budget:
+                entry["skipped"] = f"前のサイズで{budget}秒を超えたため省略"
+            else:
+                try:
+                    entry.update(measure(CASES[name], data, memory=memory))
+                    if entry["seconds"] > budget: over_budget.add(name)
+                except RecursionError:
+                    entry["error"] = "RecursionError"; over_budget.add(name)
+                except Exception as e:
+                    entry["error"] = f"{type(e).__name__}: {e}"
+            print(f"  {name:<45} n={n:<7} {entry.get('seconds', entry.get('error') or entry.get('skipped'))}", file=sys.stderr)
+            results.append(entry)
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "seed": seed,
+        "results": results,
+    }
+
+
+def compare(old_path, new_report):
+    """前回の結果と比べて、各ケースの所要時間の比（新/旧）を表示する"""
+    with open(old_path, "r", encoding="utf-8") as f: old = json.load(f)
+    old_times = {(r["case"], r["persons"]): r.get("seconds") for r in old["results"]}
+    print(f"比較: {old.get('commit')} -> {new_report.get('commit')}")
+    for r in new_report["results"]:
+        before, after = old_times.get((r["case"], r["persons"])), r.get("seconds")
+        if before and after:
+            print(f"  {r['case']:<45} n={r['persons']:<7} {before:>10.4f}s -> {after:>10.4f}s  x{after / before:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="レイアウト・描画・統合処理の所要時間とメモリを計測します。")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="tracemallocによるメモリ計測を省略します")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SEC)
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--compare", help="比較対象とする以前の結果JSON")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.cases, seed=args.seed, memory=not args.no_memory, budget=args.budget)
+    with open(args.output, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ 計測結果を '{args.output}' に保存しました。")
+    if args.compare: compare(args.compare, report)
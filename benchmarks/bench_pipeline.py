@@ -0,0 +1,95 @@
+# benchmarks/bench_pipeline.py (偽クライアントによるOCR→LLMパイプラインのスループット計測)
+#
+# Google Cloudに接続せず、fake_clients.py の偽クライアントで main.process_document と
+# synthesize.synthesize_with_ai を実行し、ページ/秒と各APIの遅延分布を計測する。
+# pdf2image（poppler）と requirements.txt のパッケージは必要だが、認証情報は不要。
+#
+#   python benchmarks/bench_pipeline.py --pages 20 --llm-latency lognormal:0.8,0.4 --rate-limit-rate 0.05
+#   python benchmarks/bench_pipeline.py --http    # ローカルHTTPサーバー経由で呼び出す
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from kakeizu.fake_clients import (FakeVisionClient, FakeGenerativeModel, HttpVisionClient, HttpGenerativeModel, CallRecorder,
+                          render_page_text, start_server, DEFAULT_VISION_LATENCY, DEFAULT_LLM_LATENCY)
+from kakeizu.synthetic_koseki import generate_family, split_into_pages
+
+
+def make_pdf(path, n_pages):
+    """ページ数だけを合わせた、中身のない検証用PDFを作る"""
+    from PIL import Image
+    pages = [Image.new("RGB", (1240, 1754), "white") for _ in range(n_pages)]
+    pages[0].save(path, "PDF", save_all=True, append_images=pages[1:], resolution=150)
+
+
+def run(args):
+    from kakeizu.main import process_document
+    from kakeizu.synthesize import synthesize_with_ai
+
+    pages = split_into_pages(generate_family(args.persons, seed=args.seed), seed=args.seed)[:args.pages]
+    texts = [render_page_text(p) for p in pages]
+    recorder = CallRecorder()
+    vision_client = FakeVisionClient(texts, args.vision_latency, args.error_rate, args.rate_limit_rate, args.seed, recorder)
+    model = FakeGenerativeModel("gemini-1.5-pro", args.llm_latency, args.error_rate, args.rate_limit_rate, args.seed,
+                                recorder, tokens_per_sec=args.tokens_per_sec)
+    server = None
+    if args.http:
+        server, url = start_server(vision_client, [model])
+        vision_client, model = HttpVisionClient(url), HttpGenerativeModel(url)
+
+    workdir = tempfile.mkdtemp(prefix="kakeizu_pipeline_")
+    try:
+        pdf_path, pages_dir = os.path.join(workdir, "input.pdf"), os.path.join(workdir, "pages")
+        os.makedirs(pages_dir)
+        make_pdf(pdf_path, len(texts))
+
+        start = time.perf_counter()
+        process_document(pdf_path, pages_dir, vision_client=vision_client, model=model, pack=not args.no_pack)
+        pages_sec = time.perf_counter() - start
+        saved = len([f for f in os.listdir(pages_dir) if f.endswith("_data.json")])
+
+        start = time.perf_counter()
+        synthesize_with_ai(pages_dir, os.path.join(workdir, "merged.json"), model=model)
+        synth_sec = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if server: server.shutdown()
+
+    return {
+        "pages": len(texts),
+        "pages_saved": saved,
+        "process_document_sec": round(pages_sec, 3),
+        "pages_per_sec": round(len(texts) / pages_sec, 3) if pages_sec else None,
+        "synthesize_sec": round(synth_sec, 3),
+        "transport": "http" if args.http else "in-process",
+        "packing": not args.no_pack,
+        "apis": recorder.summary(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="偽クライアントでOCR→LLMパイプライン全体のスループットを計測します。")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--persons", type=int, default=300, help="ページ生成に使う架空の家系の人数")
+    parser.add_argument("--vision-latency", default=DEFAULT_VISION_LATENCY)
+    parser.add_argument("--llm-latency", default=DEFAULT_LLM_LATENCY)
+    parser.add_argument("--tokens-per-sec", type=float, default=None, help="LLMの出力速度（応答長に比例した遅延を加える）")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--http", action="store_true", help="ローカルHTTPの偽サーバー経由で呼び出します")
+    parser.add_argument("--no-pack", action="store_true", help="短いページをまとめずに1ページずつLLMに送ります（比較用）")
+    parser.add_argument("-o", "--output", help="結果JSONの保存先（省略時は標準出力）")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: f.write(report)
+    else:
+        print(report)
@@ -0,0 +1,79 @@
+# benchmarks/bench_startup.py (CLIの起動時間と、読み込まれる重いモジュールの確認)
+#
+# 使い方:
+#   python benchmarks/bench_startup.py --repeat 10
+#   python benchmarks/bench_startup.py -o startup.json
+#
+# 各コマンドを別プロセスで repeat 回起動し、経過時間の中央値と最小値を出す。
+# あわせて、そのコマンドで読み込まれた重いモジュール（Google Cloud・networkx・matplotlib など）を表示する。
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from kakeizu.synthetic_koseki import generate_family
+
+HEAVY_MODULES = ("google.cloud.vision", "vertexai", "pdf2image", "networkx", "matplotlib", "PIL")
+
+# 起動したプロセスの終了時に、読み込まれた重いモジュールを標準エラーの最終行に出す
+_PROBE = ("import sys, runpy, atexit, json\n"
+          "atexit.register(lambda: sys.stderr.write('\\n' + json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)) + '\\n'))\n"
+          "sys.argv = {argv!r}\n"
+          "try: runpy.run_module({module!r}, run_name='__main__', alter_sys=True)\n"
+          "except SystemExit: pass\n")
+
+
+def commands(workdir):
+    merged = os.path.join(workdir, "merged.json")
+    with open(merged, "w", encoding="utf-8") as f: json.dump(generate_family(200), f, ensure_ascii=False)
+    cli = "kakeizu.cli"
+    return {
+        "kakeizu --help": (cli, ["--help"]),
+        "kakeizu parse --help": (cli, ["parse", "--help"]),
+        "kakeizu layout": (cli, ["layout", "-i", merged, "-o", os.path.join(workdir, "layout.json")]),
+        "kakeizu render --engine pil": (cli, ["render", "-i", merged, "-o", os.path.join(workdir, "tree.png")]),
+        "koseki_analyzer（引数なし）": ("kakeizu.koseki_analyzer", []),
+    }
+
+
+def run_once(module, argv):
+    code = _PROBE.format(heavy=HEAVY_MODULES, argv=[module] + argv, module=module)
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    lines = completed.stderr.strip().splitlines()
+    loaded = json.loads(lines[-1]) if lines and lines[-1].startswith("[") else None
+    return elapsed, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLIの起動時間を計測します。")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="kakeizu_bench_") as workdir:
+        for label, (module, argv) in commands(workdir).items():
+            times, loaded = [], None
+            for _ in range(args.repeat):
+                elapsed, loaded = run_once(module, argv)
+                times.append(elapsed)
+            results[label] = {"median_sec": round(statistics.median(times), 4), "min_sec": round(min(times), 4), "heavy_modules": loaded}
+            print(f"{label:<34} 中央値 {results[label]['median_sec']:.3f}s  最小 {results[label]['min_sec']:.3f}s  "
+                  f"重いモジュール: {', '.join(loaded) if loaded else 'なし' if loaded is not None else '不明'}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"結果を '{args.output}' に保存しました。")
+
+
+if __name__ == "__main__":
+    main()
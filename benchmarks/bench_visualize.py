@@ -0,0 +1,78 @@
+# benchmarks/bench_visualize.py (visualize_tree の描画方式の比較)
+#
+# 使い方:
+#   python benchmarks/bench_visualize.py --sizes 1000 10000
+#   python benchmarks/bench_visualize.py --sizes 1000 --modes fast -o bench_visualize.json
+#
+# 同じレイアウトを visualize_basic（networkx の描画関数・32×24インチ・200dpi）と
+# visualize_fast（Collection・レイアウトに合わせた図の大きさ・Agg）で描いてPNGに保存し、
+# 描画と保存の時間、PNGのサイズを比べる。
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from kakeizu.synthetic_koseki import generate_family
+
+import matplotlib
+matplotlib.use("Agg")  # visualize_basic も GUI なしで比べる
+
+
+def build_visualizer(data):
+    from kakeizu.visualize_tree import FamilyTree, Person, Relationship, FamilyTreeVisualizer
+    tree = FamilyTree()
+    for p in data["persons"]: tree.add_person(Person(**p))
+    for r in data["relationships"]: tree.add_relationship(Relationship(r["source"], r["target"], r["type"]))
+    return FamilyTreeVisualizer(tree)
+
+
+def render_basic(visualizer, pos, path):
+    import matplotlib.pyplot as plt
+    visualizer._hierarchical_layout = lambda: pos  # レイアウトの時間は含めない
+    fig = visualizer.visualize_basic()
+    fig.savefig(path, bbox_inches='tight', dpi=200)
+    plt.close(fig)
+
+def render_fast(visualizer, pos, path):
+    visualizer.visualize_fast(pos).savefig(path)
+
+MODES = {"basic": render_basic, "fast": render_fast}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="visualize_tree の描画時間を計測します。")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="kakeizu_bench_") as workdir:
+        for n in args.sizes:
+            visualizer = build_visualizer(generate_family(n, seed=args.seed))
+            pos = visualizer._hierarchical_layout()
+            for mode in args.modes:
+                path = os.path.join(workdir, f"{mode}_{n}.png")
+                start = time.perf_counter()
+                MODES[mode](visualizer, pos, path)
+                elapsed = time.perf_counter() - start
+                results.append({"mode": mode, "n": n, "seconds": round(elapsed, 3), "png_bytes": os.path.getsize(path)})
+                print(f"  {mode:<6} n={n:<7} {elapsed:8.2f}秒  PNG {os.path.getsize(path) / 1024:,.0f}KB")
+
+    for n in args.sizes:
+        times = {r["mode"]: r["seconds"] for r in results if r["n"] == n}
+        if "basic" in times and "fast" in times and times["fast"]:
+            print(f"n={n}: visualize_fast は visualize_basic の {times['basic'] / times['fast']:.1f}倍の速さ")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: json.dump({"results": results}, f, ensure_ascii=False, indent=2)
+        print(f"✅ 計測結果を '{args.output}' に保存しました。")
+
+
+if __name__ == "__main__":
+    main()
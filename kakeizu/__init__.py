@@ -0,0 +1,4 @@
+# __init__.py (戸籍解析・家系図生成パッケージ)
+#
+# 各機能はモジュールごとに読み込む（例: from kakeizu.kinship import KinshipIndex）。
+# 重い依存（Google Cloud・networkx・matplotlib など）は使う関数の中で読み込むため、ここでは何も読み込まない。
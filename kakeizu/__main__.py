@@ -0,0 +1,7 @@
+# __main__.py (python -m kakeizu で統合コマンドを実行する)
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,192 @@
+# call_controller.py (Vertex AI / Vision API 呼び出しの流量制御とリトライ)
+#
+# - トークンバケット: APIごと・モデルごとの毎秒リクエスト数の上限（クォータ）を守る
+# - AIMD: 成功が続けば同時実行数を少しずつ増やし、429が返れば半分に減らす
+# - リトライ: 一時的なエラーはジッター付きの指数バックオフで、期限内に限り再試行する
+#
+#   from call_controller import get_controller
+#   response = get_controller().call("vertex", model.generate_content, prompt, model="gemini-1.5-pro", page=3)
+
+import time
+import random
+import threading
+
+from . import instrumentation
+
+# API・モデルごとの既定の上限（毎秒リクエスト数, バースト, 最大同時実行数）
+# Gemini 1.5 Pro の既定クォータは 60 RPM、Vision API は 1800 RPM
+# モデルを指定した呼び出しは API とモデルの両方のバケットを通るので、API の上限はモデルごとの上限の合計にする
+# （小さいと、どのモデルもモデルごとの上限まで使えない）
+DEFAULT_LIMITS = {
+    "vision": (25.0, 10, 16),
+    "vertex": (4.0, 8, 12),
+    "vertex:gemini-1.5-pro": (1.0, 2, 4),
+    "vertex:gemini-1.5-flash": (3.0, 6, 8),
+}
+DEFAULT_DEADLINES = {"vision": 120.0, "vertex": 600.0}
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+                   "InternalServerError", "GatewayTimeout", "Aborted", "RetryError"}
+
+
+def _status_code(exc):
+    code = getattr(exc, "code", None)
+    if callable(code):
+        try: code = code()
+        except Exception: return None
+    return code if isinstance(code, int) else None
+
+
+def is_rate_limited(exc):
+    """429 / ResourceExhausted（クォータ超過）かどうか"""
+    return _status_code(exc) == 429 or type(exc).__name__ in ("ResourceExhausted", "TooManyRequests") \
+        or str(exc).lstrip().startswith("429")
+
+
+def is_retryable(exc):
+    """時間をおけば成功する可能性のあるエラーかどうか"""
+    return is_rate_limited(exc) or _status_code(exc) in RETRYABLE_CODES \
+        or type(exc).__name__ in RETRYABLE_NAMES or isinstance(exc, (TimeoutError, ConnectionError))
+
+
+class TokenBucket:
+    """毎秒 rate 個ずつトークンが補充され、最大 capacity 個まで貯められるバケット"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate, self.capacity = float(rate), float(capacity or max(1.0, rate))
+        self.tokens, self.updated = self.capacity, time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1; return
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise TimeoutError("レート制限の待ち時間が期限を超えました")
+            time.sleep(wait)
+
+    def refund(self):
+        """acquire で取ったトークンを返す（呼び出しをしなかったとき）"""
+        with self._lock: self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class AimdLimiter:
+    """
+    同時実行数の上限を AIMD（加算的増加・乗算的減少）で調整する。
+    成功するたびに上限を 1/上限 ずつ増やし（およそ一巡で+1）、429のたびに backoff 倍にする。
+    429が立て続けに返っても、cooldown 秒に一度しか減らさない。
+    """
+
+    def __init__(self, maximum, initial=2, minimum=1, backoff=0.5, cooldown=2.0):
+        self.maximum, self.minimum, self.backoff, self.cooldown = maximum, minimum, backoff, cooldown
+        self.limit = float(min(initial, maximum))
+        self.in_flight, self._last_decrease = 0, 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline=None):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("同時実行枠の待ち時間が期限を超えました")
+                self._cond.wait(remaining)
+            self.in_flight += 1
+
+    def release(self, outcome):
+        """outcome: "ok"（成功）/ "throttled"（429）/ "error"（その他の失敗）/ "cancelled"（呼ばなかった）"""
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "throttled":
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.backoff); self._last_decrease = now
+            elif outcome == "ok":
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class CallController:
+    """API呼び出しをトークンバケット・AIMD・リトライで包む。スレッドから共有して使う"""
+
+    def __init__(self, limits=None, deadlines=None, max_attempts=6, base_delay=1.0, max_delay=60.0):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.deadlines = dict(DEFAULT_DEADLINES, **(deadlines or {}))
+        self.max_attempts, self.base_delay, self.max_delay = max_attempts, base_delay, max_delay
+        self._buckets, self._limiters = {}, {}
+        self._lock = threading.Lock()
+
+    def _limits_for(self, key):
+        return self.limits.get(key) or self.limits.get(key.split(":")[0]) or (1.0, 1, 1)
+
+    def _bucket(self, key):
+        with self._lock:
+            if key not in self._buckets:
+                rate, burst, _ = self._limits_for(key)
+                self._buckets[key] = TokenBucket(rate, burst)
+            return self._buckets[key]
+
+    def _limiter(self, key):
+        with self._lock:
+            if key not in self._limiters:
+                self._limiters[key] = AimdLimiter(self._limits_for(key)[2])
+            return self._limiters[key]
+
+    def concurrency(self, api, model=None):
+        """現在の同時実行数の上限（状態の確認用）"""
+        return self._limiter(f"{api}:{model}" if model else api).limit
+
+    def call(self, api, fn, *args, model=None, page=None, deadline_sec=None, **kwargs):
+        """
+        fn(*args, **kwargs) を流量制御付きで呼ぶ。一時的なエラーは期限まで再試行し、
+        それでも失敗した場合は最後の例外をそのまま送出する。
+        """
+        key = f"{api}:{model}" if model else api
+        buckets = [self._bucket(api)] + ([self._bucket(key)] if model else [])
+        limiter = self._limiter(key)
+        deadline = time.monotonic() + (deadline_sec or self.deadlines.get(api, 300.0))
+        attempt = 0
+        while True:
+            attempt += 1
+            # 同時実行枠を先に取り、トークンは呼び出す直前に取る。トークンを待つ間に期限が来たら、
+            # 取ったトークンと枠を返す（呼ばなかった呼び出しでクォータを減らさない）
+            limiter.acquire(deadline)
+            taken = []
+            try:
+                for bucket in buckets: bucket.acquire(deadline); taken.append(bucket)
+            except TimeoutError:
+                for bucket in taken: bucket.refund()
+                limiter.release("cancelled"); raise
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_rate_limited(e)
+                limiter.release("throttled" if throttled else "error")
+                if throttled: instrumentation.count("rate_limited")
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                if throttled: delay = max(delay, self.base_delay)
+                if not is_retryable(e) or attempt >= self.max_attempts or time.monotonic() + delay > deadline:
+                    raise
+                instrumentation.count("retries")
+                if page is not None: instrumentation.record_page(page, retries=1)
+                print(f"  - {key} の呼び出しに失敗したため {delay:.1f}秒後に再試行します（{attempt}回目）: {type(e).__name__}")
+                time.sleep(delay)
+                continue
+            limiter.release("ok")
+            return result
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    """プロセス全体で共有する CallController"""
+    global _controller
+    with _controller_lock:
+        if _controller is None: _controller = CallController()
+        return _controller
@@ -0,0 +1,306 @@
+# cli.py (戸籍解析・家系図生成の統合コマンド)
+#
+#   kakeizu ocr input/A.pdf -o output/A.txt            # OCRのみ（--backend vision / tesseract / local-first）
+#   kakeizu parse input/A.pdf                          # OCR → ページごとのLLM解析（output/pages）
+#   kakeizu synthesize [--ai]                          # ページごとの結果を統合（既定は氏名による名寄せ）
+#   kakeizu synthesize --incremental                   # 新しい除籍のページだけを既存の統合データに追加
+#   kakeizu validate                                   # 循環・存在しないIDなどの関係性を隔離して統合データを修復
+#   kakeizu kinship 山田太郎 12                          # 人物A（IDまたは氏名）から見た人物Bの親等と続柄
+#   kakeizu heirs [山田太郎]                             # 法定相続人と相続分の判定（省略時は死亡者全員分）
+#   kakeizu layout -o output/layout.json               # 家系図のレイアウト計算のみ
+#   kakeizu render [--engine pil|graphviz|network]     # 家系図の画像を描画
+#   kakeizu render --focus 山田太郎 --up 1 --down 3     # 一人を中心にした部分だけを描画（--viewport で範囲指定も）
+#   kakeizu batch input/A.pdf                          # parse → synthesize → render をまとめて実行
+#   kakeizu serve --port 8765                          # 常駐してHTTPでジョブを受け付ける（service.py）
+#
+# 起動を速くするため、Google Cloud・vertexai・pdf2image・networkx・matplotlib・PIL は
+# それぞれを使うサブコマンドの中で初めて読み込む。
+
+import os
+import sys
+import json
+import argparse
+
+PAGES_DIR = "output/pages"
+MERGED_JSON_PATH = "output/family_tree_merged.json"
+LAYOUT_JSON_PATH = "output/family_tree_layout.json"
+HEIRS_JSON_PATH = "output/heirs.json"
+IMAGE_PATHS = {"pil": "output/family_tree_professional.png", "graphviz": "output/family_tree_final.png",
+               "network": "output/family_tree_network.png"}
+
+
+def _load_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f: return json.load(f)
+    except FileNotFoundError:
+        print(f"エラー: '{path}' が見つかりません。先に 'parse' と 'synthesize' を実行してください。"); return None
+
+
+def cmd_ocr(args):
+    from .ocr_processor import get_document_text
+    from .ocr_backends import get_backend
+    text = get_document_text(args.pdf, backend=get_backend(args.backend))
+    if text is None: return 1
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f: f.write(text)
+        print(f"✅ OCR結果を '{args.output}' に保存しました。")
+    else:
+        print(text)
+    return 0
+
+
+def cmd_parse(args):
+    from dotenv import load_dotenv
+    from .main import process_document
+    from .cloud_clients import get_model, get_ocr_backend
+    from .model_router import get_router
+
+    load_dotenv()
+    try:
+        ocr_backend = get_ocr_backend(args.backend)
+        # model=None ならページごとに model_router が高速モデルと高精度モデルを選ぶ
+        model = get_model() if args.no_routing else None
+        if model is None: get_router().warm_up()
+    except Exception as e:
+        print(f"Google Cloud・OCRエンジンの初期化に失敗: {e}"); return 1
+    manifest = process_document(args.pdf, args.pages_dir, ocr_backend=ocr_backend, model=model,
+                                pack=not args.no_pack, triage=not args.no_triage, segment=not args.no_segment,
+                                adaptive_dpi=not args.fixed_dpi, reocr=not args.no_reocr)
+    if manifest is None: return 1
+    print("\n全ページの解析が完了しました。")
+    return 1 if any(entry["status"] == "failed" for entry in manifest.values()) else 0
+
+
+def cmd_synthesize(args):
+    if args.ai:
+        from .synthesize import synthesize_with_ai
+        return 0 if synthesize_with_ai(args.pages_dir, args.output) else 1
+    from .page_merge import list_page_files, merge_into
+    from .external_merge import write_merged
+    json_files = list_page_files(args.pages_dir)
+    if not json_files:
+        print(f"エラー: '{args.pages_dir}' に解析済みJSONファイルが見つかりません。"); return 1
+    if args.incremental:
+        stats = merge_into(args.output, json_files)
+        print(f"✅ '{args.output}' に追加しました（ページ {stats['page_files']} 件・統合済みで省略 {stats['skipped_files']} 件、"
+              f"新しい人物 {stats['new_persons']} 人・関係性 {stats['new_relationships']} 件、保留中の関係性 {stats['pending_relationships']} 件、"
+              f"氏名が一致せず統合できない関係性 {stats['unresolvable_relationships']} 件）。")
+        return 0
+    stats = write_merged(json_files, args.output)
+    print(f"✅ データ統合完了。人物 {stats['persons']} 人のデータを '{args.output}' に保存しました。")
+    return 0
+
+
+def cmd_validate(args):
+    from .graph_validation import validate_file, summarize, report_path
+    report = validate_file(args.input, args.output)
+    if report is None: return 1
+    output = args.output or args.input
+    for item in report["quarantined"]:
+        print(f"  - {item['reason']}: {item['relationship']}")
+    print(f"✅ {summarize(report) or '問題のある関係性はありませんでした。'} 報告を '{report_path(output)}' に保存しました。")
+    return 0
+
+
+def cmd_kinship(args):
+    from .kinship import KinshipIndex
+    data = _load_json(args.input)
+    if data is None: return 1
+    index = KinshipIndex(data.get("persons", []), data.get("relationships", []))
+    a, b = index.find_person(args.person_a), index.find_person(args.person_b)
+    for query, p_id in ((args.person_a, a), (args.person_b, b)):
+        if p_id is None: print(f"エラー: 人物 '{query}' が見つかりません。"); return 1
+    print(index.format_relation(a, b, index.relation(a, b)))
+    return 0
+
+
+def cmd_heirs(args):
+    from .heirs import HeirEngine, export_json
+    data = _load_json(args.input)
+    if data is None: return 1
+    engine = HeirEngine(data.get("persons", []), data.get("relationships", []))
+    if args.person is None:
+        results = engine.determine_all()
+        print(f"死亡者 {len(results)} 人分の法定相続人を判定しました。")
+    else:
+        p_id = engine.find_person(args.person)
+        if p_id is None: print(f"エラー: 人物 '{args.person}' が見つかりません。"); return 1
+        results = [engine.determine(p_id)]
+        for heir in results[0]["heirs"]:
+            print(f"  - {heir['name']} ({heir['relation']}): {heir['share']}")
+        for warning in results[0]["warnings"]: print(f"  ※ {warning}")
+        if not args.no_image:
+            image_path = args.image or os.path.join(os.path.dirname(args.output) or ".", f"heirs_{p_id}.png")
+            engine.render(results[0], image_path)
+    export_json(results, args.output)
+    print(f"✅ 判定結果を '{args.output}' に保存しました。")
+    return 0
+
+
+def cmd_layout(args):
+    from .draw_final_tree import build_tree, calculate_layout
+    data = _load_json(args.input)
+    if data is None: return 1
+    positions = calculate_layout(build_tree(data["persons"], data["relationships"]))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"positions": {str(p_id): [x, y] for p_id, (x, y) in positions.items()}}, f, ensure_ascii=False)
+    print(f"✅ {len(positions)}人分のレイアウトを '{args.output}' に保存しました。")
+    return 0
+
+
+def load_layout(path, nodes):
+    """layout コマンドで保存した座標を、ノードのIDに対応付けて読み込む"""
+    saved = _load_json(path)
+    if saved is None: return None
+    ids = {str(p_id): p_id for p_id in nodes}
+    return {ids[k]: tuple(v) for k, v in saved["positions"].items() if k in ids}
+
+
+def cmd_render(args):
+    output = args.output or IMAGE_PATHS[args.engine]
+    if args.engine != "pil" and (args.focus is not None or args.viewport):
+        print("エラー: --focus と --viewport は --engine pil でのみ使えます。"); return 1
+    if args.engine == "graphviz":
+        from .koseki_analyzer import draw_final_tree
+        draw_final_tree(args.input, output); return 0
+    if args.engine == "network":
+        from .visualize_tree import build_tree_from_json, FamilyTreeVisualizer
+        family_tree = build_tree_from_json(args.input)
+        if not family_tree or not family_tree.persons: print("家系図に人物データがありません。"); return 1
+        FamilyTreeVisualizer(family_tree).visualize_fast().savefig(output)
+        print(f"✅ 成功！ 家系図を '{output}' に保存しました。"); return 0
+
+    if args.focus is not None:
+        from .subtree import render_focus
+        return 0 if render_focus(args.input, args.focus, output, up=args.up, down=args.down) else 1
+
+    from .draw_final_tree import build_tree, calculate_layout, draw_tree
+    data = _load_json(args.input)
+    if data is None: return 1
+    nodes = build_tree(data["persons"], data["relationships"])
+    positions = load_layout(args.layout, nodes) if args.layout else calculate_layout(nodes)
+    if positions is None: return 1
+    if args.viewport:
+        from .subtree import clip_layout
+        positions = clip_layout(positions, args.viewport)
+        nodes = {p_id: nodes[p_id] for p_id in positions}
+    draw_tree(nodes, positions, output)
+    return 0
+
+
+def cmd_batch(args):
+    # synthesize の -o（統合データ）を render の入力にし、画像の保存先は --image で受け取る
+    render_args = argparse.Namespace(**vars(args))
+    render_args.input, render_args.output = args.output, args.image_output
+    for step, step_args in ((cmd_parse, args), (cmd_synthesize, args), (cmd_render, render_args)):
+        status = step(step_args)
+        if status: return status
+    return 0
+
+
+def cmd_serve(args):
+    from dotenv import load_dotenv
+    from .service import serve
+    load_dotenv()
+    serve(args.host, args.port, args.socket_path, args.jobs_dir, args.workers)
+    return 0
+
+
+def add_serve_options(p):
+    # service.py の引数と同じ（argparse だけで定義できるよう、service を読み込まずに書く）
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--socket", dest="socket_path", help="TCPの代わりにこのUnixソケットで待ち受けます")
+    p.add_argument("--jobs-dir", default="output/jobs", help="ジョブキューと結果の保存先")
+    p.add_argument("--workers", type=int, default=2, help="同時に処理するPDFの数")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="kakeizu", description="戸籍PDFの解析と家系図の生成を行います。")
+    sub = parser.add_subparsers(dest="command", metavar="command")
+    sub.required = True
+
+    def add_parse_options(p):
+        p.add_argument("pdf", help="戸籍のPDF")
+        p.add_argument("--pages-dir", default=PAGES_DIR, help="ページごとの解析結果の保存先")
+        p.add_argument("--backend", default=None, help="OCRエンジン（vision / tesseract / local-first。省略時は環境変数 OCR_BACKEND）")
+        p.add_argument("--no-pack", action="store_true", help="短いページをまとめずに1ページずつ解析します")
+        p.add_argument("--no-triage", action="store_true", help="戸籍以外のページ・重複ページも解析します")
+        p.add_argument("--no-segment", action="store_true", help="ページを人物ごとに分けずに解析します")
+        p.add_argument("--fixed-dpi", action="store_true", help="ページごとにDPIを選ばず、全ページを300 DPIで画像にします")
+        p.add_argument("--no-reocr", action="store_true", help="OCRの信頼度が低い段落を読み直しません")
+        p.add_argument("--no-routing", action="store_true", help="ページごとにモデルを選ばず、全ページを gemini-1.5-pro で解析します")
+
+    p = sub.add_parser("ocr", help="PDFをOCRしてテキストを出力します")
+    p.add_argument("pdf"); p.add_argument("-o", "--output", help="保存先（省略時は標準出力）")
+    p.add_argument("--backend", default=None, help="OCRエンジン（vision / tesseract / local-first）")
+    p.set_defaults(func=cmd_ocr)
+
+    p = sub.add_parser("parse", help="PDFをOCRし、ページごとにLLMで解析します")
+    add_parse_options(p); p.set_defaults(func=cmd_parse)
+
+    def add_synthesize_options(p):
+        p.add_argument("--ai", action="store_true", help="Vertex AIで名寄せ・統合します（既定は氏名による統合）")
+        p.add_argument("--incremental", action="store_true",
+                       help="既存の統合データのIDを保ったまま、まだ統合していないページだけを追加します")
+        p.add_argument("-o", "--output", default=MERGED_JSON_PATH, help="統合データの保存先")
+
+    p = sub.add_parser("synthesize", help="ページごとの解析結果を1つの家系データに統合します")
+    p.add_argument("--pages-dir", default=PAGES_DIR); add_synthesize_options(p)
+    p.set_defaults(func=cmd_synthesize)
+
+    p = sub.add_parser("validate", help="統合データの循環・ありえない生年月日・存在しないIDの関係性を隔離します")
+    p.add_argument("-i", "--input", default=MERGED_JSON_PATH)
+    p.add_argument("-o", "--output", default=None, help="修復したデータの保存先（省略時は入力を上書き）")
+    p.set_defaults(func=cmd_validate)
+
+    p = sub.add_parser("kinship", help="人物Aから見た人物Bの親等と続柄を表示します")
+    p.add_argument("person_a", metavar="A", help="基準の人物（IDまたは氏名）")
+    p.add_argument("person_b", metavar="B", help="相手の人物（IDまたは氏名）")
+    p.add_argument("-i", "--input", default=MERGED_JSON_PATH)
+    p.set_defaults(func=cmd_kinship)
+
+    p = sub.add_parser("heirs", help="法定相続人と法定相続分を判定します（人物を省略すると死亡者全員分）")
+    p.add_argument("person", nargs="?", help="被相続人（IDまたは氏名）")
+    p.add_argument("-i", "--input", default=MERGED_JSON_PATH)
+    p.add_argument("-o", "--output", default=HEIRS_JSON_PATH, help="判定結果（JSON）の保存先")
+    p.add_argument("--image", help="相続関係図の保存先（既定は判定結果と同じフォルダの heirs_<ID>.png）")
+    p.add_argument("--no-image", action="store_true", help="被相続人を指定したときも相続関係図を描画しません")
+    p.set_defaults(func=cmd_heirs)
+
+    p = sub.add_parser("layout", help="家系図のレイアウトを計算してJSONに保存します")
+    p.add_argument("-i", "--input", default=MERGED_JSON_PATH); p.add_argument("-o", "--output", default=LAYOUT_JSON_PATH)
+    p.set_defaults(func=cmd_layout)
+
+    def add_render_options(p, with_output=True):
+        p.add_argument("--engine", choices=sorted(IMAGE_PATHS), default="pil", help="描画方式（既定: pil）")
+        p.add_argument("--layout", help="layout コマンドで保存した座標を使います（pil のみ）")
+        p.add_argument("--focus", metavar="PERSON", help="この人物（IDまたは氏名）を中心にした部分だけを描画します")
+        p.add_argument("--up", type=int, default=None, help="--focus から上る世代数（既定は無制限、0 で祖先を含めない）")
+        p.add_argument("--down", type=int, default=None, help="--focus から下る世代数（既定は無制限、0 で子孫を含めない）")
+        p.add_argument("--viewport", type=float, nargs=4, metavar=("X0", "Y0", "X1", "Y1"),
+                       help="レイアウト座標でこの矩形に重なる人物だけを描画します")
+        if with_output: p.add_argument("-o", "--output", help="画像の保存先")
+
+    p = sub.add_parser("render", help="家系図の画像を描画します")
+    p.add_argument("-i", "--input", default=MERGED_JSON_PATH); add_render_options(p)
+    p.set_defaults(func=cmd_render)
+
+    p = sub.add_parser("batch", help="parse → synthesize → render をまとめて実行します")
+    add_parse_options(p); add_synthesize_options(p); add_render_options(p, with_output=False)
+    p.add_argument("--image", dest="image_output", help="画像の保存先")
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("serve", help="クライアントを使い回す常駐サービスとしてジョブを受け付けます")
+    add_serve_options(p); p.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# cloud_clients.py (Google Cloud クライアントの共有)
+#
+# vertexai.init・Vision クライアント（gRPC チャネル）・GenerativeModel の作成は重いため、
+# プロセス内で1回だけ行い、以降は同じものを使い回す。どれもスレッドから同時に呼んでよい。
+#
+#   model = get_model()                    # 既定は LLM_MODEL_NAME。初回だけ vertexai.init も行う
+#   backend = get_ocr_backend("vision")    # OCRエンジンも名前ごとに1つだけ作る
+
+import os
+import threading
+
+VERTEX_LOCATION = "asia-northeast1"  # 東京リージョン
+LLM_MODEL_NAME = "gemini-1.5-pro"
+
+_lock = threading.Lock()
+_vertex_initialized = False
+_models = {}
+_vision_client = None
+_ocr_backends = {}
+
+
+def init_vertex(project=None, location=VERTEX_LOCATION):
+    """vertexai.init をプロセスで1回だけ呼ぶ（project は省略時に環境変数 GOOGLE_CLOUD_PROJECT_ID）"""
+    global _vertex_initialized
+    with _lock:
+        if _vertex_initialized: return
+        import vertexai
+        vertexai.init(project=project or os.getenv("GOOGLE_CLOUD_PROJECT_ID"), location=location)
+        _vertex_initialized = True
+
+
+def get_model(model_name=LLM_MODEL_NAME):
+    """モデル名ごとに1つの GenerativeModel を返す"""
+    model = _models.get(model_name)
+    if model is not None: return model
+    init_vertex()
+    from vertexai.generative_models import GenerativeModel
+    with _lock:
+        if model_name not in _models: _models[model_name] = GenerativeModel(model_name)
+        return _models[model_name]
+
+
+def get_vision_client():
+    """Vision の ImageAnnotatorClient を1つだけ作って返す"""
+    global _vision_client
+    with _lock:
+        if _vision_client is None:
+            from google.cloud import vision
+            _vision_client = vision.ImageAnnotatorClient()
+        return _vision_client
+
+
+def get_ocr_backend(name=None):
+    """ocr_backends.get_backend の結果を名前ごとに使い回す（Vision は共有のクライアントを使う）"""
+    from .ocr_backends import get_backend
+    name = name or os.getenv("OCR_BACKEND", "vision")
+    backend = _ocr_backends.get(name)
+    if backend is not None: return backend
+    vision_client = get_vision_client() if name in ("vision", "local-first") else None
+    with _lock:
+        if name not in _ocr_backends: _ocr_backends[name] = get_backend(name, vision_client=vision_client)
+        return _ocr_backends[name]
+
+
+def warm_up(ocr_backend=None, model_names=(LLM_MODEL_NAME,)):
+    """サービスの起動時に、最初のジョブを待たずにクライアントを作っておく"""
+    backend = get_ocr_backend(ocr_backend)
+    for model_name in model_names: get_model(model_name)
+    return backend
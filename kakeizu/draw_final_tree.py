@@ -1,10 +1,11 @@
 # draw_final_tree.py (ソート機能修正版)
 
 import json
-from collections import defaultdict
-from PIL import Image, ImageDraw, ImageFont
+from collections import defaultdict, deque
 import os
 
+from .graph_validation import validate_graph, summarize
+
 # --- スタイルの設定 ---
 BOX_WIDTH, BOX_HEIGHT = 160, 70
 H_SPACING, V_SPACING = 50, 80
@@ -26,8 +27,16 @@ class PersonNode:
         self.subtree_width = 0
         self.modifier = 0
 
-def build_tree(persons_data, relationships_data):
-    """JSONデータから家系図のノードツリーを構築する"""
+def build_tree(persons_data, relationships_data, validate=True):
+    """
+    JSONデータから家系図のノードツリーを構築する。
+    validate=True なら graph_validation で循環・自己ループ・存在しないIDなどの関係性を除いてから作る
+    （calculate_layout は親子関係に循環がないことを前提にしている）。
+    """
+    if validate:
+        persons_data, relationships_data, report = validate_graph(persons_data, relationships_data)
+        message = summarize(report)
+        if message: print(f"警告: {message}")
     nodes = {p['id']: PersonNode(p) for p in persons_data}
     for rel in relationships_data:
         source_id, target_id = rel.get('source'), rel.get('target')
@@ -52,10 +61,10 @@ def calculate_layout(nodes):
 
     # 世代レベルの割り当て
     for root in roots:
-        queue = [(root, 0)]
+        queue = deque([(root, 0)])
         visited = {root.id}
         while queue:
-            node, level = queue.pop(0)
+            node, level = queue.popleft()
             node.level = level
             for spouse in node.spouses:
                 if spouse.id not in visited:
@@ -69,13 +78,18 @@ def calculate_layout(nodes):
         if node.level != -1:
             levels[node.level].append(node)
 
-    # X座標の計算（再帰的なボトムアップとトップダウン）
-    node_order = []
-    def post_order_traversal(node):
-        if node in node_order: return
-        for child in node.children: post_order_traversal(child)
-        node_order.append(node)
-    for root in roots: post_order_traversal(root)
+    # X座標の計算（ボトムアップとトップダウン）。深い家系でも再帰上限に当たらないよう、明示的なスタックで帰りがけ順に並べる
+    node_order, seen = [], set()
+    for root in roots:
+        if root.id in seen: continue
+        seen.add(root.id); stack = [(root, iter(root.children))]
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop(); node_order.append(node)
+            elif child.id not in seen:
+                seen.add(child.id); stack.append((child, iter(child.children)))
 
     for node in node_order:
         if not node.children:
@@ -87,10 +101,10 @@ def calculate_layout(nodes):
     x_pos = 0
     for root in roots:
         root.x = x_pos + root.subtree_width / 2
-        queue = [root]
+        queue = deque([root])
         visited_pos = {root.id}
         while queue:
-            node = queue.pop(0)
+            node = queue.popleft()
             
             for spouse in node.spouses:
                 if spouse.id not in visited_pos:
@@ -109,8 +123,13 @@ def calculate_layout(nodes):
     return positions
 
 
-def draw_tree(nodes, positions, output_path):
-    """計算されたレイアウトを元に、Pillowで家系図を描画する"""
+def draw_tree(nodes, positions, output_path, annotations=None):
+    """
+    計算されたレイアウトを元に、Pillowで家系図を描画する。
+    annotations: {人物ID: {"label": 注記, "color": 枠の色}} を渡すと、箱の上に注記を添える。
+    """
+    from PIL import Image, ImageDraw, ImageFont
+    annotations = annotations or {}
     if not positions: print("描画する人物がいません。"); return
 
     min_x, max_x = min(p[0] for p in positions.values()), max(p[0] for p in positions.values())
@@ -120,7 +139,8 @@ def draw_tree(nodes, positions, output_path):
     canvas_height = int(max_y - min_y + BOX_HEIGHT*2)
     img = Image.new('RGB', (canvas_width, canvas_height), BG_COLOR)
     draw = ImageDraw.Draw(img)
-    font = ImageFont.truetype(FONT_PATH, FONT_SIZE); small_font = ImageFont.truetype(FONT_PATH, SMALL_FONT_SIZE)
+    try: font = ImageFont.truetype(FONT_PATH, FONT_SIZE); small_font = ImageFont.truetype(FONT_PATH, SMALL_FONT_SIZE)
+    except IOError: font, small_font = ImageFont.load_default(), ImageFont.load_default()
     x_offset, y_offset = -min_x + BOX_WIDTH, -min_y + BOX_HEIGHT/2
 
     for node in nodes.values():
@@ -152,11 +172,14 @@ def draw_tree(nodes, positions, output_path):
         px, py = pos[0] + x_offset, pos[1] + y_offset
         person = nodes[node_id].data
         color = 'skyblue' if person.get('gender') == 'M' else 'lightpink' if person.get('gender') == 'F' else 'lightgray'
-        draw.rectangle((px - BOX_WIDTH/2, py - BOX_HEIGHT/2, px + BOX_WIDTH/2, py + BOX_HEIGHT/2), fill=color, outline='black', width=2)
+        note = annotations.get(node_id)
+        outline, outline_width = (note.get('color', 'red'), 4) if note else ('black', 2)
+        draw.rectangle((px - BOX_WIDTH/2, py - BOX_HEIGHT/2, px + BOX_WIDTH/2, py + BOX_HEIGHT/2), fill=color, outline=outline, width=outline_width)
         name, birth, death = person.get('name') or '', person.get('birth_date') or '', person.get('death_date') or ''
         draw.text((px, py - 18), name, font=font, fill='black', anchor='mm')
         draw.text((px, py), birth, font=small_font, fill='black', anchor='mm')
         if death: draw.text((px, py + 18), f"死亡: {death}", font=small_font, fill='black', anchor='mm')
+        if note: draw.text((px, py - BOX_HEIGHT/2 - 10), note.get('label', ''), font=small_font, fill=outline, anchor='mm')
 
     img.save(output_path)
     print(f"✅ 成功！ B.pdf形式の家系図を '{output_path}' に保存しました。")
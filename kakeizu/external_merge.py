@@ -0,0 +1,136 @@
+# external_merge.py (ページJSONが多いときの、メモリ使用量を抑えた統合)
+#
+#   stats = merge_page_files_external(list_page_files("output/pages"), "output/family_tree_merged.json")
+#   stats = write_merged(json_files, output_path)   # 件数に応じてメモリ上の統合と外部マージを使い分ける
+#
+# page_merge.merge_pages と同じ結果（氏名での名寄せ・空の項目の補完・氏名順のID・rel_set による重複除去）を、
+# 人物と関係性のレコードを一時ファイルの整列済みランに書き出し、heapq.merge で外部マージして作る。
+# 一度にメモリに載るのはランの大きさ（RUN_SIZE 件）と同じ氏名の人物1人分だけで、ページ数には依存しない。
+
+import os
+import json
+import heapq
+import tempfile
+from itertools import groupby
+
+from .page_merge import normalize_name, relationship_name, iter_page_data, merge_page_files
+
+RUN_SIZE = 20000      # 1つのランに入れるレコード数（ピークメモリはほぼこれで決まる）
+MAX_FAN_IN = 64       # 一度に開くランの数。これより多いときはランをまとめてから最後にマージする
+EXTERNAL_MIN_FILES = 1000  # write_merged がこの件数以上のページJSONで外部マージを使う
+
+
+def _write_run(records, workdir):
+    fd, path = tempfile.mkstemp(suffix=".jsonl", dir=workdir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for record in records: f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path
+
+
+def _read_run(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f: yield json.loads(line)
+    os.remove(path)
+
+
+def external_sort(records, key, workdir, run_size=RUN_SIZE):
+    """records（JSONにできるリスト）を run_size 件ずつ並べ替えて一時ファイルに書き、key 順の1本の並びとして返す"""
+    runs, buffer = [], []
+    for record in records:
+        buffer.append(record)
+        if len(buffer) >= run_size: runs.append(_write_run(sorted(buffer, key=key), workdir)); buffer = []
+    if buffer: runs.append(_write_run(sorted(buffer, key=key), workdir))
+    while len(runs) > MAX_FAN_IN:
+        runs = [_write_run(heapq.merge(*map(_read_run, runs[i:i + MAX_FAN_IN]), key=key), workdir)
+                for i in range(0, len(runs), MAX_FAN_IN)]
+    return heapq.merge(*map(_read_run, runs), key=key)
+
+
+def _join_ids(relationships, names_path, side):
+    """
+    side 列（氏名キー）の順に並んだ関係性に、氏名順の (氏名, ID) ファイルを突き合わせて ID に置き換える。
+    見つからない氏名の関係性は merge_pages と同じく捨てる。
+    """
+    with open(names_path, "r", encoding="utf-8") as f:
+        names = (json.loads(line) for line in f)
+        current = next(names, None)
+        for rel in relationships:
+            while current is not None and current[0] < rel[side]: current = next(names, None)
+            if current is not None and current[0] == rel[side]:
+                rel[side] = current[1]; yield rel
+
+
+def merge_page_files_external(json_files, output_path, run_size=RUN_SIZE):
+    """
+    ページJSONを1ファイルずつ読みながら統合し、merge_page_files と同じ内容のJSONを output_path に書く。
+    人物数と関係性の数を返す。
+    """
+    with tempfile.TemporaryDirectory(prefix="kakeizu_merge_", dir=os.path.dirname(os.path.abspath(output_path))) as workdir:
+        # 1. ページを読みながら、人物と関係性を出現順の番号付きで別々のファイルに書き出す
+        rel_path = os.path.join(workdir, "relationships.jsonl")
+        def person_records():
+            seq = 0
+            with open(rel_path, "w", encoding="utf-8") as rel_file:
+                for data in iter_page_data(json_files):
+                    for p_data in data.get("persons", []):
+                        name = normalize_name(p_data.get("name", ""))
+                        if name: yield [name, seq, p_data]; seq += 1
+                    for rel in data.get("relationships", []):
+                        # [出現順, 元の氏名キー, 先の氏名キー, 種類]
+                        record = [seq, relationship_name(rel.get("source")), relationship_name(rel.get("target")), rel.get("type")]
+                        rel_file.write(json.dumps(record, ensure_ascii=False) + "\n"); seq += 1
+
+        # 2. 氏名順に並べて同じ氏名をまとめ（先に現れたものを基準に空の項目を補う）、氏名順にIDを振る
+        persons_path, names_path = os.path.join(workdir, "persons.jsonl"), os.path.join(workdir, "names.jsonl")
+        n_persons = 0
+        with open(persons_path, "w", encoding="utf-8") as persons_file, open(names_path, "w", encoding="utf-8") as names_file:
+            sorted_persons = external_sort(person_records(), lambda r: (r[0], r[1]), workdir, run_size)
+            for name, group in groupby(sorted_persons, key=lambda r: r[0]):
+                merged = next(group)[2]
+                for _, _, p_data in group:
+                    for k, v in p_data.items():
+                        if v and not merged.get(k): merged[k] = v
+                n_persons += 1
+                merged['id'] = n_persons
+                persons_file.write(json.dumps(merged, ensure_ascii=False) + "\n")
+                names_file.write(json.dumps([name, n_persons], ensure_ascii=False) + "\n")
+
+        # 3. 関係性の元・先の氏名をそれぞれ氏名順に突き合わせてIDにする
+        def read_relationships():
+            with open(rel_path, "r", encoding="utf-8") as f:
+                for line in f: yield json.loads(line)
+        rels = external_sort(read_relationships(), lambda r: r[1], workdir, run_size)
+        rels = external_sort(_join_ids(rels, names_path, 1), lambda r: r[2], workdir, run_size)
+        rels = _join_ids(rels, names_path, 2)
+
+        # 4. (種類, 元, 先)（夫婦は向きを区別しない）ごとに最初に現れたものだけを残し、出現順に戻す
+        def dedup_key(r):
+            r_type = json.dumps(r[3], ensure_ascii=False)  # None と文字列を並べて比べられるようにする
+            return (r_type, 0, min(r[1], r[2]), max(r[1], r[2])) if r[3] == "spouse" else (r_type, 1, r[1], r[2])
+        by_key = external_sort(rels, lambda r: (dedup_key(r), r[0]), workdir, run_size)
+        first = (next(group) for _, group in groupby(by_key, key=dedup_key))
+        rels = external_sort(first, lambda r: r[0], workdir, run_size)
+
+        # 5. 1件ずつ書き出す
+        n_relationships = 0
+        with open(output_path, "w", encoding="utf-8") as out, open(persons_path, "r", encoding="utf-8") as persons_file:
+            out.write('{\n  "persons": [')
+            for i, line in enumerate(persons_file):
+                out.write(("," if i else "") + "\n    " + line.rstrip("\n"))
+            out.write('\n  ],\n  "relationships": [')
+            for _, s_id, t_id, r_type in rels:
+                record = json.dumps({"source": s_id, "target": t_id, "type": r_type}, ensure_ascii=False)
+                out.write(("," if n_relationships else "") + "\n    " + record); n_relationships += 1
+            out.write('\n  ]\n}\n')
+    return {"persons": n_persons, "relationships": n_relationships}
+
+
+def write_merged(json_files, output_path, min_files=EXTERNAL_MIN_FILES):
+    """
+    ページJSONを統合して output_path に保存し、人物数と関係性の数を返す。
+    min_files 件未満なら従来どおりメモリ上で、それ以上なら外部マージで統合する（結果は同じ）。
+    """
+    if len(json_files) >= min_files: return merge_page_files_external(json_files, output_path)
+    final_data = merge_page_files(json_files)
+    with open(output_path, "w", encoding="utf-8") as f: json.dump(final_data, f, ensure_ascii=False, indent=2)
+    return {"persons": len(final_data["persons"]), "relationships": len(final_data["relationships"])}
@@ -0,0 +1,401 @@
+# fake_clients.py (Vision / Vertex AI のオフライン代替クライアント)
+#
+# 本物のGoogle Cloudに接続せずにOCR→LLMのパイプライン全体を動かすための偽クライアント。
+# プロセス内でそのまま使うほか、`python -m kakeizu.fake_clients serve` でローカルHTTPサーバーとして
+# 起動し、HttpVisionClient / HttpGenerativeModel から呼び出すこともできる。
+
+import re
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .page_merge import merge_pages
+
+try:
+    from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+except ImportError:
+    class ResourceExhausted(Exception):
+        """google.api_core が無い環境向けの 429 相当の例外"""
+        code = 429
+
+    class ServiceUnavailable(Exception):
+        """google.api_core が無い環境向けの 503 相当の例外"""
+        code = 503
+
+DEFAULT_VISION_LATENCY = "lognormal:0.15,0.3"
+DEFAULT_LLM_LATENCY = "lognormal:0.8,0.4"
+
+
+class LatencyModel:
+    """
+    応答遅延の分布。文字列で指定する:
+      "constant:0.5" / "uniform:0.2,1.0" / "lognormal:中央値,シグマ"
+    """
+
+    def __init__(self, spec):
+        kind, _, params = str(spec).partition(":")
+        self.kind = kind
+        self.params = [float(x) for x in params.split(",") if x] if params else []
+        if kind not in ("constant", "uniform", "lognormal"):
+            raise ValueError(f"不明な遅延分布です: {spec}")
+
+    def sample(self, rng):
+        if self.kind == "constant": return self.params[0] if self.params else 0.0
+        if self.kind == "uniform": return rng.uniform(self.params[0], self.params[1])
+        median, sigma = self.params[0], self.params[1] if len(self.params) > 1 else 0.25
+        return rng.lognormvariate(math.log(median), sigma)
+
+
+class CallRecorder:
+    """偽クライアントへの呼び出しの遅延と結果を、APIごとにスレッドセーフに記録する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = []
+
+    def record(self, api, seconds, outcome):
+        with self._lock: self.calls.append((api, seconds, outcome))
+
+    def summary(self):
+        result = {}
+        with self._lock: calls = list(self.calls)
+        for api in sorted({c[0] for c in calls}):
+            latencies = sorted(c[1] for c in calls if c[0] == api)
+            outcomes = [c[2] for c in calls if c[0] == api]
+            result[api] = {
+                "calls": len(latencies),
+                "ok": outcomes.count("ok"),
+                "rate_limited": outcomes.count("429"),
+                "errors": outcomes.count("error"),
+                "p50_sec": round(percentile(latencies, 50), 4),
+                "p95_sec": round(percentile(latencies, 95), 4),
+                "p99_sec": round(percentile(latencies, 99), 4),
+            }
+        return result
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values: return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class _FakeService:
+    """遅延・エラー・429の注入をまとめた偽サービスの共通部分"""
+
+    def __init__(self, api, latency, error_rate=0.0, rate_limit_rate=0.0, seed=0, recorder=None):
+        self.api = api
+        self.latency = latency if isinstance(latency, LatencyModel) else LatencyModel(latency)
+        self.error_rate, self.rate_limit_rate = error_rate, rate_limit_rate
+        self.recorder = recorder or CallRecorder()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate(self, extra_sec=0.0):
+        with self._lock:
+            delay, roll = self.latency.sample(self._rng) + extra_sec, self._rng.random()
+        time.sleep(delay)
+        if roll < self.rate_limit_rate:
+            self.recorder.record(self.api, delay, "429")
+            raise ResourceExhausted(f"429 Quota exceeded for {self.api} (fake)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.recorder.record(self.api, delay, "error")
+            raise ServiceUnavailable(f"503 {self.api} is unavailable (fake)")
+        self.recorder.record(self.api, delay, "ok")
+
+
+# --- 戸籍テキストのテンプレート ---
+
+RELATION_WORDS = {'M': ["長男", "二男", "三男", "四男"], 'F': ["長女", "二女", "三女", "四女"]}
+
+
+def render_page_text(page):
+    """
+    split_into_pages 形式のページデータから、OCR結果に見立てた戸籍テキストを作る。
+    各人物は「【氏名】…【続柄】…」の1行で表す（FakeGenerativeModel がこの形式を読み戻す）。
+    """
+    persons = page.get("persons", [])
+    parents, spouses, adopted = {}, {}, set()
+    for rel in page.get("relationships", []):
+        if rel["type"] == "adopted": adopted.add(rel["target"])
+        if rel["type"] in ("parent_child", "adopted"): parents.setdefault(rel["target"], []).append(rel["source"])
+        elif rel["type"] == "spouse": spouses[rel["source"]] = rel["target"]; spouses[rel["target"]] = rel["source"]
+    head = persons[0]["name"] if persons else ""
+    lines = ["全部事項証明", f"本籍　東京都千代田区一番町{len(head) % 9 + 1}番地", f"氏名　{head}", "戸籍事項", "戸籍編製"]
+    child_counts = {'M': 0, 'F': 0}
+    for person in persons:
+        name, gender = person["name"], person.get("gender")
+        fields = [f"【氏名】{name}", f"【性別】{'男' if gender == 'M' else '女' if gender == 'F' else '不詳'}"]
+        if name in parents:
+            words = RELATION_WORDS.get(gender, ["子"])
+            fields.append(f"【続柄】{words[min(child_counts.get(gender, 0), len(words) - 1)]}")
+            if gender in child_counts: child_counts[gender] += 1
+            for parent in parents[name]: fields.append(f"【{'養親' if name in adopted else '父母'}】{parent}")
+        if name in spouses: fields.append(f"【配偶者】{spouses[name]}")
+        if person.get("birth_date"): fields.append(f"【生年月日】{person['birth_date']}")
+        if person.get("death_date"): fields.append(f"【死亡】{person['death_date']}")
+        lines.append(" ".join(fields))
+    return "\n".join(lines) + "\n"
+
+
+_FIELD_RE = re.compile(r"【(氏名|性別|続柄|父母|養親|配偶者|生年月日|死亡)】([^【\n]+)")
+
+
+def parse_page_text(text):
+    """render_page_text で作ったテキストから persons/relationships を組み立てる（偽LLMの応答用）"""
+    persons, relationships = [], []
+    for line in text.splitlines():
+        fields = [(k, v.strip()) for k, v in _FIELD_RE.findall(line)]
+        if not fields or fields[0][0] != "氏名": continue
+        name = fields[0][1]
+        person = {"id": name, "name": name, "gender": None, "birth_date": None, "death_date": None, "notes": None}
+        for key, value in fields[1:]:
+            if key == "性別": person["gender"] = {"男": "M", "女": "F"}.get(value)
+            elif key == "生年月日": person["birth_date"] = value
+            elif key == "死亡": person["death_date"] = value
+            elif key == "続柄": person["notes"] = value
+            elif key in ("父母", "養親"):
+                relationships.append({"type": "adopted" if key == "養親" else "parent_child", "source": value, "target": name})
+            elif key == "配偶者" and person["gender"] == 'M':
+                relationships.append({"type": "spouse", "source": name, "target": value})
+        persons.append(person)
+    return {"persons": persons, "relationships": relationships}
+
+
+# --- Vision API の代替 ---
+
+class FakeVisionClient(_FakeService):
+    """
+    vision.ImageAnnotatorClient の代替。呼び出し順に page_texts のテキストを返す。
+    page_texts を省略すると空のページ（テキストなし）を返す。
+    document_text_detection と batch_annotate_files は行（段落）ごとに confidence（値か 行 -> 値 の関数）を付け、
+    text_detection は本物と同じく信頼度を 0.0 で返す。
+    """
+
+    def __init__(self, page_texts=None, latency=DEFAULT_VISION_LATENCY, error_rate=0.0, rate_limit_rate=0.0,
+                 seed=0, recorder=None, confidence=0.95):
+        super().__init__("vision", latency, error_rate, rate_limit_rate, seed, recorder)
+        self.page_texts = list(page_texts or [""])
+        self.confidence = confidence
+        self._next = 0
+
+    def _next_text(self):
+        with self._lock:
+            text = self.page_texts[self._next % len(self.page_texts)]; self._next += 1
+        return text
+
+    @staticmethod
+    def _annotation_pages(text, confidence=0.0, line_height=40, char_width=20):
+        """横書きの1行を1段落とした pages → blocks → paragraphs → words → symbols の位置情報と信頼度"""
+        blocks = []
+        for i, line in enumerate(l for l in text.splitlines() if l.strip()):
+            y0, x1 = 60 + i * line_height, 50 + len(line) * char_width
+            conf = confidence(line) if callable(confidence) else confidence
+            box = SimpleNamespace(vertices=[SimpleNamespace(x=50, y=y0), SimpleNamespace(x=x1, y=y0),
+                                            SimpleNamespace(x=x1, y=y0 + line_height - 10), SimpleNamespace(x=50, y=y0 + line_height - 10)])
+            word = SimpleNamespace(symbols=[SimpleNamespace(text=c, property=None, confidence=conf) for c in line],
+                                   bounding_box=box, confidence=conf)
+            blocks.append(SimpleNamespace(paragraphs=[SimpleNamespace(words=[word], bounding_box=box, confidence=conf)],
+                                          bounding_box=box, confidence=conf))
+        return [SimpleNamespace(blocks=blocks, width=1240, height=1754)] if blocks else []
+
+    @classmethod
+    def _response(cls, text, confidence=0.0):
+        pages = cls._annotation_pages(text, confidence)
+        return SimpleNamespace(full_text_annotation=SimpleNamespace(text=text, pages=pages),
+                               text_annotations=[], error=SimpleNamespace(message=""))
+
+    def text_detection(self, image=None, **kwargs):
+        text = self._next_text()
+        self._simulate()
+        return self._response(text)
+
+    def document_text_detection(self, image=None, **kwargs):
+        text = self._next_text()
+        self._simulate()
+        return self._response(text, self.confidence)
+
+    def batch_annotate_files(self, requests=None, **kwargs):
+        texts = [self._next_text() for _ in self.page_texts]
+        self._simulate()
+        return SimpleNamespace(responses=[SimpleNamespace(responses=[self._response(t, self.confidence) for t in texts])])
+
+
+# --- Vertex AI GenerativeModel の代替 ---
+
+_OCR_SECTION_RE = re.compile(r"# OCRテキスト:\s*\n---\n(.*?)\n---", re.S)
+_PACKED_PAGE_RE = re.compile(r"=== ページ (\d+) 開始 ===\n(.*?)\n=== ページ \1 終了 ===", re.S)
+_PAGE_SECTION_RE = re.compile(r"--- ページ (\d+) の抽出結果 ---\n(.*?)(?=\n\n--- ページ |\n---\n)", re.S)
+
+
+def _usage(prompt, text):
+    return SimpleNamespace(prompt_token_count=len(prompt), candidates_token_count=len(text),
+                           total_token_count=len(prompt) + len(text))
+
+
+class FakeGenerativeModel(_FakeService):
+    """
+    vertexai.generative_models.GenerativeModel の代替。
+    ページ解析のプロンプトにはOCRテキストを読み戻したJSONを（page_packer でまとめたページは pages 配列で）、統合のプロンプトには
+    各ページのJSONを名寄せした結果を、実物と同じく ```json で囲んで返す。
+    """
+
+    def __init__(self, model_name="gemini-1.5-pro", latency=DEFAULT_LLM_LATENCY, error_rate=0.0,
+                 rate_limit_rate=0.0, seed=0, recorder=None, tokens_per_sec=None):
+        super().__init__(f"llm:{model_name}", latency, error_rate, rate_limit_rate, seed, recorder)
+        self.model_name, self.tokens_per_sec = model_name, tokens_per_sec
+
+    def respond(self, prompt, generation_config=None):
+        """プロンプトに対する応答テキスト（遅延なし）。JSONのMIMEタイプが指定されていれば囲みなしで返す"""
+        if "名寄せ" in prompt:
+            pages = []
+            for _, block in _PAGE_SECTION_RE.findall(prompt):
+                try: pages.append(json.loads(block))
+                except json.JSONDecodeError: continue
+            data = merge_pages(pages)
+        else:
+            match = _OCR_SECTION_RE.search(prompt)
+            ocr_text = match.group(1) if match else prompt
+            packed = _PACKED_PAGE_RE.findall(ocr_text)
+            data = {"pages": [dict(page=int(n), **parse_page_text(t)) for n, t in packed]} if packed else parse_page_text(ocr_text)
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        if (generation_config or {}).get("response_mime_type") == "application/json": return text
+        return "```json\n" + text + "\n```"
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        prompt = contents if isinstance(contents, str) else "\n".join(str(c) for c in contents)
+        text = self.respond(prompt, generation_config)
+        generation_sec = len(text) / self.tokens_per_sec if self.tokens_per_sec else 0.0
+        if not stream:
+            self._simulate(generation_sec)
+            return SimpleNamespace(text=text, usage_metadata=_usage(prompt, text))
+        return self._stream(prompt, text, generation_sec)
+
+    def _stream(self, prompt, text, generation_sec, chunk_chars=200):
+        self._simulate()
+        chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+        for i, chunk in enumerate(chunks):
+            if generation_sec: time.sleep(generation_sec / len(chunks))
+            yield SimpleNamespace(text=chunk, usage_metadata=_usage(prompt, text) if i == len(chunks) - 1 else None)
+
+
+# --- ローカルHTTPサーバーとそのクライアント ---
+
+class _FakeServiceHandler(BaseHTTPRequestHandler):
+    vision, models = None, {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        try:
+            if self.path == "/v1/vision:annotate":
+                response = self.vision.document_text_detection()
+                pages = response.full_text_annotation.pages
+                confidence = pages[0].blocks[0].confidence if pages else 0.0  # 偽クライアントは行によらない値を返す前提
+                self._reply(200, {"text": response.full_text_annotation.text, "confidence": confidence})
+            elif self.path == "/v1/models:generate":
+                model = self.models.get(request.get("model")) or next(iter(self.models.values()))
+                response = model.generate_content(request.get("prompt", ""), request.get("generation_config"))
+                self._reply(200, {"text": response.text, "usage": vars(response.usage_metadata)})
+            else:
+                self._reply(404, {"error": f"unknown path {self.path}"})
+        except ResourceExhausted as e:
+            self._reply(429, {"error": str(e)})
+        except ServiceUnavailable as e:
+            self._reply(503, {"error": str(e)})
+
+
+def start_server(vision_client, models, host="127.0.0.1", port=0):
+    """偽クライアントをHTTPで公開するサーバーをバックグラウンドで起動し、(server, base_url) を返す"""
+    handler = type("FakeServiceHandler", (_FakeServiceHandler,),
+                   {"vision": vision_client, "models": {m.model_name: m for m in models}})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def _post(url, payload, timeout):
+    request = urllib.request.Request(url, data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        message = e.read().decode("utf-8", "replace")
+        if e.code == 429: raise ResourceExhausted(message)
+        if e.code == 503: raise ServiceUnavailable(message)
+        raise
+
+
+class HttpVisionClient:
+    """ローカルの偽サーバーに問い合わせる vision.ImageAnnotatorClient の代替"""
+
+    def __init__(self, base_url, timeout=60):
+        self.base_url, self.timeout = base_url, timeout
+
+    def text_detection(self, image=None, **kwargs):
+        data = _post(f"{self.base_url}/v1/vision:annotate", {}, self.timeout)
+        return FakeVisionClient._response(data["text"])
+
+    def document_text_detection(self, image=None, **kwargs):
+        data = _post(f"{self.base_url}/v1/vision:annotate", {}, self.timeout)
+        return FakeVisionClient._response(data["text"], data.get("confidence", 0.0))
+
+
+class HttpGenerativeModel:
+    """ローカルの偽サーバーに問い合わせる GenerativeModel の代替"""
+
+    def __init__(self, base_url, model_name="gemini-1.5-pro", timeout=300):
+        self.base_url, self.model_name, self.timeout = base_url, model_name, timeout
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        prompt = contents if isinstance(contents, str) else "\n".join(str(c) for c in contents)
+        data = _post(f"{self.base_url}/v1/models:generate", {"model": self.model_name, "prompt": prompt,
+                                                                "generation_config": generation_config}, self.timeout)
+        response = SimpleNamespace(text=data["text"], usage_metadata=SimpleNamespace(**data["usage"]))
+        return iter([response]) if stream else response
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vision / Vertex AI の偽サーバーを起動します。")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--persons", type=int, default=200, help="テンプレート生成に使う架空の家系の人数")
+    parser.add_argument("--vision-latency", default=DEFAULT_VISION_LATENCY)
+    parser.add_argument("--llm-latency", default=DEFAULT_LLM_LATENCY)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from .synthetic_koseki import generate_family, split_into_pages
+    texts = [render_page_text(p) for p in split_into_pages(generate_family(args.persons, seed=args.seed), seed=args.seed)]
+    vision_client = FakeVisionClient(texts, args.vision_latency, args.error_rate, args.rate_limit_rate, args.seed)
+    models = [FakeGenerativeModel(name, args.llm_latency, args.error_rate, args.rate_limit_rate, args.seed)
+              for name in ("gemini-1.5-pro", "gemini-1.5-flash")]
+    server, url = start_server(vision_client, models, args.host, args.port)
+    print(f"偽サーバーを {url} で起動しました（Ctrl+Cで終了）。", file=sys.stderr)
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,172 @@
+# graph_validation.py (レイアウト前の家系データの検査と修復)
+#
+#   persons, relationships, report = validate_graph(data["persons"], data["relationships"])
+#   report = validate_file("output/family_tree_merged.json")   # 修復したデータを書き戻し、報告を <名前>.validation.json に保存
+#
+# LLMの出力を統合したデータには、親子関係の循環や自分自身との婚姻が紛れ込むことがあり、
+# そのままではレイアウトの親子の辿りが終わらない。次の関係性を取り除き（隔離し）、理由を報告に残す。
+#   - dangling: 元・先の人物IDが persons にない
+#   - unknown_type: 種類が spouse / parent_child / adopted のいずれでもない
+#   - self_loop: 元と先が同じ人物（自分自身の配偶者・親）
+#   - duplicate: 同じ (種類, 元, 先) の関係性の2件目以降（夫婦は向きを区別しない）
+#   - parent_born_after_child: 親（養親）の生年月日が子より後
+#   - cycle: 親子関係の循環（強連結成分の中で、最も早く生まれた人物から辿ったときの後退辺を切る）
+# 人物IDを 0..n-1 の番号にした隣接配列の上で、どれも人物数＋関係性の数に比例する時間で動く。
+# 残った親子関係は必ず循環のない有向グラフになる。
+
+import os
+import json
+from collections import Counter
+
+from .wareki import parse_date
+
+PARENT_TYPES = ('parent_child', 'adopted')
+RELATIONSHIP_TYPES = ('spouse',) + PARENT_TYPES
+MAX_REPORTED_MEMBERS = 10  # 報告に載せる循環の人物数の上限
+
+
+def strongly_connected_components(n, adjacency):
+    """
+    Tarjan の強連結成分分解（明示的なスタックで再帰を使わない）。
+    adjacency[v] は頂点 v から出る辺の (先の頂点, 辺の番号) のリスト。成分（頂点番号のリスト）のリストを返す。
+    """
+    index, low, on_stack = [-1] * n, [0] * n, [False] * n
+    stack, components, counter = [], [], 0
+    for start in range(n):
+        if index[start] != -1: continue
+        index[start] = low[start] = counter; counter += 1
+        stack.append(start); on_stack[start] = True
+        work = [(start, 0)]
+        while work:
+            v, i = work[-1]
+            if i < len(adjacency[v]):
+                work[-1] = (v, i + 1)
+                w = adjacency[v][i][0]
+                if index[w] == -1:
+                    index[w] = low[w] = counter; counter += 1
+                    stack.append(w); on_stack[w] = True
+                    work.append((w, 0))
+                elif on_stack[w]:
+                    low[v] = min(low[v], index[w])
+                continue
+            work.pop()
+            if work: low[work[-1][0]] = min(low[work[-1][0]], low[v])
+            if low[v] == index[v]:
+                component = []
+                while True:
+                    w = stack.pop(); on_stack[w] = False; component.append(w)
+                    if w == v: break
+                components.append(component)
+    return components
+
+
+def _cycle_edges(component, adjacency, births):
+    """
+    循環のある強連結成分の中を、最も早く生まれた人物（生年月日が不明なら番号の小さい人物）から深さ優先で辿り、
+    辿っている途中の人物へ戻る辺（後退辺）の番号を返す。これらを切ると成分の中の循環はすべてなくなる。
+    """
+    members = set(component)
+    start = min(component, key=lambda v: (births[v] is None, births[v] or (0, 0, 0), v))
+    state, back_edges = {}, []  # state: 1 = 辿っている途中、2 = 辿り終えた
+    for root in [start] + component:
+        if root in state: continue
+        state[root] = 1; work = [(root, 0)]
+        while work:
+            v, i = work[-1]
+            if i == len(adjacency[v]):
+                state[v] = 2; work.pop(); continue
+            work[-1] = (v, i + 1)
+            w, edge = adjacency[v][i]
+            if w not in members: continue
+            if state.get(w) == 1: back_edges.append(edge)
+            elif w not in state: state[w] = 1; work.append((w, 0))
+    return back_edges
+
+
+def _born_after(parent, child):
+    """親の生年月日が子より後か。月日が不明な日付は、年が違うときだけ比べる"""
+    if parent is None or child is None: return False
+    if parent[0] != child[0]: return parent[0] > child[0]
+    if 0 in parent[1:] or 0 in child[1:]: return False
+    return parent >= child
+
+
+def validate_graph(persons_data, relationships_data):
+    """
+    関係性を検査して、(persons, 残した relationships, 報告) を返す。relationships は元の並びを保つ。
+    報告は {"persons", "relationships", "quarantined": [{"reason", "relationship", ...}], "cycles", "counts"}。
+    """
+    persons = list(persons_data)
+    index = {p.get('id'): i for i, p in enumerate(persons)}
+    births = [parse_date(p.get('birth_date')) for p in persons]
+    quarantined, seen = {}, set()  # 関係性の番号 -> 報告の項目
+
+    # 1. 両端のID・種類・自己ループ・重複
+    for e, rel in enumerate(relationships_data):
+        s_id, t_id, r_type = rel.get('source'), rel.get('target'), rel.get('type')
+        if s_id not in index or t_id not in index:
+            missing = [p_id for p_id in (s_id, t_id) if p_id not in index]
+            quarantined[e] = {"reason": "dangling", "missing_ids": missing}; continue
+        if r_type not in RELATIONSHIP_TYPES: quarantined[e] = {"reason": "unknown_type"}; continue
+        if s_id == t_id: quarantined[e] = {"reason": "self_loop"}; continue
+        key = (r_type, min(index[s_id], index[t_id]), max(index[s_id], index[t_id])) if r_type == 'spouse' else (r_type, index[s_id], index[t_id])
+        if key in seen: quarantined[e] = {"reason": "duplicate"}; continue
+        seen.add(key)
+
+    # 2. 親が子より後に生まれている親子関係
+    adjacency = [[] for _ in persons]
+    for e, rel in enumerate(relationships_data):
+        if e in quarantined or rel.get('type') not in PARENT_TYPES: continue
+        s, t = index[rel['source']], index[rel['target']]
+        if _born_after(births[s], births[t]):
+            quarantined[e] = {"reason": "parent_born_after_child",
+                              "dates": [persons[s].get('birth_date'), persons[t].get('birth_date')]}
+            continue
+        adjacency[s].append((t, e))
+
+    # 3. 親子関係の循環（2人以上の強連結成分）を切る
+    cycles = []
+    for component in strongly_connected_components(len(persons), adjacency):
+        if len(component) < 2: continue
+        members = [persons[v].get('id') for v in component]
+        cycles.append(members[:MAX_REPORTED_MEMBERS])
+        for e in _cycle_edges(component, adjacency, births):
+            quarantined[e] = {"reason": "cycle", "cycle_size": len(component)}
+
+    relationships = [rel for e, rel in enumerate(relationships_data) if e not in quarantined]
+    report = {
+        "persons": len(persons), "relationships": len(relationships),
+        "quarantined": [dict(item, relationship=relationships_data[e]) for e, item in sorted(quarantined.items())],
+        "cycles": cycles,
+        "counts": dict(Counter(item["reason"] for item in quarantined.values())),
+    }
+    return persons, relationships, report
+
+
+def summarize(report):
+    """報告の1行の要約（隔離した関係性がなければ None）"""
+    if not report["quarantined"]: return None
+    counts = "、".join(f"{reason} {n}件" for reason, n in sorted(report["counts"].items()))
+    return f"関係性 {len(report['quarantined'])} 件を隔離しました（{counts}）。"
+
+
+def report_path(json_path):
+    return os.path.splitext(json_path)[0] + ".validation.json"
+
+
+def validate_file(json_path, output_path=None):
+    """
+    統合済みの家系データを検査し、修復したデータを output_path（省略時は json_path）に、
+    報告を <名前>.validation.json に保存して報告を返す。読み込めなければ None。
+    """
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f: data = json.load(f)
+    except FileNotFoundError:
+        print(f"エラー: '{json_path}' が見つかりません。"); return None
+    persons, relationships, report = validate_graph(data.get("persons", []), data.get("relationships", []))
+    output_path = output_path or json_path
+    if report["quarantined"] or output_path != json_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(data, persons=persons, relationships=relationships), f, ensure_ascii=False, indent=2)
+    with open(report_path(output_path), 'w', encoding='utf-8') as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
@@ -0,0 +1,267 @@
+# heirs.py (法定相続人の一括判定)
+
+import json
+from collections import defaultdict
+from fractions import Fraction
+
+from .wareki import parse_date
+
+HEIRS_JSON_PATH = "output/heirs.json"
+PARENT_TYPES = ('parent_child', 'adopted')
+
+# 配偶者と各順位の血族相続人が共に相続する場合の配偶者の法定相続分（民法900条）
+SPOUSE_SHARES = {1: Fraction(1, 2), 2: Fraction(2, 3), 3: Fraction(3, 4), None: Fraction(1)}
+RANK_LABELS = {1: "第1順位（子・代襲者）", 2: "第2順位（直系尊属）", 3: "第3順位（兄弟姉妹・代襲者）", None: "配偶者のみ"}
+
+
+class _AliveTracker:
+    """相続開始時点ごとに「生存している人物」のビット集合を差分更新で求める"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.deaths = sorted((key, engine.bit[p_id]) for p_id, key in engine.death_key.items() if key)
+        self.births = sorted((key, engine.bit[p_id]) for p_id, key in engine.birth_key.items() if key)
+        self.reset()
+
+    def reset(self):
+        self.t, self.death_pos, self.birth_pos = None, 0, 0
+        self.dead_bits = 0
+        self.unborn_bits = 0
+        for _, bit in self.births: self.unborn_bits |= bit
+
+    def alive_bits(self, t):
+        """t 時点で生存している人物（t 以前に死亡、t より後に出生した人物を除く）"""
+        if self.t is not None and t < self.t: self.reset()
+        self.t = t
+        while self.death_pos < len(self.deaths) and self.deaths[self.death_pos][0] <= t:
+            self.dead_bits |= self.deaths[self.death_pos][1]; self.death_pos += 1
+        while self.birth_pos < len(self.births) and self.births[self.birth_pos][0] <= t:
+            self.unborn_bits ^= self.births[self.birth_pos][1]; self.birth_pos += 1
+        return self.engine.all_bits & ~self.dead_bits & ~self.unborn_bits
+
+
+class HeirEngine:
+    """
+    統合済みの家系データから法定相続人と法定相続分を判定する。
+
+    人物ごとの子孫・祖先の集合はビット集合（int）としてメモ化し、
+    同じ家系内で複数の被相続人を判定する際に使い回す。
+    日付は和暦を (年, 月, 日) に変換して比較し、死亡日が被相続人と同じ人物は
+    同時死亡として相続人から除く（民法32条の2）。
+    """
+
+    def __init__(self, persons_data, relationships_data):
+        self.persons = {p['id']: p for p in persons_data}
+        self.ids = list(self.persons)
+        self.bit = {p_id: 1 << i for i, p_id in enumerate(self.ids)}
+        self.all_bits = (1 << len(self.ids)) - 1
+        self.parents, self.children, self.spouses = defaultdict(list), defaultdict(list), defaultdict(list)
+        for rel in relationships_data:
+            s_id, t_id, r_type = rel.get('source'), rel.get('target'), rel.get('type')
+            if s_id not in self.persons or t_id not in self.persons or s_id == t_id: continue
+            if r_type in PARENT_TYPES and s_id not in self.parents[t_id]:
+                self.parents[t_id].append(s_id); self.children[s_id].append(t_id)
+            elif r_type == 'spouse' and t_id not in self.spouses[s_id]:
+                self.spouses[s_id].append(t_id); self.spouses[t_id].append(s_id)
+        self.death_key = {p_id: parse_date(p.get('death_date')) for p_id, p in self.persons.items()}
+        self.birth_key = {p_id: parse_date(p.get('birth_date')) for p_id, p in self.persons.items()}
+        self._descendants, self._ancestor_levels = {}, {}
+        self._alive = _AliveTracker(self)
+
+    @classmethod
+    def from_json(cls, json_path):
+        with open(json_path, 'r', encoding='utf-8') as f: data = json.load(f)
+        return cls(data.get("persons", []), data.get("relationships", []))
+
+    def find_person(self, query):
+        """人物ID（数字）または氏名から人物IDを探す"""
+        from .kinship import find_person
+        return find_person(self.persons, query)
+
+    # --- メモ化される集合 ---
+
+    def descendant_bits(self, p_id):
+        """p_id の全子孫のビット集合（本人を含まない）"""
+        if p_id in self._descendants: return self._descendants[p_id]
+        stack, on_path = [(p_id, False)], set()
+        while stack:
+            node, done = stack.pop()
+            if done:
+                bits = 0
+                for child in self.children.get(node, ()):
+                    bits |= self.bit[child] | self._descendants.get(child, 0)
+                self._descendants[node] = bits; on_path.discard(node)
+                continue
+            if node in self._descendants or node in on_path: continue
+            on_path.add(node); stack.append((node, True))
+            for child in self.children.get(node, ()):
+                if child not in self._descendants and child not in on_path: stack.append((child, False))
+        return self._descendants[p_id]
+
+    def ancestor_levels(self, p_id):
+        """p_id の直系尊属を世代ごとにまとめた frozenset のタプル（[0]が父母）"""
+        if p_id in self._ancestor_levels: return self._ancestor_levels[p_id]
+        stack, on_path = [(p_id, False)], set()
+        while stack:
+            node, done = stack.pop()
+            if done:
+                levels = [set(self.parents.get(node, ()))]
+                for parent in self.parents.get(node, ()):
+                    for depth, ancestors in enumerate(self._ancestor_levels.get(parent, ()), start=1):
+                        if depth == len(levels): levels.append(set())
+                        levels[depth] |= ancestors
+                self._ancestor_levels[node] = tuple(frozenset(s) for s in levels if s)
+                on_path.discard(node)
+                continue
+            if node in self._ancestor_levels or node in on_path: continue
+            on_path.add(node); stack.append((node, True))
+            for parent in self.parents.get(node, ()):
+                if parent not in self._ancestor_levels and parent not in on_path: stack.append((parent, False))
+        return self._ancestor_levels[p_id]
+
+    def siblings(self, p_id):
+        """父母の一方または双方を同じくする兄弟姉妹と、全血（父母とも同じ）かどうか"""
+        own_parents = set(self.parents.get(p_id, ()))
+        result = {}
+        for parent in own_parents:
+            for sibling in self.children.get(parent, ()):
+                if sibling == p_id or sibling in result: continue
+                shared = own_parents & set(self.parents.get(sibling, ()))
+                result[sibling] = len(shared) >= 2 or set(self.parents.get(sibling, ())) == own_parents
+        return result
+
+    # --- 相続人の判定 ---
+
+    def determine(self, decedent_id):
+        """被相続人1人分の法定相続人・相続分を判定する"""
+        person = self.persons[decedent_id]
+        t = self.death_key.get(decedent_id)
+        warnings = []
+        if t is None:
+            warnings.append("被相続人の死亡日が読み取れないため、死亡日の記載がない人物を生存者とみなしました。")
+            alive_bits = 0
+            for p_id in self.ids:
+                if not self.persons[p_id].get('death_date'): alive_bits |= self.bit[p_id]
+        else:
+            alive_bits = self._alive.alive_bits(t)
+        alive_bits &= ~self.bit[decedent_id]
+        is_alive = lambda p_id: bool(alive_bits & self.bit[p_id])
+
+        spouses = [s for s in self.spouses.get(decedent_id, ()) if is_alive(s)]
+        if len(spouses) > 1:
+            warnings.append("生存している配偶者が複数います。離婚の有無を戸籍で確認してください。")
+
+        rank, blood = None, []
+        if self.descendant_bits(decedent_id) & alive_bits:
+            for child in self.children.get(decedent_id, ()):
+                stirp = self._representation(child, is_alive, alive_bits, relation="子", nested=True)
+                if stirp: blood.append((Fraction(1), stirp))
+            if blood: rank = 1
+        if rank is None:
+            for ancestors in self.ancestor_levels(decedent_id):
+                living = [a for a in ancestors if is_alive(a)]
+                if living:
+                    rank = 2
+                    blood = [(Fraction(1), [(a, Fraction(1), "直系尊属", None)]) for a in sorted(living)]
+                    break
+        if rank is None:
+            for sibling, full_blood in sorted(self.siblings(decedent_id).items()):
+                stirp = self._representation(sibling, is_alive, alive_bits, relation="兄弟姉妹", nested=False)
+                if stirp: blood.append((Fraction(2 if full_blood else 1), stirp))
+            if blood: rank = 3
+
+        heirs = []
+        spouse_share = SPOUSE_SHARES[rank] if spouses else Fraction(0)
+        for spouse in spouses:
+            heirs.append(self._heir_entry(spouse, spouse_share / len(spouses), "配偶者", None))
+        if blood:
+            blood_share = 1 - spouse_share
+            total_weight = sum(weight for weight, _ in blood)
+            for weight, stirp in blood:
+                for p_id, fraction, relation, via in stirp:
+                    heirs.append(self._heir_entry(p_id, blood_share * weight / total_weight * fraction, relation, via))
+        for heir in heirs:
+            if self.persons[heir["id"]].get('death_date') and self.death_key.get(heir["id"]) is None:
+                warnings.append(f"{heir['name']} の死亡日が読み取れないため、生存者として扱いました。")
+        if not heirs: warnings.append("法定相続人が見つかりませんでした（相続人不存在の可能性）。")
+
+        return {
+            "decedent": decedent_id,
+            "name": person.get('name'),
+            "death_date": person.get('death_date'),
+            "rank": RANK_LABELS[rank] if heirs else None,
+            "heirs": heirs,
+            "warnings": warnings,
+        }
+
+    def _representation(self, p_id, is_alive, alive_bits, relation, nested):
+        """
+        p_id が生存していれば本人、先に死亡していれば子が代襲する（株分け）。
+        nested=True なら再代襲（孫→曾孫…）も認め、False なら兄弟姉妹の子までとする。
+        戻り値は [(人物ID, 株内の割合, 続柄, 代襲元ID)] 。
+        """
+        if is_alive(p_id): return [(p_id, Fraction(1), relation, None)]
+        if not (self.descendant_bits(p_id) & alive_bits): return []
+        represented = []
+        for child in self.children.get(p_id, ()):
+            if nested:
+                stirp = self._representation(child, is_alive, alive_bits, "代襲相続人", nested=True)
+            else:
+                stirp = [(child, Fraction(1), "代襲相続人（おい・めい）", None)] if is_alive(child) else []
+            if stirp: represented.append([(h, f, r, via if via is not None else p_id) for h, f, r, via in stirp])
+        return [(h, f / len(represented), r, via) for stirp in represented for h, f, r, via in stirp]
+
+    def _heir_entry(self, p_id, share, relation, via):
+        entry = {"id": p_id, "name": self.persons[p_id].get('name'), "relation": relation, "share": str(share)}
+        if via is not None: entry["represents"] = via
+        return entry
+
+    def determine_all(self, decedent_ids=None):
+        """
+        複数の被相続人をまとめて判定する。死亡日順に処理することで、
+        生存者集合の差分更新とメモ化された子孫・祖先集合を最大限再利用する。
+        """
+        if decedent_ids is None:
+            decedent_ids = [p_id for p_id, p in self.persons.items() if p.get('death_date')]
+        ordered = sorted(decedent_ids, key=lambda p_id: (self.death_key.get(p_id) is None, self.death_key.get(p_id) or ()))
+        results = {p_id: self.determine(p_id) for p_id in ordered}
+        return [results[p_id] for p_id in decedent_ids]
+
+    # --- 出力 ---
+
+    def related_ids(self, result):
+        """相続関係図に載せる人物（被相続人・相続人・代襲元・兄弟姉妹の親）"""
+        ids = {result["decedent"]}
+        for heir in result["heirs"]:
+            ids.add(heir["id"])
+            via = heir.get("represents")
+            if via is not None:
+                # 代襲元から相続人までの中間世代も含める
+                frontier = [via]
+                while frontier:
+                    node = frontier.pop(); ids.add(node)
+                    frontier.extend(c for c in self.children.get(node, ())
+                                    if c not in ids and self.bit[heir["id"]] & (self.bit[c] | self.descendant_bits(c)))
+        if result["rank"] != RANK_LABELS[1]:
+            ids.update(self.parents.get(result["decedent"], ()))
+        return ids
+
+    def render(self, result, output_path):
+        """被相続人と相続人に注記を付けた相続関係図を描画する"""
+        from .draw_final_tree import build_tree, calculate_layout, draw_tree
+        ids = self.related_ids(result)
+        persons = [self.persons[p_id] for p_id in ids]
+        relationships = [{"source": parent, "target": child, "type": "parent_child"}
+                         for child in ids for parent in self.parents.get(child, ()) if parent in ids]
+        relationships += [{"source": a, "target": b, "type": "spouse"}
+                          for a in ids for b in self.spouses.get(a, ()) if b in ids and a < b]
+        annotations = {result["decedent"]: {"label": "被相続人", "color": "black"}}
+        for heir in result["heirs"]:
+            annotations[heir["id"]] = {"label": f"{heir['relation']} {heir['share']}", "color": "red"}
+        nodes = build_tree(persons, relationships)
+        draw_tree(nodes, calculate_layout(nodes), output_path, annotations=annotations)
+
+
+def export_json(results, output_path=HEIRS_JSON_PATH):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({"results": results}, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,174 @@
+# instrumentation.py (処理段階ごとの時間・トークン・バイト数の計測)
+#
+# 使い方:
+#   with instrumentation.span("vision_ocr", page=3) as s:
+#       ...; s.set(bytes_uploaded=len(data), ocr_chars=len(text))
+#   instrumentation.record_page(3, retries=1)
+#   with instrumentation.document(job_id): ...   # 常駐モードでは、ページ指標をジョブごとに (job_id, ページ番号) で分ける
+#
+# enable() するまでは span() が共通の空オブジェクトを返すだけなので、計測を無効にしている
+# 通常の実行ではほとんどコストがかからない。
+
+import os
+import json
+import time
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict
+
+_enabled = False
+_lock = threading.Lock()
+_events, _pages = [], defaultdict(dict)
+_stage_totals = defaultdict(lambda: {"calls": 0, "errors": 0, "seconds": 0.0})
+_counters = defaultdict(float)
+_run_started = None
+_document = contextvars.ContextVar("kakeizu_document", default=None)  # ページ指標を分けるジョブ・文書の名前
+
+
+def _page_key(page_num):
+    """ページ指標の鍵。document() の中なら (文書, ページ番号)、外ならページ番号だけ"""
+    name = _document.get()
+    return page_num if name is None else (name, page_num)
+
+
+class _NullSpan:
+    """計測が無効なときに返す、何もしないspan"""
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def set(self, **metrics): pass
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, stage, attrs):
+        self.stage, self.attrs = stage, attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def set(self, **metrics):
+        self.attrs.update(metrics)
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        event = {"type": "span", "stage": self.stage, "start": round(self.start - _run_started, 6),
+                 "seconds": round(seconds, 6), **self.attrs}
+        if exc_type is not None: event["error"] = exc_type.__name__
+        with _lock:
+            _events.append(event)
+            totals = _stage_totals[self.stage]
+            totals["calls"] += 1; totals["seconds"] += seconds
+            if exc_type is not None: totals["errors"] += 1
+            page = self.attrs.get("page")
+            if page is not None:
+                page_totals = _pages[_page_key(page)]
+                page_totals[f"{self.stage}_sec"] = round(page_totals.get(f"{self.stage}_sec", 0.0) + seconds, 6)
+        return False
+
+
+def enable():
+    """計測を有効にし、これまでの記録を消去する"""
+    global _enabled, _run_started
+    with _lock:
+        _events.clear(); _pages.clear(); _stage_totals.clear(); _counters.clear()
+    _run_started, _enabled = time.perf_counter(), True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+@contextmanager
+def document(name):
+    """
+    この中（と in_context で渡したスレッドの処理）で記録するページ指標を、(name, ページ番号) の鍵で分ける。
+    同じプロセスで同時に動く複数のジョブが、同じページ番号の指標を上書きし合わないようにする。
+    """
+    token = _document.set(name)
+    try: yield
+    finally: _document.reset(token)
+
+
+def in_context(fn):
+    """呼び出した時点のコンテキスト（document の名前）のまま fn を動かす関数。ThreadPoolExecutor.submit に渡す"""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def page_metrics(name=None):
+    """document(name) の中で記録したページ指標の {ページ番号: 指標}（name=None なら document の外で記録したもの）"""
+    with _lock:
+        if name is None: return {k: dict(v) for k, v in _pages.items() if not isinstance(k, tuple)}
+        return {k[1]: dict(v) for k, v in _pages.items() if isinstance(k, tuple) and k[0] == name}
+
+
+def span(stage, **attrs):
+    """処理段階の所要時間を計測するコンテキストマネージャ。page=番号 を渡すとページ別にも集計する"""
+    if not _enabled: return _NULL_SPAN
+    return _Span(stage, attrs)
+
+
+def count(name, value=1):
+    """累積カウンタ（送信バイト数、リトライ回数など）を加算する"""
+    if not _enabled: return
+    with _lock: _counters[name] += value
+
+
+def record_page(page_num, **metrics):
+    """ページごとの指標（送信バイト数、OCR文字数、トークン数、リトライ回数など）を記録する。数値は加算する"""
+    if not _enabled: return
+    page_key = _page_key(page_num)
+    with _lock:
+        page = _pages[page_key]
+        for key, value in metrics.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                page[key] = page.get(key, 0) + value; _counters[key] += value
+            else:
+                page[key] = value
+
+
+def token_usage(response):
+    """Vertex AIの応答から (プロンプトのトークン数, 応答のトークン数) を取り出す。取れなければ (0, 0)"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None: return 0, 0
+    return getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0
+
+
+def write_reports(output_dir):
+    """計測結果を JSON Lines（metrics.jsonl）と Prometheus のテキストファイル（metrics.prom）に書き出す"""
+    if not _enabled: return None
+    os.makedirs(output_dir, exist_ok=True)
+    jsonl_path, prom_path = os.path.join(output_dir, "metrics.jsonl"), os.path.join(output_dir, "metrics.prom")
+    with _lock:
+        events, pages = list(_events), {k: dict(v) for k, v in _pages.items()}
+        totals, counters = {k: dict(v) for k, v in _stage_totals.items()}, dict(_counters)
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for event in events: f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        for key in sorted(pages, key=str):
+            where = {"document": key[0], "page": key[1]} if isinstance(key, tuple) else {"page": key}
+            f.write(json.dumps({"type": "page", **where, **pages[key]}, ensure_ascii=False) + "\n")
+
+    lines = ["# HELP kakeizu_stage_seconds_total Time spent in each pipeline stage.",
+             "# TYPE kakeizu_stage_seconds_total counter"]
+    lines += [f'kakeizu_stage_seconds_total{{stage="{s}"}} {t["seconds"]:.6f}' for s, t in sorted(totals.items())]
+    lines += ["# HELP kakeizu_stage_calls_total Number of times each pipeline stage ran.",
+              "# TYPE kakeizu_stage_calls_total counter"]
+    lines += [f'kakeizu_stage_calls_total{{stage="{s}"}} {t["calls"]}' for s, t in sorted(totals.items())]
+    lines += ["# HELP kakeizu_stage_errors_total Number of failed runs of each pipeline stage.",
+              "# TYPE kakeizu_stage_errors_total counter"]
+    lines += [f'kakeizu_stage_errors_total{{stage="{s}"}} {t["errors"]}' for s, t in sorted(totals.items())]
+    for name, value in sorted(counters.items()):
+        metric = "kakeizu_" + "".join(c if c.isascii() and c.isalnum() else "_" for c in name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value:g}"]
+    # textfile collector が書きかけのファイルを読まないよう、一時ファイルから置き換える
+    with open(prom_path + ".tmp", "w", encoding="utf-8") as f: f.write("\n".join(lines) + "\n")
+    os.replace(prom_path + ".tmp", prom_path)
+    return jsonl_path, prom_path
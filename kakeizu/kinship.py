@@ -0,0 +1,268 @@
+# kinship.py (親等・続柄クエリエンジン)
+
+import json
+from array import array
+from collections import defaultdict
+
+from .page_merge import normalize_name
+
+PARENT_TYPES = ('parent_child', 'adopted')
+
+# (上る世代数, 下る世代数) -> (男性, 女性, 性別不明) の続柄名
+RELATION_LABELS = {
+    (1, 0): ("父", "母", "父母"),
+    (0, 1): ("子", "子", "子"),
+    (2, 0): ("祖父", "祖母", "祖父母"),
+    (0, 2): ("孫", "孫", "孫"),
+    (3, 0): ("曾祖父", "曾祖母", "曾祖父母"),
+    (0, 3): ("曾孫", "曾孫", "曾孫"),
+    (1, 1): ("兄弟", "姉妹", "兄弟姉妹"),
+    (2, 1): ("おじ", "おば", "おじ・おば"),
+    (1, 2): ("おい", "めい", "おい・めい"),
+    (2, 2): ("いとこ", "いとこ", "いとこ"),
+}
+# 民法725条: 6親等内の血族、配偶者、3親等内の姻族が「親族」
+MAX_BLOOD_DEGREE, MAX_INLAW_DEGREE = 6, 3
+
+
+def find_person(persons, query):
+    """{人物ID: 人物} から、人物ID（数字）または氏名で人物IDを探す。見つからなければ None"""
+    query = str(query).strip()
+    if query.lstrip('-').isdigit() and int(query) in persons: return int(query)
+    key = normalize_name(query)
+    for p_id, person in persons.items():
+        if normalize_name(person.get('name')) == key: return p_id
+    return None
+
+
+class KinshipIndex:
+    """
+    統合済みの家系データ(persons/relationships)から、親等と続柄を高速に求めるための索引。
+
+    各人物に「主たる親」を一人選んだ森を作り、オイラーツアーとスパーステーブルで
+    O(1)のLCA（最近共通祖先）を引けるようにする。主たる親には、実親のうち自分の親が
+    家系データにいる方（父の家系か母の家系か）を選ぶ。婚姻で外から入った親のように、
+    自分の親がなく、子がすべて同じ主たる親を持つ親は、経由しても経路が短くならないので無視できる。
+    それ以外の親（実親と養親の両方・両親とも家系内の出身・循環を切った親）を持つ人物と
+    その子孫だけは、LCAで得た親等を上限とした祖先探索で補正する。
+    """
+
+    def __init__(self, persons_data, relationships_data):
+        self.persons = {p['id']: p for p in persons_data}
+        self.parents, self.children, self.spouses = defaultdict(list), defaultdict(list), defaultdict(list)
+        self.adopted_edges = set()
+        for rel in relationships_data:
+            s_id, t_id, r_type = rel.get('source'), rel.get('target'), rel.get('type')
+            if s_id not in self.persons or t_id not in self.persons or s_id == t_id: continue
+            if r_type in PARENT_TYPES:
+                if s_id not in self.parents[t_id]:
+                    self.parents[t_id].append(s_id); self.children[s_id].append(t_id)
+                if r_type == 'adopted': self.adopted_edges.add((s_id, t_id))
+            elif r_type == 'spouse' and t_id not in self.spouses[s_id]:
+                self.spouses[s_id].append(t_id); self.spouses[t_id].append(s_id)
+        self._build_euler_tour()
+        self._build_sparse_table()
+
+    @classmethod
+    def from_json(cls, json_path):
+        with open(json_path, 'r', encoding='utf-8') as f: data = json.load(f)
+        return cls(data.get("persons", []), data.get("relationships", []))
+
+    # --- 索引の構築 ---
+
+    def _build_euler_tour(self):
+        """主たる親（実親を養親より、自分の親がいる親をいない親より優先）による森を作り、オイラーツアーを記録する"""
+        self.primary_parent = {}
+        for child, parents in self.parents.items():
+            blood = [p for p in parents if (p, child) not in self.adopted_edges] or parents
+            self.primary_parent[child] = next((p for p in blood if self.parents.get(p)), blood[0])
+        forest_children = defaultdict(list)
+        for child, parent in self.primary_parent.items():
+            forest_children[parent].append(child)
+
+        self.depth, self.first, self.component, self.multi_parent = {}, {}, {}, {}
+        self._euler, euler_depth = [], []
+
+        def visit(node, depth, comp, multi):
+            self.depth[node], self.component[node] = depth, comp
+            self.multi_parent[node] = multi or self._has_other_line(node)
+            self.first[node] = len(self._euler)
+            self._euler.append(node); euler_depth.append(depth)
+
+        def walk(root, comp):
+            # 10万人規模でも再帰上限に当たらないよう、明示的なスタックで辿る
+            visit(root, 0, comp, False)
+            stack = [(root, iter(forest_children.get(root, ())))]
+            while stack:
+                node, it = stack[-1]
+                child = next(it, None)
+                if child is None:
+                    stack.pop()
+                    if stack:
+                        parent = stack[-1][0]
+                        self._euler.append(parent); euler_depth.append(self.depth[parent])
+                    continue
+                if child in self.first: continue
+                visit(child, self.depth[node] + 1, comp, self.multi_parent[node])
+                stack.append((child, iter(forest_children.get(child, ()))))
+
+        comp = 0
+        for p_id in self.persons:
+            if p_id not in self.primary_parent:
+                walk(p_id, comp); comp += 1
+        # 親子関係が循環している人物は、主たる親を切って新しい木の根にする
+        for p_id in self.persons:
+            if p_id not in self.first:
+                del self.primary_parent[p_id]
+                walk(p_id, comp); comp += 1
+        self._euler_depth = array('i', euler_depth)
+
+    def _has_other_line(self, node):
+        """
+        主たる親の森の外を通る、より短い経路がありうるか。主たる親以外の親が、自分の親を持つか、
+        主たる親の子でない子を持つなら True（循環を切って主たる親がない人物も、親がいれば True）。
+        """
+        primary = self.primary_parent.get(node)
+        return any(self.parents.get(parent) or any(primary not in self.parents[c] for c in self.children[parent])
+                   for parent in self.parents.get(node, ()) if parent != primary)
+
+    def _build_sparse_table(self):
+        """オイラーツアー上の区間最小（最も浅いノード）をO(1)で引くためのスパーステーブル"""
+        depth = self._euler_depth
+        n = len(depth)
+        self._table = [array('i', range(n))]
+        k = 1
+        while (1 << k) <= n:
+            prev, half = self._table[-1], 1 << (k - 1)
+            self._table.append(array('i', [a if depth[a] <= depth[b] else b
+                                           for a, b in zip(prev, prev[half:])]))
+            k += 1
+
+    # --- クエリ ---
+
+    def lca(self, a, b):
+        """主たる親の森における最近共通祖先。別の木に属する場合はNone"""
+        if self.component.get(a) is None or self.component.get(a) != self.component.get(b): return None
+        left, right = sorted((self.first[a], self.first[b]))
+        k = (right - left + 1).bit_length() - 1
+        i, j = self._table[k][left], self._table[k][right - (1 << k) + 1]
+        return self._euler[i] if self._euler_depth[i] <= self._euler_depth[j] else self._euler[j]
+
+    def _primary_chain(self, node, ancestor):
+        chain = [node]
+        while node != ancestor:
+            node = self.primary_parent[node]; chain.append(node)
+        return chain
+
+    def _ancestor_distances(self, start, limit):
+        """start から limit 世代以内（Noneなら無制限）の全祖先への最短世代数と経路を求める"""
+        dist, prev = {start: 0}, {start: None}
+        frontier, level = [start], 0
+        while frontier and (limit is None or level < limit):
+            level += 1
+            next_frontier = []
+            for node in frontier:
+                for parent in self.parents.get(node, ()):
+                    if parent not in dist:
+                        dist[parent], prev[parent] = level, node; next_frontier.append(parent)
+            frontier = next_frontier
+        return dist, prev
+
+    @staticmethod
+    def _path_to(prev, ancestor):
+        path = [ancestor]
+        while prev[path[-1]] is not None: path.append(prev[path[-1]])
+        return path[::-1]
+
+    def blood_relation(self, a, b, max_degree=None):
+        """a から見た b の血族関係（親等・共通祖先・経路）。血族でなければNone"""
+        if a not in self.persons or b not in self.persons: return None
+        if a == b: return self._describe([a], [b])
+        ancestor, bound = self.lca(a, b), None
+        if ancestor is not None:
+            bound = self.depth[a] + self.depth[b] - 2 * self.depth[ancestor]
+            # 経路上に二親・養親を持つ人物がいなければ、LCAの結果がそのまま最短
+            if not (self.multi_parent[a] or self.multi_parent[b]):
+                if max_degree is not None and bound > max_degree: return None
+                return self._describe(self._primary_chain(a, ancestor), self._primary_chain(b, ancestor))
+        limits = [x for x in (bound, max_degree) if x is not None]
+        limit = min(limits) if limits else None
+        dist_a, prev_a = self._ancestor_distances(a, limit)
+        dist_b, prev_b = self._ancestor_distances(b, limit)
+        if len(dist_b) < len(dist_a): dist_a, dist_b = dist_b, dist_a
+        best = None
+        for node, d in dist_a.items():
+            other = dist_b.get(node)
+            if other is not None and (best is None or d + other < best[0]): best = (d + other, node)
+        if best is None or (max_degree is not None and best[0] > max_degree): return None
+        return self._describe(self._path_to(prev_a, best[1]), self._path_to(prev_b, best[1]))
+
+    def _describe(self, up_chain, down_chain):
+        """up_chain: a→共通祖先, down_chain: b→共通祖先 の経路から結果を組み立てる"""
+        path = up_chain + down_chain[-2::-1]
+        up, down = len(up_chain) - 1, len(down_chain) - 1
+        via_adoption = any((path[i + 1], path[i]) in self.adopted_edges for i in range(up)) or \
+            any((path[i], path[i + 1]) in self.adopted_edges for i in range(up, len(path) - 1))
+        return {
+            "kind": "本人" if up + down == 0 else "血族",
+            "degree": up + down,
+            "common_ancestor": up_chain[-1],
+            "generations_up": up,
+            "generations_down": down,
+            "path": path,
+            "via_adoption": via_adoption,
+            "label": self.relation_label(up, down, path[-1]),
+        }
+
+    def relation_label(self, up, down, target_id):
+        """世代の上下と相手の性別から日本語の続柄名を作る"""
+        if up + down == 0: return "本人"
+        gender = (self.persons.get(target_id) or {}).get('gender')
+        labels = RELATION_LABELS.get((up, down))
+        if labels:
+            return labels[0] if gender == 'M' else labels[1] if gender == 'F' else labels[2]
+        if down == 0: return f"{up}代前の直系尊属"
+        if up == 0: return f"{down}代後の直系卑属"
+        return f"傍系血族（{up}代上って{down}代下る）"
+
+    def relation(self, a, b):
+        """
+        a から見た b の関係を求める。
+        血族 > 配偶者 > 姻族（配偶者の血族、または血族の配偶者）の順に判定する。
+        """
+        blood = self.blood_relation(a, b)
+        if blood is not None:
+            blood["is_relative"] = blood["degree"] <= MAX_BLOOD_DEGREE
+            return blood
+        if b in self.spouses.get(a, ()):
+            return {"kind": "配偶者", "degree": None, "path": [a, b], "via_adoption": False,
+                    "label": "配偶者", "is_relative": True}
+
+        best = None
+        for spouse in self.spouses.get(a, ()):
+            r = self.blood_relation(spouse, b)
+            if r and (best is None or r["degree"] < best["degree"]):
+                best = dict(r, path=[a] + r["path"], label=f"配偶者の{r['label']}")
+        for spouse in self.spouses.get(b, ()):
+            r = self.blood_relation(a, spouse)
+            if r and (best is None or r["degree"] < best["degree"]):
+                best = dict(r, path=r["path"] + [b], label=f"{r['label']}の配偶者")
+        if best is None: return None
+        best.update(kind="姻族", is_relative=best["degree"] <= MAX_INLAW_DEGREE)
+        return best
+
+    def find_person(self, query):
+        """人物ID（数字）または氏名から人物IDを探す"""
+        return find_person(self.persons, query)
+
+    def format_relation(self, a, b, result):
+        """クエリ結果を人が読める文章にする"""
+        name = lambda p_id: (self.persons[p_id].get('name') or f"ID {p_id}")
+        if result is None: return f"{name(a)} と {name(b)} の間に親族関係は見つかりませんでした。"
+        route = " → ".join(name(p_id) for p_id in result["path"])
+        if result["kind"] == "配偶者": head = f"{name(b)} は {name(a)} の配偶者です。"
+        else: head = f"{name(b)} は {name(a)} の{result['label']}（{result['kind']} {result['degree']}親等）です。"
+        lines = [head, f"  経路: {route}"]
+        if result.get("via_adoption"): lines.append("  ※ 養親子関係を経由しています（法定血族）。")
+        if not result.get("is_relative"): lines.append("  ※ 民法上の親族の範囲（6親等内の血族・3親等内の姻族）の外です。")
+        return "\n".join(lines)
@@ -0,0 +1,216 @@
+# koseki_analyzer.py
+
+import sys
+import os
+import json
+
+from . import instrumentation
+from .page_merge import list_page_files
+from .external_merge import write_merged
+
+# --- グローバル設定 ---
+PAGES_OUTPUT_DIR = "output/pages"
+PROFILE_OUTPUT_DIR = "output/profile"
+MERGED_JSON_PATH = "output/family_tree_merged.json"
+FINAL_IMAGE_PATH = "output/family_tree_final.png"
+FONT_PATH = "/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc"
+BOX_WIDTH, BOX_HEIGHT = 160, 70
+H_SPACING, V_SPACING = 40, 90
+FONT_SIZE, SMALL_FONT_SIZE = 16, 12
+LINE_WIDTH, BG_COLOR = 2, "white"
+
+# --- 機能ごとの関数定義 ---
+
+# ページ解析用のプロンプト（main.PAGE_PROMPT_TEMPLATE に「長男」「長女」からの推論を加えたもの）
+PAGE_PROMPT_TEMPLATE = """
+# 命令書
+あなたは日本の戸籍制度を熟知した専門家です。以下の【1ページ分のOCRテキスト】から、人物情報と血縁・婚姻関係を厳密に抽出し、JSON形式で出力してください。
+# 重要ルール
+- **最重要**: 「父 阿吹軍一」「母 ハナコ」のような記述を見つけたら、`relationships`に`parent_child`として必ず追加してください。
+- **推論**: 「長男」「長女」という記述は、そのページの戸主との親子関係を示唆します。これも`parent_child`として追加してください。
+- 氏名が不完全な場合（例：ハナコ）でも、文脈から氏が推測できれば補完してください（例：阿吹 ハナコ）。
+# 抽出ルール
+- **persons**:
+    - `id`: 人物の氏名を仮のIDとしてください。（例: "阿吹 軍一"）
+    - `name`, `gender`, `birth_date`, `death_date`, `notes`: 読み取れる情報を記載。
+- **relationships**:
+    - `type`: `spouse`(夫婦), `parent_child`(親子), `adopted`(養親子)
+    - `source`: 関係の元となる人物の氏名ID
+    - `target`: 関係の先となる人物の氏名ID
+# OCRテキスト:
+---
+{text}
+---
+# 出力形式 (JSONのみ):
+"""
+
+def process_and_synthesize(pdf_path):
+    """【ステップ1】PDFを解析し、統合されたJSONデータを作成する"""
+    from .main import process_document
+    from .cloud_clients import get_ocr_backend
+    from .model_router import get_router
+    from dotenv import load_dotenv
+
+    # --- AIによるページごとの解析 ---
+    print("--- AIによる自動解析を開始 ---")
+    load_dotenv()
+    try:
+        ocr_backend = get_ocr_backend()  # 環境変数 OCR_BACKEND（vision / tesseract / local-first）
+        get_router().warm_up()  # ページごとに高速モデルと高精度モデルを選ぶ
+    except Exception as e:
+        print(f"Google Cloud・OCRエンジンの初期化に失敗: {e}"); return False
+
+    manifest = process_document(pdf_path, PAGES_OUTPUT_DIR, ocr_backend=ocr_backend,
+                                prompt_template=PAGE_PROMPT_TEMPLATE)
+    if manifest is None:
+        print("PDF変換エラー: 'poppler'が必要です (brew install poppler)"); return False
+    print("\n--- 全ページの解析が完了 ---")
+
+    # --- データの統合 ---
+    print("--- AI解析結果の統合処理を開始 ---")
+    json_files = list_page_files(PAGES_OUTPUT_DIR)
+    if not json_files:
+        print(f"エラー: '{PAGES_OUTPUT_DIR}' に解析済みJSONファイルが見つかりません。"); return False
+
+    with instrumentation.span("merge") as s:
+        stats = write_merged(json_files, MERGED_JSON_PATH)  # ページが多いときは外部マージ
+        s.set(page_files=len(json_files), persons=stats["persons"])
+    print(f"✅ データ抽出・統合完了。草案データを '{MERGED_JSON_PATH}' に保存しました。")
+    return True
+
+def draw_final_tree(json_path, output_path):
+    """【ステップ2】JSONデータから最終的な家系図を描画する"""
+    import networkx as nx
+    from PIL import Image, ImageDraw, ImageFont
+    print("--- 家系図の描画を開始 ---")
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f: data = json.load(f)
+    except FileNotFoundError:
+        print(f"エラー: '{json_path}' が見つかりません。先に 'process' コマンドを実行してください。"); return
+    
+    G = nx.DiGraph()
+    persons = {p['id']: p for p in data.get("persons", [])}
+    for p_id in persons: G.add_node(p_id, data=persons[p_id])
+    for rel in data.get("relationships", []):
+        if rel.get('type') in ['parent_child', 'adopted'] and G.has_node(rel.get('source')) and G.has_node(rel.get('target')):
+            G.add_edge(rel.get('source'), rel.get('target'))
+    try:
+        with instrumentation.span("layout", nodes=G.number_of_nodes()):
+            pos = nx.drawing.nx_agraph.graphviz_layout(G, prog='dot')
+    except Exception as e:
+        print(f"レイアウト計算エラー: {e}\nGraphvizとpygraphvizのインストールを確認してください。"); return
+    
+    # 描画処理
+    with instrumentation.span("render", nodes=len(pos)):
+        min_x, max_x = min(p[0] for p in pos.values()), max(p[0] for p in pos.values())
+        min_y, max_y = min(p[1] for p in pos.values()), max(p[1] for p in pos.values())
+        canvas_width, canvas_height = int(max_x - min_x + BOX_WIDTH*2), int(max_y - min_y + BOX_HEIGHT*2)
+        img = Image.new('RGB', (canvas_width, canvas_height), BG_COLOR)
+        draw = ImageDraw.Draw(img)
+        font, small_font = ImageFont.truetype(FONT_PATH, FONT_SIZE), ImageFont.truetype(FONT_PATH, SMALL_FONT_SIZE)
+        x_offset, y_offset = -min_x + BOX_WIDTH, -min_y + BOX_HEIGHT
+
+        for u, v in G.edges():
+            ux, uy = pos[u][0] + x_offset, canvas_height - (pos[u][1] + y_offset)
+            vx, vy = pos[v][0] + x_offset, canvas_height - (pos[v][1] + y_offset)
+            draw.line((ux, uy + BOX_HEIGHT/2, ux, (uy+vy)/2), fill='gray', width=LINE_WIDTH)
+            draw.line((ux, (uy+vy)/2, vx, (uy+vy)/2), fill='gray', width=LINE_WIDTH)
+            draw.line((vx, (uy+vy)/2, vx, vy - BOX_HEIGHT/2), fill='gray', width=LINE_WIDTH)
+
+        for node_id, p_data in G.nodes(data=True):
+            person = p_data['data']
+            px, py = pos[node_id][0] + x_offset, canvas_height - (pos[node_id][1] + y_offset)
+            color = 'skyblue' if person.get('gender') == 'M' else 'lightpink' if person.get('gender') == 'F' else 'lightgray'
+            draw.rectangle((px - BOX_WIDTH/2, py - BOX_HEIGHT/2, px + BOX_WIDTH/2, py + BOX_HEIGHT/2), fill=color, outline='black', width=2)
+            name, birth, death = person.get('name', ''), person.get('birth_date', ''), person.get('death_date', '')
+            draw.text((px, py - 18), name or '', font=font, fill='black', anchor='mm')
+            draw.text((px, py), birth or '', font=small_font, fill='black', anchor='mm')
+            if death: draw.text((px, py + 18), f"死亡: {death}", font=small_font, fill='black', anchor='mm')
+
+        img.save(output_path)
+    print(f"✅ 成功！家系図を '{output_path}' に保存しました。")
+
+def query_kinship(json_path, query_a, query_b):
+    """【照会】2人の間の親等と続柄を表示する"""
+    from .kinship import KinshipIndex
+    try:
+        index = KinshipIndex.from_json(json_path)
+    except FileNotFoundError:
+        print(f"エラー: '{json_path}' が見つかりません。先に 'process' コマンドを実行してください。"); return
+    a, b = index.find_person(query_a), index.find_person(query_b)
+    for query, p_id in ((query_a, a), (query_b, b)):
+        if p_id is None: print(f"エラー: 人物 '{query}' が見つかりません。"); return
+    print(index.format_relation(a, b, index.relation(a, b)))
+
+def compute_heirs(json_path, query=None):
+    """【照会】法定相続人を判定する。人物を指定しない場合は死亡者全員分を一括で判定する"""
+    from .heirs import HeirEngine, export_json, HEIRS_JSON_PATH
+    try:
+        engine = HeirEngine.from_json(json_path)
+    except FileNotFoundError:
+        print(f"エラー: '{json_path}' が見つかりません。先に 'process' コマンドを実行してください。"); return
+    if query is None:
+        results = engine.determine_all()
+        print(f"死亡者 {len(results)} 人分の法定相続人を判定しました。")
+    else:
+        p_id = engine.find_person(query)
+        if p_id is None: print(f"エラー: 人物 '{query}' が見つかりません。"); return
+        results = [engine.determine(p_id)]
+        for heir in results[0]["heirs"]:
+            print(f"  - {heir['name']} ({heir['relation']}): {heir['share']}")
+        for warning in results[0]["warnings"]: print(f"  ※ {warning}")
+        image_path = os.path.join(os.path.dirname(HEIRS_JSON_PATH), f"heirs_{p_id}.png")
+        engine.render(results[0], image_path)
+    export_json(results, HEIRS_JSON_PATH)
+    print(f"✅ 判定結果を '{HEIRS_JSON_PATH}' に保存しました。")
+
+def print_usage():
+    print("\n--- 戸籍解析・家系図生成ツール ---")
+    print("使い方: python koseki_analyzer.py [コマンド] [--profile]")
+    print("\nコマンド:")
+    print("  process    : AIでPDFを解析し、家系図の草案データ(JSON)を作成します。")
+    print("  draw       : 生成された草案データから、家系図の画像を描画します。")
+    print("  kinship A B: 人物A(IDまたは氏名)から見た人物Bの親等と続柄を表示します。")
+    print("  heirs [A]  : 人物Aの法定相続人を判定し、相続関係図を描画します。省略時は死亡者全員分を判定します。")
+    print("\nオプション:")
+    print(f"  --profile  : 段階ごとの所要時間・トークン数などの計測とcProfileの結果を '{PROFILE_OUTPUT_DIR}' に保存します。")
+
+def run_command(args):
+    command = args[0]
+    if command == "process":
+        process_and_synthesize("input/A.pdf")
+    elif command == "draw":
+        draw_final_tree(MERGED_JSON_PATH, FINAL_IMAGE_PATH)
+    elif command == "kinship":
+        if len(args) < 3:
+            print_usage(); sys.exit(1)
+        query_kinship(MERGED_JSON_PATH, args[1], args[2])
+    elif command == "heirs":
+        compute_heirs(MERGED_JSON_PATH, args[1] if len(args) > 1 else None)
+    else:
+        print(f"エラー: 不明なコマンド '{command}'"); print_usage()
+
+def run_with_profile(args):
+    """段階ごとの計測を有効にし、cProfileの下でコマンドを実行して結果を書き出す"""
+    import cProfile
+    instrumentation.enable()
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(run_command, args)
+    finally:
+        os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+        prof_path = os.path.join(PROFILE_OUTPUT_DIR, f"{args[0]}.prof")
+        profiler.dump_stats(prof_path)
+        jsonl_path, prom_path = instrumentation.write_reports(PROFILE_OUTPUT_DIR)
+        print(f"\n📊 プロファイルを '{prof_path}' に保存しました（例: flameprof {prof_path} > flame.svg / snakeviz {prof_path}）。")
+        print(f"📊 段階別の計測結果を '{jsonl_path}' と '{prom_path}' に保存しました。")
+
+# --- メインの実行制御 ---
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--profile"]
+    if not args:
+        print_usage(); sys.exit(1)
+    if len(args) < len(sys.argv) - 1:
+        run_with_profile(args)
+    else:
+        run_command(args)
@@ -0,0 +1,200 @@
+# koseki_schema.py (LLM応答のJSONスキーマと検証)
+#
+# - response_schema(): Vertex AI に渡す persons/relationships のスキーマ（OpenAPI形式のサブセット）
+# - generation_config(): JSONのMIMEタイプとスキーマを指定した generation_config
+# - extract_json() / validate(): 応答テキストからJSONを取り出し、型付きのデータクラスで検証する
+# - generate_json(): 検証に失敗したときだけ、理由を添えて回数制限付きで出力を直させる
+
+import re
+import json
+from dataclasses import dataclass, field, asdict
+
+from . import instrumentation
+
+RELATIONSHIP_TYPES = ("spouse", "parent_child", "adopted")
+GENDER_ALIASES = {"M": "M", "F": "F", "男": "M", "女": "F", "男性": "M", "女性": "F", "m": "M", "f": "F"}
+PERSON_FIELDS = ("id", "name", "gender", "birth_date", "death_date", "notes")
+MAX_REPAIRS = 2
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.S)
+
+
+class SchemaError(ValueError):
+    """LLMの応答がJSONとして読めない、またはスキーマに合わない"""
+
+
+@dataclass
+class Person:
+    id: object
+    name: str
+    gender: str = None
+    birth_date: str = None
+    death_date: str = None
+    notes: str = None
+    extra: dict = field(default_factory=dict)  # relation_to_head など、スキーマ外の項目
+
+
+@dataclass
+class Relationship:
+    source: object
+    target: object
+    type: str
+
+
+@dataclass
+class KosekiData:
+    persons: list
+    relationships: list
+
+    def to_dict(self):
+        persons = []
+        for p in self.persons:
+            d = asdict(p); extra = d.pop("extra")
+            persons.append({**d, **extra})
+        return {"persons": persons, "relationships": [asdict(r) for r in self.relationships]}
+
+
+def response_schema(id_type=str):
+    """persons/relationships のスキーマ。ページ解析では氏名（文字列）、統合では整数をIDに使う"""
+    id_schema = {"type": "STRING"} if id_type is str else {"type": "INTEGER"}
+    nullable_string = {"type": "STRING", "nullable": True}
+    return {
+        "type": "OBJECT",
+        "properties": {
+            "persons": {"type": "ARRAY", "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "id": id_schema, "name": {"type": "STRING"},
+                    "gender": {"type": "STRING", "enum": ["M", "F"], "nullable": True},
+                    "birth_date": nullable_string, "death_date": nullable_string, "notes": nullable_string,
+                },
+                "required": ["id", "name"],
+            }},
+            "relationships": {"type": "ARRAY", "items": {
+                "type": "OBJECT",
+                "properties": {"source": id_schema, "target": id_schema,
+                               "type": {"type": "STRING", "enum": list(RELATIONSHIP_TYPES)}},
+                "required": ["source", "target", "type"],
+            }},
+        },
+        "required": ["persons", "relationships"],
+    }
+
+
+def generation_config(id_type=str, **overrides):
+    """generate_content(generation_config=...) にそのまま渡せる辞書"""
+    return {"response_mime_type": "application/json", "response_schema": response_schema(id_type), **overrides}
+
+
+def extract_json(text):
+    """
+    応答テキストからJSONオブジェクトを取り出す。```json の囲みや前後の説明文があっても、
+    最初の { から始まるオブジェクトを読む。
+    """
+    if text is None: raise SchemaError("応答が空です")
+    text = text.strip()
+    match = _FENCE_RE.search(text)
+    if match: text = match.group(1).strip()
+    start = text.find("{")
+    if start < 0: raise SchemaError("応答にJSONオブジェクトが見つかりません")
+    try:
+        obj, _ = json.JSONDecoder().raw_decode(text[start:])
+    except json.JSONDecodeError as e:
+        raise SchemaError(f"JSONとして読めません（途中で切れている可能性があります）: {e}") from e
+    return obj
+
+
+def _check_id(value, id_type, where):
+    if id_type is int:
+        if isinstance(value, bool) or not isinstance(value, int): raise SchemaError(f"{where} は整数IDである必要があります: {value!r}")
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool): value = str(value)
+    if not isinstance(value, str) or not value.strip(): raise SchemaError(f"{where} が空です")
+    return value
+
+
+def _optional_str(value, where):
+    if value is None or value == "": return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool): return str(value)
+    if not isinstance(value, str): raise SchemaError(f"{where} は文字列である必要があります: {value!r}")
+    return value
+
+
+def validate(obj, id_type=str):
+    """JSONオブジェクトを検証して KosekiData を返す。合わなければ SchemaError（どこが不正かを含む）"""
+    if not isinstance(obj, dict): raise SchemaError("最上位がオブジェクトではありません")
+    for key in ("persons", "relationships"):
+        if not isinstance(obj.get(key, []), list): raise SchemaError(f"{key} が配列ではありません")
+
+    persons = []
+    for i, p in enumerate(obj.get("persons", [])):
+        where = f"persons[{i}]"
+        if not isinstance(p, dict): raise SchemaError(f"{where} がオブジェクトではありません")
+        name = _optional_str(p.get("name"), f"{where}.name")
+        if not name: raise SchemaError(f"{where}.name がありません")
+        p_id = p.get("id")
+        p_id = name if p_id in (None, "") and id_type is str else _check_id(p_id, id_type, f"{where}.id")
+        gender = p.get("gender")
+        if gender not in (None, ""):
+            if gender not in GENDER_ALIASES: raise SchemaError(f"{where}.gender は \"M\" / \"F\" / null のいずれかです: {gender!r}")
+            gender = GENDER_ALIASES[gender]
+        persons.append(Person(p_id, name, gender or None,
+                              _optional_str(p.get("birth_date"), f"{where}.birth_date"),
+                              _optional_str(p.get("death_date"), f"{where}.death_date"),
+                              _optional_str(p.get("notes"), f"{where}.notes"),
+                              {k: v for k, v in p.items() if k not in PERSON_FIELDS}))
+
+    relationships = []
+    for i, r in enumerate(obj.get("relationships", [])):
+        where = f"relationships[{i}]"
+        if not isinstance(r, dict): raise SchemaError(f"{where} がオブジェクトではありません")
+        if r.get("type") not in RELATIONSHIP_TYPES:
+            raise SchemaError(f"{where}.type は {', '.join(RELATIONSHIP_TYPES)} のいずれかです: {r.get('type')!r}")
+        relationships.append(Relationship(_check_id(r.get("source"), id_type, f"{where}.source"),
+                                          _check_id(r.get("target"), id_type, f"{where}.target"), r["type"]))
+    return KosekiData(persons, relationships)
+
+
+def parse_response(text, id_type=str):
+    """応答テキスト → 検証済みの辞書"""
+    return validate(extract_json(text), id_type).to_dict()
+
+
+def repair_prompt(prompt, bad_text, error):
+    """前回の出力と不正な理由を添えて、スキーマどおりに出力し直させるプロンプト"""
+    return f"""{prompt}
+
+# 前回の出力の修正
+前回の出力は次の理由で不正でした: {error}
+同じ内容を、指定されたスキーマに従う完全なJSONのみで出力し直してください。説明文は不要です。
+---
+{(bad_text or "")[:4000]}
+---
+"""
+
+
+def generate_json(generate, prompt, id_type=str, max_repairs=MAX_REPAIRS, page=None, parse=None):
+    """
+    generate(prompt) -> 応答 を呼び、検証済みの辞書を返す。parse を渡すと parse_response の代わりに使う。
+    検証に失敗したときだけ最大 max_repairs 回まで修正を依頼し、それでも駄目なら SchemaError を送出する
+    （最後の応答テキストを error.text に入れる）。
+    """
+    parse = parse or (lambda text: parse_response(text, id_type))
+    current = prompt
+    for attempt in range(max_repairs + 1):
+        response = generate(current)
+        try:
+            text = response.text
+        except ValueError as e:  # 安全性フィルタなどで候補がない場合
+            text, error = None, SchemaError(f"応答にテキストがありません: {e}")
+        else:
+            try:
+                with instrumentation.span("json_parse", page=page):
+                    return parse(text)
+            except SchemaError as e: error = e
+        if attempt < max_repairs:
+            instrumentation.count("schema_repairs")
+            if page is not None: instrumentation.record_page(page, schema_repairs=1)
+            print(f"  - LLM応答がスキーマに合わないため修正を依頼します（{attempt + 1}回目）: {error}")
+            current = repair_prompt(prompt, text, error)
+    error.text = text
+    raise error
@@ -1,8 +1,11 @@
 # llm_parser.py (Vertex AI版)
 
 import os
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part
+import json
+
+from .call_controller import get_controller
+from .cloud_clients import init_vertex, get_model
+from .koseki_schema import generation_config, generate_json
 
 def parse_koseki_text(text: str) -> str:
     """
@@ -16,11 +19,11 @@ def parse_koseki_text(text: str) -> str:
         # 通常、サービスアカウントキーから自動で推測されます。
         project_id = os.getenv("GOOGLE_CLOUD_PROJECT_ID") 
         
-        # Vertex AIを初期化
-        vertexai.init(project=project_id, location="asia-northeast1") # 東京リージョン
+        # Vertex AIの初期化とモデルの作成は初回の呼び出しだけ行う
+        init_vertex(project=project_id)
 
         # 使用するモデルを指定
-        model = GenerativeModel("gemini-1.5-pro")
+        model = get_model("gemini-1.5-pro")
 
         # AIへの指示（プロンプト） - 以前と同じ
         prompt = f"""
@@ -54,11 +57,14 @@ def parse_koseki_text(text: str) -> str:
 # 出力形式 (JSONのみを出力すること):
 """
 
-        # LLMにリクエストを送信
-        response = model.generate_content(prompt)
-        
+        # LLMにリクエストを送信（スキーマに合わない応答のときだけ修正を依頼する）
+        config = generation_config(id_type=int)
+        generate = lambda p: get_controller().call("vertex", model.generate_content, p, generation_config=config,
+                                                   model="gemini-1.5-pro")
+        data = generate_json(generate, prompt, id_type=int)
+
         print("Vertex AIによるLLM解析が正常に完了しました。")
-        return response.text
+        return json.dumps(data, ensure_ascii=False, indent=2)
 
     except Exception as e:
         print(f"Vertex AIのLLM解析中にエラーが発生しました: {e}")
@@ -0,0 +1,333 @@
+# main.py (パス修正版)
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from io import BytesIO
+
+from . import instrumentation
+from .ocr_backends import VisionBackend
+from .call_controller import get_controller
+from .cloud_clients import get_ocr_backend, init_vertex, LLM_MODEL_NAME
+from .koseki_schema import generation_config, generate_json, MAX_REPAIRS
+from .model_router import get_router, looks_complete
+from .page_triage import triage_pages
+from .page_segmentation import segment_page, combine_entry_results
+from .page_packer import pack_pages, build_packed_prompt, packed_generation_config, parse_packed_response
+from .rasterize import rasterize
+from .reocr import refine_pages
+
+PAGE_WORKERS = 8  # 実際のAPI同時実行数は call_controller が AIMD で調整する
+MANIFEST_FILENAME = "pages_manifest.json"
+
+PAGE_PROMPT_TEMPLATE = """
+# 命令書
+あなたは日本の戸籍制度を熟知した専門家です。以下の【1ページ分のOCRテキスト】から、人物情報と血縁・婚姻関係を厳密に抽出し、JSON形式で出力してください。
+
+# 重要ルール
+- **このページから直接読み取れる事実のみ**を抽出してください。
+- **最重要**: 「父 阿吹軍一」「母 ハナコ」のような記述を見つけたら、それは親子関係を示す決定的な証拠です。必ず`relationships`に`parent_child`として追加してください。
+- 氏名が不完全な場合（例：ハナコ）でも、文脈から氏が推測できれば補完してください（例：阿吹 ハナコ）。
+
+# 抽出ルール
+- **persons**:
+    - `id`: 人物の氏名を仮のIDとしてください。（例: "阿吹 軍一"）
+    - `name`: 氏名。
+    - `gender`: 続柄（長男,妻,父,母など）から性別を**必ず推測し**、"M"または"F"を設定。判断不能な場合のみnull。
+    - `birth_date`, `death_date`: 元号を含む日付。
+    - `notes`: 婚姻、養子縁組、分家、死亡などの特記事項。
+- **relationships**:
+    - `type`: `spouse`(夫婦), `parent_child`(親子), `adopted`(養親子)
+    - `source`: 関係の元となる人物の氏名ID（例：親、夫）
+    - `target`: 関係の先となる人物の氏名ID（例：子、妻）
+
+# OCRテキスト:
+---
+{text}
+---
+
+# 出力形式 (JSONのみ):
+"""
+
+ENTRY_PROMPT_TEMPLATE = """
+# 命令書
+あなたは日本の戸籍制度を熟知した専門家です。以下は戸籍の1ページから切り出した【1人分の身分事項欄】です。
+この欄の人物と、欄に書かれた父母・配偶者・養親との関係のみを抽出し、JSON形式で出力してください。
+
+# 重要ルール
+- 【戸籍のヘッダー】は本籍・筆頭者を知るための参考情報です。ヘッダーの人物を、この欄に記載がない限り出力しないでください。
+- 父母・配偶者・養親は、氏名が書かれていれば persons にも含め、`relationships` で結んでください。
+- 氏名が不完全な場合（例：ハナコ）でも、ヘッダーの氏から推測できれば補完してください（例：阿吹 ハナコ）。
+
+# 抽出ルール
+- **persons**: `id` は氏名（例: "阿吹 軍一"）、`gender` は続柄から "M"/"F" を推測、`birth_date`, `death_date` は元号を含む日付、`notes` は特記事項。
+- **relationships**: `type` は `spouse`/`parent_child`/`adopted`、`source` は親・夫、`target` は子・妻の氏名ID。
+
+# 戸籍のヘッダー:
+{header}
+
+# OCRテキスト:
+---
+{text}
+---
+
+# 出力形式 (JSONのみ):
+"""
+
+def convert_pdf_to_images(pdf_path, adaptive=True):
+    """
+    PDFをページのリスト（PIL Imageオブジェクト）に変換する。
+    ページ範囲を分けて並列に描き、adaptive=True ならページごとに下見してDPIを選ぶ（rasterize.py 参照）。
+    """
+    print(f"PDFを画像に変換しています: {pdf_path}")
+    try:
+        with instrumentation.span("pdf_to_images") as s:
+            images, plan = rasterize(pdf_path, adaptive=adaptive)
+            dpis = [page["dpi"] for page in plan.values()]
+            s.set(pages=len(images), **{f"dpi_{dpi}": dpis.count(dpi) for dpi in sorted(set(dpis))})
+        return images
+    except Exception as e:
+        print(f"PDFから画像への変換中にエラーが発生しました: {e}")
+        return []
+
+def ocr_image(client, image_data, page_num=None) -> str:
+    """単一の画像データから Vision でテキストを抽出する。一時的なエラーは再試行し、それでも失敗したら例外を送出する"""
+    return VisionBackend(client).recognize(image_data, page_num).text
+
+def llm_generate(model, model_name, config, page_num, **attrs):
+    """generate_json に渡す generate(prompt) を作る。流量制御・計測はモデル名ごとに行う"""
+    def generate(prompt):
+        with instrumentation.span("llm", page=page_num, model=model_name, **attrs) as s:
+            response = get_controller().call("vertex", model.generate_content, prompt, generation_config=config,
+                                             model=model_name, page=page_num)
+            prompt_tokens, response_tokens = instrumentation.token_usage(response)
+            s.set(prompt_chars=len(prompt), prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+        instrumentation.record_page(page_num, prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+        return response
+    return generate
+
+def run_llm(attempt, text, page_num, model=None, confidence=None, accept=None):
+    """
+    attempt(model, model_name, max_repairs) を呼ぶ。model を渡すとそのモデル（偽クライアントなど）で1回だけ、
+    渡さない場合は model_router でページに合ったモデルを選び、結果が不十分なら高精度モデルでやり直す。
+    """
+    if model is not None: return attempt(model, LLM_MODEL_NAME, MAX_REPAIRS)
+    return get_router().run(attempt, text, confidence=confidence, page=page_num, accept=accept)
+
+def parse_koseki_text_for_page(text: str, page_num: int, model=None, prompt_template=None, confidence=None) -> dict:
+    """
+    【ページ解析用】テキストを解析し、スキーマで検証済みの persons/relationships を返す。
+    model を渡すとそれを使う（偽クライアントなど）。渡さない場合は OCRの信頼度 confidence なども見てモデルを選ぶ。
+    テキストが空なら None を返す。
+    API呼び出しが再試行しても失敗した場合や、修正を依頼してもスキーマに合わない場合は例外を送出する。
+    """
+    if not text.strip():
+        print(f"  - ページ {page_num} はテキストが空のためスキップします。")
+        return None
+
+    print(f"  - Vertex AI (ページ {page_num}) の解析を開始...")
+    prompt = (prompt_template or PAGE_PROMPT_TEMPLATE).format(text=text)
+    config = generation_config(id_type=str)
+
+    def attempt(model, model_name, max_repairs):
+        return generate_json(llm_generate(model, model_name, config, page_num), prompt, id_type=str,
+                             max_repairs=max_repairs, page=page_num)
+
+    return run_llm(attempt, text, page_num, model, confidence, accept=lambda data: looks_complete(data, text))
+
+def parse_packed_pages(pack, model=None, prompt_template=None, confidence=None) -> dict:
+    """
+    【ページ解析用】連続する短いページをまとめて1回で解析し、{ページ番号: persons/relationships} を返す。
+    応答に含まれなかったページは結果に入らない（モデルを選んだ場合は、高精度モデルでやり直す）。
+    """
+    page_nums = [page_num for page_num, _ in pack]
+    print(f"  - Vertex AI (ページ {', '.join(map(str, page_nums))} をまとめて) の解析を開始...")
+    prompt = build_packed_prompt(pack, prompt_template or PAGE_PROMPT_TEMPLATE)
+    config = packed_generation_config()
+
+    def attempt(model, model_name, max_repairs):
+        generate = llm_generate(model, model_name, config, page_nums[0], packed_pages=len(page_nums))
+        return generate_json(generate, prompt, max_repairs=max_repairs, page=page_nums[0],
+                             parse=lambda text: parse_packed_response(text, page_nums))
+
+    def accept(results):
+        return all(page_num in results and looks_complete(results[page_num], text) for page_num, text in pack)
+
+    return run_llm(attempt, "\n".join(text for _, text in pack), page_nums[0], model, confidence, accept)
+
+def parse_entry(segments, index, page_num, model=None, confidence=None) -> dict:
+    """【人物ごとの解析用】ページを分割した人物1人分の記載を、ヘッダーを添えた短いプロンプトで解析する"""
+    text = segments.entries[index]
+    prompt = ENTRY_PROMPT_TEMPLATE.format(header=segments.header or "（なし）", text=text)
+    config = generation_config(id_type=str)
+
+    def attempt(model, model_name, max_repairs):
+        generate = llm_generate(model, model_name, config, page_num, entry=index)
+        return generate_json(generate, prompt, id_type=str, max_repairs=max_repairs, page=page_num)
+
+    return run_llm(attempt, text, page_num, model, confidence, accept=lambda data: looks_complete(data, text))
+
+def ocr_page(image, page_num, ocr_backend):
+    """1ページ分の画像をPNGにしてOCRし、OcrResult を返す"""
+    print(f"--- ページ {page_num} の処理を開始 ---")
+    with instrumentation.span("png_encode", page=page_num), BytesIO() as output:
+        image.save(output, format="PNG")
+        image_bytes = output.getvalue()
+    return ocr_backend.recognize(image_bytes, page_num)
+
+def parse_pack(pack, model=None, prompt_template=None, confidence=None) -> dict:
+    """LLMに送る1単位（1ページ、またはまとめた短いページ）を解析し、{ページ番号: 結果} を返す"""
+    if len(pack) == 1:
+        page_num, text = pack[0]
+        return {page_num: parse_koseki_text_for_page(text, page_num, model=model, prompt_template=prompt_template,
+                                                     confidence=confidence)}
+    return parse_packed_pages(pack, model=model, prompt_template=prompt_template, confidence=confidence)
+
+def save_page_data(output_dir, page_num, json_data, packed_with=None):
+    """ページごとの結果を page_{n}_data.json に保存し、マニフェスト用の結果を返す"""
+    page_json_path = os.path.join(output_dir, f"page_{page_num}_data.json")
+    with open(page_json_path, "w", encoding="utf-8") as f:
+        json.dump(json_data, f, ensure_ascii=False, indent=2)
+    print(f"  - ページ {page_num} の解析結果を '{page_json_path}' に保存しました。")
+    entry = {"status": "ok", "file": os.path.basename(page_json_path)}
+    if packed_with: entry["packed_with"] = packed_with
+    return entry
+
+def write_manifest(output_dir, manifest):
+    """ページごとの処理結果を output_dir と同じ階層の pages_manifest.json に書き出す"""
+    path = os.path.join(os.path.dirname(os.path.normpath(output_dir)), MANIFEST_FILENAME)
+    pages = {str(page_num): manifest[page_num] for page_num in sorted(manifest)}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"pages": pages}, f, ensure_ascii=False, indent=2)
+    return path
+
+def process_document(pdf_path: str, output_dir: str, vision_client=None, model=None, prompt_template=None, pack=True,
+                     triage=True, segment=True, ocr_backend=None, adaptive_dpi=True, reocr=True):
+    """
+    ドキュメント処理のメインフロー。
+    vision_client / model を渡すと、Google Cloudの代わりにそれらを使う（fake_clients.py 参照）。
+    渡さない場合は cloud_clients の共有クライアントを使う。
+    ocr_backend（ocr_backends.py）を渡すと、Vision の代わりにそのOCRエンジンを使う。
+    model を渡さない場合は、ページごとに model_router で高速モデルと高精度モデルを選ぶ。
+    全ページを並列にOCRしたあと、page_triage で戸籍の記載がないページと重複ページを除き（triage=False なら除かない）、
+    Vision の位置情報で人物ごとに分けられるページは人物ごとに（segment=False なら分けない）、
+    残りのページは連続する短いページを page_packer でまとめて（pack=False なら1ページずつ）並列にLLM解析する。API呼び出しの流量は call_controller が調整する。
+    再試行しても失敗したページは、最後にもう一度だけ1ページずつ処理し直す。
+    PDFはページごとに選んだDPIで描く（adaptive_dpi=False なら全ページ300 DPI）。
+    OCRの信頼度が低い段落は、reocr.py で切り出して拡大し、まとめて読み直す（reocr=False なら読み直さない）。
+    ページごとの結果のマニフェストを返す（PDFを変換できなかった場合は None）。
+    """
+    images = convert_pdf_to_images(pdf_path, adaptive=adaptive_dpi)
+    if not images:
+        return None
+
+    print(f"{len(images)}ページの画像に変換しました。")
+    os.makedirs(output_dir, exist_ok=True)
+
+    ocr_backend = ocr_backend or (VisionBackend(vision_client) if vision_client else get_ocr_backend("vision"))
+    manifest, texts, annotations, failed = {}, {}, {}, set()
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as pool:
+        # 1. 全ページをOCR
+        futures = {pool.submit(instrumentation.in_context(ocr_page), images[i], i + 1, ocr_backend): i + 1 for i in range(len(images))}
+        for future in as_completed(futures):
+            page_num = futures[future]
+            try:
+                annotations[page_num] = future.result()
+                texts[page_num] = annotations[page_num].text
+            except Exception as e:
+                print(f"  - ページ {page_num} のOCR処理中にエラー: {e}")
+                failed.add(page_num)
+        if reocr:
+            annotations = refine_pages(images, annotations, ocr_backend)
+            texts = {page_num: result.text for page_num, result in annotations.items()}
+
+        # 2. 不要なページを除き、人物ごと・まとめたページごとにLLM解析し、ページごとに保存
+        for page_num in sorted(texts):
+            if not texts[page_num].strip():
+                print(f"  - ページ {page_num} はテキストが空のためスキップします。")
+                manifest[page_num] = {"status": "empty"}
+        page_texts = [(n, texts[n]) for n in sorted(texts) if texts[n].strip()]
+        if triage:
+            with instrumentation.span("triage", pages=len(page_texts)):
+                triaged = triage_pages(page_texts)
+            for page_num, entry in sorted(triaged.items()):
+                if entry["status"] == "duplicate":
+                    print(f"  - ページ {page_num} はページ {entry['duplicate_of']} の重複のためスキップします（類似度 {entry['similarity']}）。")
+                else:
+                    print(f"  - ページ {page_num} は戸籍の記載がないためスキップします（{entry['reason']}）。")
+            manifest.update(triaged)
+            page_texts = [(n, text) for n, text in page_texts if n not in triaged]
+        segmented = {}
+        if segment:
+            with instrumentation.span("segmentation", pages=len(page_texts)):
+                for page_num, _ in page_texts:
+                    segments = segment_page(annotations[page_num].annotation)
+                    if segments: segmented[page_num] = segments
+            page_texts = [(n, text) for n, text in page_texts if n not in segmented]
+        packs = pack_pages(page_texts) if pack else [[item] for item in page_texts]
+        def confidence(page_nums):
+            values = [annotations[n].confidence for n in page_nums if annotations[n].confidence is not None]
+            return min(values) if values else None
+        futures = {pool.submit(instrumentation.in_context(parse_pack), p, model, prompt_template, confidence([n for n, _ in p])): p for p in packs}
+        for page_num, segments in segmented.items():
+            print(f"  - ページ {page_num} を{len(segments.entries)}人分の記載に分けて解析します。")
+            for i in range(len(segments.entries)):
+                futures[pool.submit(instrumentation.in_context(parse_entry), segments, i, page_num, model, confidence([page_num]))] = page_num
+        entry_results = {page_num: [] for page_num in segmented}
+        for future in as_completed(futures):
+            if not isinstance(futures[future], list):
+                page_num = futures[future]
+                try:
+                    entry_results[page_num].append(future.result())
+                except Exception as e:
+                    print(f"  - ページ {page_num} の人物ごとの解析中にエラー: {e}")
+                    failed.add(page_num)
+                continue
+            page_nums = [n for n, _ in futures[future]]
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"  - ページ {', '.join(map(str, page_nums))} の解析中にエラー: {e}")
+                failed.update(page_nums); continue
+            for page_num in page_nums:
+                if results.get(page_num) is None:
+                    print(f"  - ページ {page_num} の結果が応答に含まれていません。"); failed.add(page_num); continue
+                manifest[page_num] = save_page_data(output_dir, page_num, results[page_num],
+                                                    page_nums if len(page_nums) > 1 else None)
+        for page_num, segments in segmented.items():
+            if page_num in failed: continue
+            manifest[page_num] = dict(save_page_data(output_dir, page_num, combine_entry_results(entry_results[page_num])),
+                                      entries=len(segments.entries))
+
+    # 3. 失敗したページの最終パス（制限が回復した後に1ページずつ、ページ全体のプロンプトで処理し直す）
+    for page_num in sorted(failed):
+        print(f"--- ページ {page_num} を再処理します ---")
+        try:
+            if page_num not in texts: texts[page_num] = ocr_page(images[page_num - 1], page_num, ocr_backend).text
+            json_data = parse_koseki_text_for_page(texts[page_num], page_num, model=model, prompt_template=prompt_template,
+                                                   confidence=annotations[page_num].confidence if page_num in annotations else None)
+            entry = {"status": "empty"} if json_data is None else save_page_data(output_dir, page_num, json_data)
+            manifest[page_num] = dict(entry, retried=True)
+        except Exception as e:
+            print(f"  - エラー: ページ {page_num} を再処理しても失敗しました: {e}")
+            manifest[page_num] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+    manifest_path = write_manifest(output_dir, manifest)
+    failures = [n for n in sorted(manifest) if manifest[n]["status"] == "failed"]
+    if failures:
+        print(f"エラー: {len(failures)}ページの解析に失敗しました（ページ {', '.join(map(str, failures))}）。詳細は '{manifest_path}' を参照してください。")
+    return manifest
+
+if __name__ == "__main__":
+    load_dotenv()
+    init_vertex()
+    input_dir = "input"
+    output_dir = "output/pages"
+    pdf_filename = "A.pdf"
+    
+    # ▼▼▼▼▼ ここが修正された行です ▼▼▼▼▼
+    pdf_path = os.path.join(input_dir, pdf_filename)
+    
+    process_document(pdf_path, output_dir)
+    print("\n全ページの解析が完了しました。")
\ No newline at end of file
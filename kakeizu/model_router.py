@@ -0,0 +1,122 @@
+# model_router.py (ページごとの Gemini モデルの選択と、失敗時の高精度モデルへの切り替え)
+#
+#   router = get_router()
+#   route = router.choose(text, confidence=0.93)          # Route("gemini-1.5-flash", "活字の短いページ")
+#   data = router.run(attempt, text, confidence=0.93, page=3)
+#     attempt(model, model_name, max_repairs) -> 検証済みの結果（koseki_schema.generate_json を呼ぶ関数）
+#
+# 現代の活字の戸籍は高速モデル（FAST_MODEL_NAME）でも正しく読めるため、次のページだけを高精度モデルに送る。
+#   - OCRの信頼度が MIN_FAST_CONFIDENCE 未満（かすれ・手書き）
+#   - テキストが MAX_FAST_CHARS より長い
+#   - 明治・大正など旧い元号があり、電算化（全部事項証明）の書式でない（手書きの原戸籍）
+#   - 直近の高速モデルの失敗率が MAX_FAST_FAILURE_RATE 以上（FAST_PROBE_INTERVAL 件に1件は高速モデルで試し続ける）
+# 高速モデルの応答がスキーマに合わない、または日付があるのに人物が1人も取れなかったときは、
+# 修正を依頼せずにすぐ高精度モデルでやり直す。選んだモデルと理由は instrumentation のページ指標に残る。
+
+import re
+import threading
+from collections import deque, namedtuple
+
+from . import instrumentation
+from .cloud_clients import get_model, LLM_MODEL_NAME
+from .koseki_schema import SchemaError, MAX_REPAIRS
+from .wareki import ERAS
+
+FAST_MODEL_NAME = "gemini-1.5-flash"
+ACCURATE_MODEL_NAME = LLM_MODEL_NAME
+MIN_FAST_CONFIDENCE = 0.85     # OCRの信頼度（0〜1）がこれ未満のページは高精度モデル
+MAX_FAST_CHARS = 3000          # これより長いテキストは高精度モデル
+FAST_MAX_REPAIRS = 0           # 高速モデルでは修正を依頼せず、すぐ高精度モデルに切り替える
+FAILURE_WINDOW = 20            # 失敗率を求める直近の高速モデルの呼び出し数
+MIN_FAILURE_SAMPLES = 5        # これだけ結果がたまるまでは失敗率で切り替えない
+MAX_FAST_FAILURE_RATE = 0.3
+FAST_PROBE_INTERVAL = 10       # 失敗率で切り替えている間も、この件数に1件は高速モデルで試して失敗率を更新する
+# 手書きの原戸籍に現れる元号（昭和以降は電算化された戸籍にも現れるため含めない）
+OLD_ERAS = tuple(era for era, year in ERAS.items() if year < ERAS["昭和"])
+# 電算化された戸籍（全部事項証明・個人事項証明）の書式
+COMPUTERIZED_MARKERS = ("全部事項証明", "個人事項証明", "【名】", "【生年月日】", "【続柄】", "【父】", "【母】")
+_OLD_ERA_RE = re.compile(rf"({'|'.join(OLD_ERAS)})\s*[元〇一二三四五六七八九十\d０-９]+\s*年")
+_DATE_RE = re.compile(rf"({'|'.join(ERAS)})\s*[元〇一二三四五六七八九十\d０-９]+\s*年")
+
+Route = namedtuple("Route", ["model_name", "reason"])
+
+
+def looks_complete(data, text):
+    """解析結果がありそうか。和暦の日付があるページで人物が1人も取れていなければ False"""
+    return data is None or bool(data.get("persons")) or not _DATE_RE.search(text or "")
+
+
+class ModelRouter:
+    """
+    ページのOCRテキストと信頼度から高速モデルと高精度モデルのどちらで解析するかを決め、
+    高速モデルが失敗したときは高精度モデルでやり直す。複数のスレッドから同時に使ってよい。
+    load_model(model_name) でモデルを作る（既定は cloud_clients.get_model。偽クライアントも渡せる）。
+    """
+
+    def __init__(self, fast_model_name=FAST_MODEL_NAME, accurate_model_name=ACCURATE_MODEL_NAME, load_model=get_model):
+        self.fast_model_name, self.accurate_model_name, self.load_model = fast_model_name, accurate_model_name, load_model
+        self._lock = threading.Lock()
+        self._fast_outcomes = deque(maxlen=FAILURE_WINDOW)  # True: 成功 / False: 高精度モデルに切り替え
+        self._held_back = 0  # 失敗率のために高精度モデルに回したページ数
+
+    def fast_failure_rate(self):
+        with self._lock:
+            if len(self._fast_outcomes) < MIN_FAILURE_SAMPLES: return 0.0
+            return self._fast_outcomes.count(False) / len(self._fast_outcomes)
+
+    def _observe(self, ok):
+        with self._lock: self._fast_outcomes.append(ok)
+
+    def choose(self, text, confidence=None):
+        """テキスト（まとめたページなら連結したもの）と最も低いOCR信頼度から Route を決める"""
+        text = text or ""
+        if confidence is not None and confidence < MIN_FAST_CONFIDENCE:
+            return Route(self.accurate_model_name, f"OCRの信頼度が低い（{confidence:.2f}）")
+        if len(text) > MAX_FAST_CHARS: return Route(self.accurate_model_name, f"長いテキスト（{len(text)}文字）")
+        if _OLD_ERA_RE.search(text) and not any(marker in text for marker in COMPUTERIZED_MARKERS):
+            return Route(self.accurate_model_name, "旧い元号の手書きの戸籍")
+        failure_rate = self.fast_failure_rate()
+        if failure_rate >= MAX_FAST_FAILURE_RATE:
+            with self._lock:
+                self._held_back += 1
+                probe = self._held_back % FAST_PROBE_INTERVAL == 0
+            if probe: return Route(self.fast_model_name, f"失敗率（{failure_rate:.0%}）の再確認")
+            return Route(self.accurate_model_name, f"高速モデルの直近の失敗率が高い（{failure_rate:.0%}）")
+        return Route(self.fast_model_name, "活字の短いページ")
+
+    def run(self, attempt, text, confidence=None, page=None, accept=None):
+        """
+        choose で選んだモデルで attempt(model, model_name, max_repairs) を呼ぶ。高速モデルの結果が
+        スキーマに合わない（SchemaError）か accept(結果) が False なら、高精度モデルで呼び直す。
+        """
+        route = self.choose(text, confidence)
+        instrumentation.count(f"route_{'fast' if route.model_name == self.fast_model_name else 'accurate'}")
+        if page is not None: instrumentation.record_page(page, llm_model=route.model_name, route_reason=route.reason)
+        if route.model_name == self.fast_model_name:
+            try:
+                result = attempt(self.load_model(route.model_name), route.model_name, FAST_MAX_REPAIRS)
+                if accept is None or accept(result):
+                    self._observe(True); return result
+                error = "人物が取れていないページがある"
+            except SchemaError as e:
+                error = e
+            self._observe(False)
+            instrumentation.count("route_escalations")
+            if page is not None: instrumentation.record_page(page, llm_escalations=1, llm_model=self.accurate_model_name)
+            print(f"  - ページ {page}: {route.model_name} の結果が不十分なため {self.accurate_model_name} で解析し直します（{error}）")
+        return attempt(self.load_model(self.accurate_model_name), self.accurate_model_name, MAX_REPAIRS)
+
+    def warm_up(self):
+        for model_name in (self.fast_model_name, self.accurate_model_name): self.load_model(model_name)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """プロセス全体で共有する ModelRouter（高速モデルの失敗率をジョブをまたいで覚えておく）"""
+    global _router
+    with _router_lock:
+        if _router is None: _router = ModelRouter()
+        return _router
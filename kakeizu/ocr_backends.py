@@ -0,0 +1,272 @@
+# ocr_backends.py (OCRエンジンの切り替え)
+#
+# どのエンジンも recognize(画像のバイト列, page_num) -> OcrResult を持つ。
+#   - VisionBackend: Google Cloud Vision（document_text_detection）。call_controller で流量制御する
+#   - TesseractBackend: ローカルの tesseract コマンド（jpn / jpn_vert）。ネットワークも認証情報も不要
+#   - RoutingBackend: まず primary で読み、信頼度が低いページだけ fallback で読み直す
+# 切り出した小さな画像をまとめて読むときは recognize_batch(画像のリスト) を使う（reocr.py 参照）。
+#
+#   backend = get_backend("local-first")     # 環境変数 OCR_BACKEND でも指定できる
+#   result = backend.recognize(png_bytes, page_num=3); result.text, result.confidence
+
+import os
+import shutil
+import subprocess
+from types import SimpleNamespace
+from dataclasses import dataclass
+from typing import Protocol, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+
+from . import instrumentation
+from .call_controller import get_controller
+
+TESSERACT_LANGS = "jpn_vert+jpn"   # 縦書きを優先し、横書きの行も読む
+TESSERACT_PSM = 3                  # ページ全体を自動でレイアウト解析
+TESSERACT_TIMEOUT = 300
+MIN_CONFIDENCE = 0.75              # RoutingBackend がこれ未満のページを fallback で読み直す
+MIN_CHARS = 20
+VISION_BATCH_SIZE = 16             # batch_annotate_images に1回で送れる画像の上限
+
+
+@dataclass
+class OcrResult:
+    """
+    OCR結果。annotation は Vision の full_text_annotation と同じ形（pages → blocks → paragraphs →
+    words → symbols と bounding_box）で、page_segmentation がそのまま読める。confidence は 0〜1（不明なら None）。
+    """
+    text: str
+    annotation: Any = None
+    confidence: Optional[float] = None
+    engine: str = ""
+
+
+class OcrBackend(Protocol):
+    name: str
+
+    def recognize(self, image_bytes: bytes, page_num: Optional[int] = None) -> OcrResult: ...
+
+
+def known_confidence(value):
+    """
+    Vision の信頼度（0〜1）。信頼度を返さない text_detection では 0.0 か未設定になるため、
+    0.0 と None は不明として None にそろえる（以降は `is None` で判定する）
+    """
+    return value if value else None
+
+
+def annotation_confidence(annotation):
+    """段落の文字数で重み付けした、ブロックの信頼度の平均。どのブロックの信頼度も不明なら None"""
+    total = weighted = 0.0
+    for page in getattr(annotation, "pages", None) or []:
+        for block in getattr(page, "blocks", []):
+            confidence = known_confidence(getattr(block, "confidence", None))
+            if confidence is None: continue
+            chars = sum(len(s.text) for p in getattr(block, "paragraphs", []) for w in p.words for s in w.symbols) or 1
+            total += chars; weighted += confidence * chars
+    return weighted / total if total else None
+
+
+class VisionBackend:
+    """
+    Google Cloud Vision の document_text_detection（ブロック・段落ごとの信頼度を返す）。
+    client を渡すとそれを使う（fake_clients.FakeVisionClient など）
+    """
+    name = "vision"
+
+    def __init__(self, client=None):
+        try:
+            from google.cloud import vision
+        except ImportError:
+            if client is None: raise
+            vision = None  # 偽クライアントだけで動かす場合
+        self._vision = vision
+        self._image = vision.Image if vision else (lambda content: SimpleNamespace(content=content))
+        self.client = client or vision.ImageAnnotatorClient()
+
+    def _image_context(self):
+        if self._vision is None: return {"language_hints": ["ja"]}
+        return self._vision.ImageContext(language_hints=["ja"])
+
+    def recognize(self, image_bytes, page_num=None):
+        def detect():
+            response = self.client.document_text_detection(image=self._image(content=image_bytes),
+                                                           image_context=self._image_context())
+            if response.error.message:
+                raise Exception(response.error.message)
+            return response
+
+        with instrumentation.span("vision_ocr", page=page_num) as s:
+            response = get_controller().call("vision", detect, page=page_num)
+            annotation = response.full_text_annotation
+            s.set(bytes_uploaded=len(image_bytes), ocr_chars=len(annotation.text))
+        instrumentation.record_page(page_num, bytes_uploaded=len(image_bytes), ocr_chars=len(annotation.text))
+        return OcrResult(annotation.text, annotation, annotation_confidence(annotation), self.name)
+
+    def recognize_pdf(self, pdf_path):
+        """PDFを1回の batch_annotate_files で読み、ページごとの OcrResult を返す"""
+        vision = self._vision
+        with open(pdf_path, "rb") as f:
+            content = f.read()
+        request = vision.AnnotateFileRequest(
+            input_config=vision.InputConfig(content=content, mime_type="application/pdf"),
+            features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)])
+        with instrumentation.span("vision_ocr", bytes_uploaded=len(content)):
+            response = get_controller().call("vision", self.client.batch_annotate_files, requests=[request])
+        return [OcrResult(r.full_text_annotation.text, r.full_text_annotation, annotation_confidence(r.full_text_annotation), self.name)
+                for r in response.responses[0].responses]
+
+    def _image_request(self, content):
+        vision = self._vision
+        if vision is None:
+            return SimpleNamespace(image=self._image(content=content), features=[], image_context=None)
+        return vision.AnnotateImageRequest(
+            image=vision.Image(content=content),
+            features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
+            image_context=self._image_context())
+
+    def recognize_batch(self, images, page_num=None):
+        """
+        小さな画像のリストを batch_annotate_images で VISION_BATCH_SIZE 枚ずつまとめて読み、
+        画像ごとの OcrResult（その画像だけ失敗した場合は None）を返す
+        """
+        results = []
+        for start in range(0, len(images), VISION_BATCH_SIZE):
+            chunk = images[start:start + VISION_BATCH_SIZE]
+            requests = [self._image_request(content) for content in chunk]
+            with instrumentation.span("vision_ocr_batch", page=page_num, images=len(chunk), bytes_uploaded=sum(map(len, chunk))):
+                response = get_controller().call("vision", self.client.batch_annotate_images, requests=requests, page=page_num)
+            for r in response.responses:
+                if r.error.message: results.append(None); continue
+                annotation = r.full_text_annotation
+                results.append(OcrResult(annotation.text, annotation, annotation_confidence(annotation), self.name))
+        return results
+
+
+def _box(x0, y0, x1, y1):
+    return SimpleNamespace(vertices=[SimpleNamespace(x=x0, y=y0), SimpleNamespace(x=x1, y=y0),
+                                     SimpleNamespace(x=x1, y=y1), SimpleNamespace(x=x0, y=y1)])
+
+
+def parse_tesseract_tsv(tsv):
+    """
+    tesseract の TSV 出力を OcrResult にする。単語（level 5）を段落ごとにまとめて
+    Vision と同じ形の annotation を作り、信頼度は文字数で重み付けした単語の conf の平均。
+    """
+    paragraphs, order = {}, []
+    lines = tsv.splitlines()
+    for line in lines[1:]:
+        cols = line.split("\t")
+        if len(cols) < 12 or cols[0] != "5": continue
+        text = cols[11].strip()
+        if not text: continue
+        key = (int(cols[2]), int(cols[3]))  # (block_num, par_num)
+        if key not in paragraphs: paragraphs[key] = {}; order.append(key)
+        left, top, width, height, conf = int(cols[6]), int(cols[7]), int(cols[8]), int(cols[9]), float(cols[10])
+        paragraphs[key].setdefault(int(cols[4]), []).append((text, left, top, left + width, top + height, conf))
+
+    blocks, texts, total, weighted = [], [], 0, 0.0
+    for key in order:
+        words, para_lines = [], []
+        for line_num in sorted(paragraphs[key]):
+            line_words = paragraphs[key][line_num]
+            para_lines.append("".join(w[0] for w in line_words))
+            for text, x0, y0, x1, y1, conf in line_words:
+                words.append(SimpleNamespace(symbols=[SimpleNamespace(text=c, property=None) for c in text], bounding_box=_box(x0, y0, x1, y1)))
+                if conf >= 0: total += len(text); weighted += conf / 100 * len(text)
+        all_words = [w for ws in paragraphs[key].values() for w in ws]
+        box = _box(min(w[1] for w in all_words), min(w[2] for w in all_words), max(w[3] for w in all_words), max(w[4] for w in all_words))
+        blocks.append(SimpleNamespace(paragraphs=[SimpleNamespace(words=words, bounding_box=box)], bounding_box=box, confidence=None))
+        texts.append("\n".join(para_lines))
+    text = "\n".join(texts) + ("\n" if texts else "")
+    annotation = SimpleNamespace(text=text, pages=[SimpleNamespace(blocks=blocks)] if blocks else [])
+    return OcrResult(text, annotation, weighted / total if total else None, "tesseract")
+
+
+def _run_tesseract(image_bytes, langs, psm, timeout):
+    # 並列に動かすので、tesseract 自身のスレッドは1本に抑える
+    completed = subprocess.run(["tesseract", "stdin", "stdout", "-l", langs, "--psm", str(psm), "tsv"],
+                               input=image_bytes, capture_output=True, timeout=timeout,
+                               env=dict(os.environ, OMP_THREAD_LIMIT="1"))
+    if completed.returncode != 0:
+        raise RuntimeError(f"tesseract が失敗しました: {completed.stderr.decode('utf-8', 'replace').strip()}")
+    return completed.stdout.decode("utf-8")
+
+
+class TesseractBackend:
+    """
+    ローカルの tesseract コマンドでOCRする。tesseract はページごとに別プロセスで動くため、
+    同時に動かすプロセス数を workers（既定はCPU数）で制限する。
+    """
+    name = "tesseract"
+
+    def __init__(self, langs=TESSERACT_LANGS, psm=TESSERACT_PSM, workers=None, timeout=TESSERACT_TIMEOUT):
+        if not self.available():
+            raise RuntimeError("tesseract が見つかりません（例: brew install tesseract tesseract-lang）")
+        self.langs, self.psm, self.timeout = langs, psm, timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 2)
+
+    @staticmethod
+    def available():
+        return shutil.which("tesseract") is not None
+
+    def recognize(self, image_bytes, page_num=None):
+        with instrumentation.span("tesseract_ocr", page=page_num) as s:
+            tsv = self._pool.submit(_run_tesseract, image_bytes, self.langs, self.psm, self.timeout).result()
+            result = parse_tesseract_tsv(tsv)
+            s.set(ocr_chars=len(result.text), confidence=result.confidence)
+        instrumentation.record_page(page_num, ocr_chars=len(result.text))
+        return result
+
+    def close(self):
+        self._pool.shutdown()
+
+
+class RoutingBackend:
+    """
+    primary（ローカルなど）で読み、信頼度が min_confidence 未満か文字数が min_chars 未満、
+    または primary が失敗したページだけ fallback（Vision など）で読み直す。
+    """
+
+    def __init__(self, primary, fallback, min_confidence=MIN_CONFIDENCE, min_chars=MIN_CHARS):
+        self.primary, self.fallback = primary, fallback
+        self.min_confidence, self.min_chars = min_confidence, min_chars
+        self.name = f"{primary.name}>{fallback.name}"
+
+    def recognize(self, image_bytes, page_num=None):
+        try:
+            result = self.primary.recognize(image_bytes, page_num)
+        except Exception as e:
+            print(f"  - {self.primary.name} のOCRに失敗したため {self.fallback.name} で読み直します: {e}")
+        else:
+            confident = result.confidence is None or result.confidence >= self.min_confidence
+            if confident and len(result.text.strip()) >= self.min_chars:
+                return result
+        instrumentation.count("ocr_fallbacks")
+        if page_num is not None: instrumentation.record_page(page_num, ocr_engine=self.fallback.name)
+        return self.fallback.recognize(image_bytes, page_num)
+
+
+def get_backend(name=None, vision_client=None):
+    """
+    名前からOCRエンジンを作る（省略時は環境変数 OCR_BACKEND、なければ "vision"）。
+    "vision" / "tesseract" / "local-first"（tesseract で読み、信頼度が低いページだけ Vision）
+    """
+    name = name or os.getenv("OCR_BACKEND", "vision")
+    if name == "vision": return VisionBackend(vision_client)
+    if name == "tesseract": return TesseractBackend()
+    if name == "local-first": return RoutingBackend(TesseractBackend(), VisionBackend(vision_client))
+    raise ValueError(f"不明なOCRエンジンです: {name}（vision / tesseract / local-first）")
+
+
+def recognize_pdf(backend, pdf_path, dpi=300):
+    """PDF全体をOCRしてページごとの OcrResult を返す。まとめて読めるエンジン（Vision）はPDFのまま送る"""
+    if hasattr(backend, "recognize_pdf"): return backend.recognize_pdf(pdf_path)
+    from io import BytesIO
+    from .rasterize import rasterize
+    images, _ = rasterize(pdf_path, adaptive=False, dpi=dpi)
+    results = []
+    for page_num, image in enumerate(images, start=1):
+        with BytesIO() as buf:
+            image.save(buf, format="PNG")
+            results.append(backend.recognize(buf.getvalue(), page_num))
+    return results
@@ -0,0 +1,35 @@
+# ocr_processor.py
+
+import os
+
+from .ocr_backends import get_backend, recognize_pdf, VisionBackend
+
+def get_document_text(pdf_path: str, backend=None) -> str:
+    """
+    指定されたPDFファイルからテキストを抽出します。
+
+    Args:
+        pdf_path (str): 解析するPDFファイルのパス。
+        backend: OCRエンジン（ocr_backends.py）。省略時は環境変数 OCR_BACKEND、なければGoogle Cloud Vision API。
+
+    Returns:
+        str: 抽出された全てのテキストを結合した文字列。
+             エラーが発生した場合はNone。
+    """
+    print(f"OCR処理を開始します: {pdf_path}")
+
+    try:
+        backend = backend or get_backend()
+        if isinstance(backend, VisionBackend) and not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+            print("エラー: 環境変数 'GOOGLE_APPLICATION_CREDENTIALS' が設定されていません。")
+            return None
+
+        # Vision はPDFをまとめて1回で、その他のエンジンはページごとに読む
+        all_text = "".join(result.text for result in recognize_pdf(backend, pdf_path))
+
+        print("OCR処理が正常に完了しました。")
+        return all_text
+
+    except Exception as e:
+        print(f"OCR処理中にエラーが発生しました: {e}")
+        return None
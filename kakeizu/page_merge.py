@@ -0,0 +1,275 @@
+# page_merge.py (ページごとの解析結果の統合)
+
+import os
+import json
+import glob
+import hashlib
+from collections import defaultdict
+
+from .koseki_schema import SchemaError, validate
+
+
+def normalize_name(name):
+    """名寄せ用に氏名から半角・全角スペースを取り除く"""
+    return (name or "").replace(" ", "").replace("　", "")
+
+
+def relationship_name(name):
+    """関係性の source/target 側の氏名キー（従来どおり半角スペースのみ除去）"""
+    return str(name or "").replace(" ", "")
+
+
+def list_page_files(pages_dir):
+    return sorted(glob.glob(os.path.join(pages_dir, "*.json")))
+
+
+def iter_page_data(json_files):
+    """ページJSONを1ファイルずつ読み込む。JSONとして壊れているファイルは警告を出して読み飛ばす"""
+    for file_path in json_files:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            try: data = json.load(f)
+            except json.JSONDecodeError as e:
+                print(f"警告: '{file_path}' はJSONとして読み込めないため統合から除外します: {e}"); continue
+        if not isinstance(data, dict):
+            print(f"警告: '{file_path}' は persons/relationships のオブジェクトではないため統合から除外します。"); continue
+        yield data
+
+
+def merge_pages(page_datas):
+    """
+    ページ単位の persons/relationships を氏名で名寄せして1つの家系データにまとめる。
+    - 同じ氏名の人物は最初に現れたものを基準に、空の項目だけを後のページで補う
+    - IDは氏名順に1から振り直す
+    - 関係性は (種類, 元, 先) で重複を除く（夫婦は向きを区別しない）
+    """
+    all_persons_by_name, all_relationships = {}, []
+    for data in page_datas:
+        for p_data in data.get("persons", []):
+            name = normalize_name(p_data.get("name", ""))
+            if not name: continue
+            if name not in all_persons_by_name: all_persons_by_name[name] = p_data
+            else:
+                for k, v in p_data.items():
+                    if v and not all_persons_by_name[name].get(k): all_persons_by_name[name][k] = v
+        for r_data in data.get("relationships", []):
+            all_relationships.append(r_data)
+
+    final_persons, name_to_id, current_id = [], {}, 1
+    for name, p_data in sorted(all_persons_by_name.items()):
+        name_to_id[name] = current_id
+        p_data['id'] = current_id; final_persons.append(p_data); current_id += 1
+
+    final_relationships, rel_set = [], set()
+    for rel in all_relationships:
+        s_name, t_name = relationship_name(rel.get("source")), relationship_name(rel.get("target"))
+        if s_name in name_to_id and t_name in name_to_id:
+            s_id, t_id, r_type = name_to_id[s_name], name_to_id[t_name], rel.get("type")
+            rel_tuple = (r_type, tuple(sorted((s_id, t_id)))) if r_type == "spouse" else (r_type, s_id, t_id)
+            if rel_tuple not in rel_set:
+                final_relationships.append({"source": s_id, "target": t_id, "type": r_type}); rel_set.add(rel_tuple)
+
+    return {"persons": final_persons, "relationships": final_relationships}
+
+
+def merge_page_files(json_files):
+    return merge_pages(iter_page_data(json_files))
+
+
+MAX_PENDING_RELATIONSHIPS = 100000  # 保留する関係性の上限（超えた分は古いものから解決できない関係性として報告する）
+MAX_REPORTED_UNRESOLVABLE = 100      # 索引に例として残す解決できない関係性の数
+
+
+def _relationship_key(s_id, t_id, r_type):
+    return (r_type, tuple(sorted((s_id, t_id)))) if r_type == "spouse" else (r_type, s_id, t_id)
+
+
+def _resolvable(name):
+    """関係性の氏名キーが、いずれ人物の氏名（normalize_name）と一致しうるか（空や全角スペース入りは一致しない）"""
+    return bool(name) and normalize_name(name) == name
+
+
+class MergeIndex:
+    """
+    統合済みの家系データに、新しいページの結果だけを追加で名寄せするための索引。
+    merge_pages と同じ規則（氏名で名寄せし空の項目だけ補う・関係性は rel_set で重複を除く）で追加するが、
+      - 既存の人物のIDは変えず、新しい人物には既存の最大ID＋1から氏名順に振る
+      - 片方の人物がまだいない関係性は、いない側の氏名ごとに保留し、その氏名の人物が現れたときだけ追加を試す
+      - 人物の氏名と一致しえない関係性（氏名が空・全角スペース入り）は保留せず、解決できない関係性として報告する
+      - 統合済みのページJSONは内容のハッシュで覚えておき、同じ内容は二度と統合しない
+    索引は統合データの隣の <名前>.index.json に保存する（なければ統合データから作り直す）。
+    """
+
+    def __init__(self, data=None, pending=None, merged_hashes=None, unresolvable=None):
+        data = data or {"persons": [], "relationships": []}
+        self.persons, self.relationships = data["persons"], data["relationships"]
+        self.by_name = {normalize_name(p.get("name")): p for p in self.persons}
+        self.rel_set = {_relationship_key(r["source"], r["target"], r.get("type")) for r in self.relationships}
+        self.next_id = max((p["id"] for p in self.persons), default=0) + 1
+        self.pending, self._pending_keys = {}, set()  # いない側の氏名 -> 関係性のリスト
+        self.merged_hashes = set(merged_hashes or [])
+        unresolvable = unresolvable or {}
+        self.unresolvable_count = unresolvable.get("count", 0)
+        self.unresolvable = list(unresolvable.get("examples", []))
+        for rel in pending or []: self._defer(rel)
+
+    @staticmethod
+    def index_path(merged_path):
+        return os.path.splitext(merged_path)[0] + ".index.json"
+
+    @classmethod
+    def load(cls, merged_path):
+        """統合データと索引を読み込む。統合データがなければ空の索引を返す"""
+        if not os.path.exists(merged_path): return cls()
+        with open(merged_path, "r", encoding="utf-8") as f: data = json.load(f)
+        index = {}
+        if os.path.exists(cls.index_path(merged_path)):
+            with open(cls.index_path(merged_path), "r", encoding="utf-8") as f: index = json.load(f)
+        return cls(data, index.get("pending_relationships"), index.get("merged_pages"), index.get("unresolvable_relationships"))
+
+    def save(self, merged_path):
+        with open(merged_path, "w", encoding="utf-8") as f: json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        with open(self.index_path(merged_path), "w", encoding="utf-8") as f:
+            json.dump({"pending_relationships": self.pending_relationships(), "merged_pages": sorted(self.merged_hashes),
+                       "unresolvable_relationships": {"count": self.unresolvable_count, "examples": self.unresolvable}},
+                      f, ensure_ascii=False)
+
+    def to_dict(self):
+        return {"persons": self.persons, "relationships": self.relationships}
+
+    def pending_relationships(self):
+        return [rel for rels in self.pending.values() for rel in rels]
+
+    def _report_unresolvable(self, rel, reason):
+        self.unresolvable_count += 1
+        if len(self.unresolvable) < MAX_REPORTED_UNRESOLVABLE: self.unresolvable.append({"reason": reason, "relationship": rel})
+
+    def _defer(self, rel):
+        """
+        人物がいない側の氏名で関係性を保留する。人物の氏名と一致しえなければ報告に回して False を返す。
+        同じ (種類, 元, 先) の関係性が保留中なら何もしない。
+        """
+        s_name, t_name = relationship_name(rel.get("source")), relationship_name(rel.get("target"))
+        if not (_resolvable(s_name) and _resolvable(t_name)):
+            self._report_unresolvable(rel, "name_mismatch"); return False
+        key = (rel.get("type"), s_name, t_name)
+        if key in self._pending_keys: return True
+        missing = s_name if s_name not in self.by_name else t_name
+        self.pending.setdefault(missing, []).append(rel); self._pending_keys.add(key)
+        return True
+
+    def _undefer(self, name):
+        """氏名 name の人物を待っていた関係性を保留から外して返す"""
+        rels = self.pending.pop(name, [])
+        for rel in rels:
+            self._pending_keys.discard((rel.get("type"), relationship_name(rel.get("source")), relationship_name(rel.get("target"))))
+        return rels
+
+    def _trim_pending(self):
+        """保留が MAX_PENDING_RELATIONSHIPS を超えたら、古く保留した氏名のものから報告に回す"""
+        while len(self._pending_keys) > MAX_PENDING_RELATIONSHIPS:
+            for rel in self._undefer(next(iter(self.pending))): self._report_unresolvable(rel, "pending_limit")
+
+    def _add_relationship(self, rel):
+        """両端の人物がいれば追加して True、いなければ False（重複は追加せず True）"""
+        s_name, t_name = relationship_name(rel.get("source")), relationship_name(rel.get("target"))
+        s_person, t_person = self.by_name.get(s_name), self.by_name.get(t_name)
+        if s_person is None or t_person is None: return False
+        s_id, t_id, r_type = s_person["id"], t_person["id"], rel.get("type")
+        key = _relationship_key(s_id, t_id, r_type)
+        if key not in self.rel_set:
+            self.relationships.append({"source": s_id, "target": t_id, "type": r_type}); self.rel_set.add(key)
+        return True
+
+    def add_pages(self, page_datas):
+        """
+        ページ単位の persons/relationships を追加し、追加・更新した件数を返す。
+        保留中の関係性は、今回新しく現れた氏名を待っていたものだけを試す（保留の件数に比例する処理はしない）。
+        """
+        new_persons, updated, relationships = {}, set(), []
+        for data in page_datas:
+            for p_data in data.get("persons", []):
+                name = normalize_name(p_data.get("name", ""))
+                if not name: continue
+                person = self.by_name.get(name) or new_persons.get(name)
+                if person is None: new_persons[name] = p_data; continue
+                for k, v in p_data.items():
+                    if v and not person.get(k): person[k] = v; updated.add(name)
+            relationships.extend(data.get("relationships", []))
+
+        for name, p_data in sorted(new_persons.items()):
+            p_data["id"] = self.next_id; self.next_id += 1
+            self.persons.append(p_data); self.by_name[name] = p_data
+        retried = [rel for name in sorted(new_persons) for rel in self._undefer(name)]
+
+        before, unresolvable_before = len(self.relationships), self.unresolvable_count
+        for rel in retried + relationships:
+            if not self._add_relationship(rel): self._defer(rel)
+        self._trim_pending()
+        return {"new_persons": len(new_persons), "updated_persons": len(updated - set(new_persons)),
+                "new_relationships": len(self.relationships) - before, "pending_relationships": len(self._pending_keys),
+                "unresolvable_relationships": self.unresolvable_count - unresolvable_before}
+
+    def add_page_files(self, json_files):
+        """まだ統合していない内容のページJSONだけを追加する"""
+        fresh = []
+        for file_path in json_files:
+            with open(file_path, "rb") as f: digest = hashlib.sha1(f.read()).hexdigest()
+            if digest not in self.merged_hashes: fresh.append((file_path, digest))
+        stats = self.add_pages(iter_page_data(path for path, _ in fresh))
+        self.merged_hashes.update(digest for _, digest in fresh)
+        return dict(stats, page_files=len(fresh), skipped_files=len(json_files) - len(fresh))
+
+
+class StreamMerger:
+    """
+    AIによる統合のストリーミング応答から届いた人物・関係性を、届いたそばから統合データに加える。
+    stream_json.parse_stream の on_item としてそのまま渡せる（merger(種類, 要素)）。
+    応答は名寄せ済みなので、同じ氏名でも応答のIDが違えば別人として扱い（generate_json の経路と同じ結果）、
+    応答のIDには届いた順に1からの新しいIDを振る。まだ届いていない人物との関係性はその人物が届くまで待たせ、
+    自分自身を指す関係性は加えずに self_loops に取り分ける。スキーマに合わない要素と重複したIDは加えずに数だけ数える。
+    """
+
+    def __init__(self):
+        self.persons, self.relationships, self.rel_set = [], [], set()
+        self.ids = {}                     # 応答の人物ID -> 統合データのID
+        self.waiting = defaultdict(list)  # 応答の人物ID -> その人物を待っている関係性
+        self.self_loops, self.invalid = [], 0
+
+    def __call__(self, kind, item):
+        try: data = validate({kind: [item]}, id_type=int).to_dict()
+        except SchemaError:
+            self.invalid += 1; return
+        if kind == "persons":
+            person = data["persons"][0]; p_id = person["id"]
+            if p_id in self.ids:
+                self.invalid += 1; return
+            self.ids[p_id] = person["id"] = len(self.persons) + 1
+            self.persons.append(person)
+            for rel in self.waiting.pop(p_id, []): self._add_relationship(rel)
+        else:
+            self._add_relationship(data["relationships"][0])
+
+    def _add_relationship(self, rel):
+        if rel["source"] == rel["target"]:
+            self.self_loops.append(rel); return
+        missing = next((p_id for p_id in (rel["source"], rel["target"]) if p_id not in self.ids), None)
+        if missing is not None:
+            self.waiting[missing].append(rel); return
+        s_id, t_id, r_type = self.ids[rel["source"]], self.ids[rel["target"]], rel["type"]
+        key = _relationship_key(s_id, t_id, r_type)
+        if key not in self.rel_set:
+            self.relationships.append({"source": s_id, "target": t_id, "type": r_type}); self.rel_set.add(key)
+
+    def waiting_relationships(self):
+        return sum(map(len, self.waiting.values()))
+
+    def to_dict(self):
+        return {"persons": self.persons, "relationships": self.relationships}
+
+
+def merge_into(merged_path, json_files):
+    """統合済みの merged_path に json_files の結果だけを追加して保存し、件数を返す"""
+    index = MergeIndex.load(merged_path)
+    stats = index.add_page_files(json_files)
+    index.save(merged_path)
+    return stats
@@ -0,0 +1,83 @@
+# page_packer.py (短いページをまとめて1回のLLM呼び出しで解析する)
+#
+# 続きのページや附票など、OCRテキストが数百文字しかないページが続く場合、
+# 連続する短いページをトークン数の上限まで1つのリクエストにまとめ、
+# 応答の pages 配列をページごとの persons/relationships に分け直す。
+
+from .koseki_schema import SchemaError, response_schema, validate, extract_json
+
+SPARSE_PAGE_TOKENS = 600     # これより短いページをまとめる対象にする
+PACK_TOKEN_BUDGET = 3000     # 1リクエストにまとめるOCRテキストの上限
+MAX_PAGES_PER_PACK = 8
+CHARS_PER_TOKEN = 1.0        # 日本語はおおむね1文字1トークン以下なので、文字数で見積もれば超過しない
+
+PACK_INSTRUCTIONS = """
+# 複数ページの扱い
+上記のOCRテキストには、複数ページ分が「=== ページ N 開始 ===」「=== ページ N 終了 ===」で区切られて含まれています。
+- 各ページを**独立に**解析し、ページをまたいで人物を統合しないでください。
+- 結果は `pages` 配列に、ページごとに `page`（ページ番号）と `persons` / `relationships` を入れて出力してください。
+- 人物が読み取れないページも、空の `persons` / `relationships` で必ず出力してください。
+"""
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def pack_pages(page_texts, sparse_tokens=SPARSE_PAGE_TOKENS, budget=PACK_TOKEN_BUDGET, max_pages=MAX_PAGES_PER_PACK):
+    """
+    [(ページ番号, テキスト), ...]（ページ順）を、LLMに送る単位のリストに分ける。
+    ページ番号が連続する短いページは上限までまとめ、長いページは1ページで1単位にする。
+    空・重複・分割済みなどで間のページが抜けている場合は、その前後を別の単位にする。
+    """
+    packs, current, current_tokens = [], [], 0
+    for page_num, text in page_texts:
+        tokens = estimate_tokens(text)
+        if tokens >= sparse_tokens:
+            if current: packs.append(current); current, current_tokens = [], 0
+            packs.append([(page_num, text)]); continue
+        if current and (page_num != current[-1][0] + 1 or current_tokens + tokens > budget or len(current) >= max_pages):
+            packs.append(current); current, current_tokens = [], 0
+        current.append((page_num, text)); current_tokens += tokens
+    if current: packs.append(current)
+    return packs
+
+
+def packed_text(pack):
+    return "\n".join(f"=== ページ {page_num} 開始 ===\n{text.strip()}\n=== ページ {page_num} 終了 ===" for page_num, text in pack)
+
+
+def build_packed_prompt(pack, prompt_template):
+    """ページ解析用のプロンプトに、区切り付きの複数ページのテキストと出力形式の指示を入れる"""
+    return prompt_template.format(text=packed_text(pack)) + PACK_INSTRUCTIONS
+
+
+def packed_response_schema():
+    page_schema = response_schema(id_type=str)
+    page_schema = dict(page_schema, properties={"page": {"type": "INTEGER"}, **page_schema["properties"]},
+                       required=["page"] + page_schema["required"])
+    return {"type": "OBJECT", "properties": {"pages": {"type": "ARRAY", "items": page_schema}}, "required": ["pages"]}
+
+
+def packed_generation_config():
+    return {"response_mime_type": "application/json", "response_schema": packed_response_schema()}
+
+
+def parse_packed_response(text, page_nums):
+    """
+    まとめて解析した応答を {ページ番号: 検証済みの persons/relationships} に分ける。
+    応答に含まれないページは結果に入れない（呼び出し側で1ページずつ解析し直す）。
+    """
+    obj = extract_json(text)
+    if not isinstance(obj, dict) or not isinstance(obj.get("pages"), list):
+        raise SchemaError("pages 配列がありません")
+    expected, results = set(page_nums), {}
+    for i, page in enumerate(obj["pages"]):
+        if not isinstance(page, dict): raise SchemaError(f"pages[{i}] がオブジェクトではありません")
+        try: page_num = int(page.get("page"))
+        except (TypeError, ValueError): raise SchemaError(f"pages[{i}].page がページ番号ではありません")
+        if page_num not in expected: continue
+        try: results[page_num] = validate(page, id_type=str).to_dict()
+        except SchemaError as e: raise SchemaError(f"pages[{i}]: {e}") from e
+    if not results: raise SchemaError("要求したページの結果が1つもありません")
+    return results
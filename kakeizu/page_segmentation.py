@@ -0,0 +1,138 @@
+# page_segmentation.py (Vision のレイアウト情報による戸籍ページの人物ごとの分割)
+#
+# full_text_annotation の pages → blocks → paragraphs の位置情報から、
+#   - 縦書き（改製原戸籍など）: 段落を右から左への列にまとめ、生年月日の列で人物を区切る
+#   - 横書き（全部事項証明）: 段落を上から下への行にまとめ、「戸籍に記録されている者」などで区切る
+# 人物の記載より前の部分（本籍・筆頭者・戸籍事項）はヘッダーとして各人物のプロンプトに添える。
+
+import re
+from dataclasses import dataclass, field
+
+# 横書き: これを含む行から新しい人物の記載が始まる（優先順に、ページ内に現れた最初の種類を使う）
+START_MARKERS = ("戸籍に記録されている者", "【氏名】", "【名】")
+# 縦書き: これに当たる列で人物の記載が終わる（「明治三年五月十日生」や「生年月日」の列）
+_END_MARKER_RE = re.compile(r"生年月日|年[^年]{1,6}月[^月]{1,6}日\s*生")
+MIN_ENTRIES = 2           # 人物が2人以上に分かれたページだけ人物ごとに解析する
+VERTICAL_RATIO = 1.5      # 高さが幅のこの倍以上の段落を縦書きとみなす
+_BREAKS = {1: " ", 2: " ", 3: "\n", 5: "\n"}  # SPACE, SURE_SPACE, EOL_SURE_SPACE, LINE_BREAK
+
+
+@dataclass
+class TextBlock:
+    text: str
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+    @property
+    def vertical(self):
+        return (self.y1 - self.y0) >= (self.x1 - self.x0) * VERTICAL_RATIO and len(self.text) > 1
+
+
+@dataclass
+class PageSegments:
+    header: str
+    entries: list = field(default_factory=list)
+    orientation: str = "horizontal"
+
+
+def paragraph_text(paragraph):
+    parts = []
+    for word in getattr(paragraph, "words", []):
+        for symbol in getattr(word, "symbols", []):
+            parts.append(symbol.text)
+            detected = getattr(getattr(symbol, "property", None), "detected_break", None)
+            if detected is not None: parts.append(_BREAKS.get(int(getattr(detected, "type_", 0) or 0), ""))
+    return "".join(parts).strip()
+
+
+def blocks_from_annotation(annotation):
+    """full_text_annotation から段落単位の TextBlock のリストを作る。位置情報がなければ空のリスト"""
+    blocks = []
+    for page in getattr(annotation, "pages", None) or []:
+        for block in getattr(page, "blocks", []):
+            for paragraph in getattr(block, "paragraphs", []):
+                vertices = getattr(getattr(paragraph, "bounding_box", None), "vertices", None)
+                text = paragraph_text(paragraph)
+                if not vertices or not text: continue
+                xs, ys = [v.x for v in vertices], [v.y for v in vertices]
+                blocks.append(TextBlock(text, min(xs), min(ys), max(xs), max(ys)))
+    return blocks
+
+
+def _group(blocks, lo, hi, key):
+    """lo/hi の区間が重なる段落を1つにまとめる（縦書きなら x、横書きなら y の区間）"""
+    groups = []
+    for block in sorted(blocks, key=key):
+        if groups:
+            g_lo, g_hi, members = groups[-1]
+            overlap = min(g_hi, hi(block)) - max(g_lo, lo(block))
+            if overlap > 0.5 * min(g_hi - g_lo, hi(block) - lo(block)):
+                groups[-1] = (min(g_lo, lo(block)), max(g_hi, hi(block)), members + [block]); continue
+        groups.append((lo(block), hi(block), [block]))
+    return [members for _, _, members in groups]
+
+
+def reading_units(blocks):
+    """段落を読む順の列（縦書き）または行（横書き）のテキストにまとめる。(向き, [テキスト, ...]) を返す"""
+    vertical_chars = sum(len(b.text) for b in blocks if b.vertical)
+    if vertical_chars * 2 > sum(len(b.text) for b in blocks):
+        columns = _group(blocks, lambda b: b.x0, lambda b: b.x1, key=lambda b: -b.x1)
+        return "vertical", ["\n".join(b.text for b in sorted(col, key=lambda b: b.y0)) for col in columns]
+    lines = _group(blocks, lambda b: b.y0, lambda b: b.y1, key=lambda b: b.y0)
+    return "horizontal", [" ".join(b.text for b in sorted(line, key=lambda b: b.x0)) for line in lines]
+
+
+def segment_units(units, orientation):
+    """列・行のテキストをヘッダーと人物ごとの記載に分ける"""
+    entries, current = [], []
+    if orientation == "horizontal":
+        marker = next((m for m in START_MARKERS if any(m in u for u in units)), None)
+        if marker is None: return PageSegments("\n".join(units), [], orientation)
+        first = next(i for i, u in enumerate(units) if marker in u)
+        header = units[:first]
+        for unit in units[first:]:
+            if marker in unit and current: entries.append(current); current = []
+            current.append(unit)
+    else:
+        first = next((i for i, u in enumerate(units) if _END_MARKER_RE.search(u)), None)
+        if first is None: return PageSegments("\n".join(units), [], orientation)
+        # 最初の人物の記載は、生年月日の列より前の事項欄の列から始まる。ヘッダーは「本籍」「戸主」などを含む先頭の列のみ
+        header_end = 0
+        while header_end < first and re.search(r"本籍|戸主|筆頭者|氏名", units[header_end]): header_end += 1
+        header = units[:header_end]
+        for unit in units[header_end:]:
+            current.append(unit)
+            if _END_MARKER_RE.search(unit): entries.append(current); current = []
+    if current:
+        if entries and orientation == "vertical": entries[-1].extend(current)  # 最後の人物の後ろの余白・追記
+        else: entries.append(current)
+    return PageSegments("\n".join(header), ["\n".join(e) for e in entries], orientation)
+
+
+def segment_page(annotation):
+    """
+    Vision の full_text_annotation を人物ごとに分ける。位置情報がない場合や
+    人物が MIN_ENTRIES 人未満にしか分かれない場合は None（ページ全体で解析する）。
+    """
+    blocks = blocks_from_annotation(annotation)
+    if not blocks: return None
+    orientation, units = reading_units(blocks)
+    segments = segment_units(units, orientation)
+    return segments if len(segments.entries) >= MIN_ENTRIES else None
+
+
+def combine_entry_results(results):
+    """人物ごとの解析結果を1ページ分にまとめる（同じIDの人物は空の項目を補い合い、関係性は重複を除く）"""
+    persons, relationships, seen = {}, [], set()
+    for data in results:
+        for person in data.get("persons", []):
+            if person["id"] not in persons: persons[person["id"]] = dict(person); continue
+            merged = persons[person["id"]]
+            for k, v in person.items():
+                if v and not merged.get(k): merged[k] = v
+        for rel in data.get("relationships", []):
+            key = (rel["type"],) + (tuple(sorted((rel["source"], rel["target"]))) if rel["type"] == "spouse" else (rel["source"], rel["target"]))
+            if key not in seen: seen.add(key); relationships.append(rel)
+    return {"persons": list(persons.values()), "relationships": relationships}
@@ -0,0 +1,126 @@
+# page_triage.py (OCRとLLMの間でページを仕分ける)
+#
+# - classify_page(): キーワードと日付表記の数から、戸籍の記載があるページか、
+#   表紙・認証文だけのページかを判定する
+# - NearDuplicateIndex: 文字 n-gram の MinHash と LSH で、重複して送られてきた謄本の同じページを見つける
+# - triage_pages(): 両方を通し、LLMに送らないページとその理由を返す
+
+import re
+import zlib
+import random
+import unicodedata
+
+# 戸籍の記載に現れる語（人物欄・事項欄）
+KOSEKI_KEYWORDS = ("本籍", "氏名", "筆頭者", "戸主", "出生", "生年月日", "婚姻", "続柄", "父", "母", "長男", "長女",
+                   "二男", "二女", "妻", "夫", "養子", "養父", "養母", "届出", "入籍", "除籍", "死亡", "離婚", "分家", "前戸主")
+# 認証文の結びの文句。これを含むページだけ、戸籍の記載ありとするしきい値を上げる
+# （「全部事項証明」「個人事項証明」は電算化された戸籍の全ページの見出しにあるため含めない）
+ATTESTATION_PHRASES = ("認証する", "相違ない", "証明する", "証明した書面", "謄本である", "抄本である")
+# 認証文・表紙に現れる語
+CERTIFICATION_KEYWORDS = ATTESTATION_PHRASES + ("市長", "区長", "町長", "村長", "交付", "手数料", "請求者")
+_DATE_RE = re.compile(r"(明治|大正|昭和|平成|令和|慶応|元治|文久|万延|安政|嘉永|弘化|天保)\s*[元〇一二三四五六七八九十百\d]+\s*年")
+
+MIN_KOSEKI_SCORE = 4          # これ未満のページは戸籍の記載なしとみなす
+MIN_TEXT_CHARS = 20
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16                # 16バンド×4行: 類似度0.5前後から候補に上がる
+DUPLICATE_THRESHOLD = 0.8     # 推定Jaccard係数がこれ以上なら同じページとみなす
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_text(text):
+    """全角・半角の揺れと空白を除いた比較用のテキスト"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", text or ""))
+
+
+def classify_page(text):
+    """
+    ページの種類を判定して (種類, スコア, 理由) を返す。種類は
+    "koseki"（戸籍の記載あり）/ "certification"（認証文のみ）/ "other"（表紙など）。
+    スコアは戸籍キーワードの出現数＋和暦日付の数×2。認証文の結びの文句を含むページ（発行日や「除籍の謄本」で
+    点が入りやすい）は、しきい値を2倍にして判定する。
+    """
+    normalized = normalize_text(text)
+    if len(normalized) < MIN_TEXT_CHARS:
+        return "other", 0, f"テキストが{len(normalized)}文字しかありません"
+    keyword_hits = sum(normalized.count(k) for k in KOSEKI_KEYWORDS)
+    dates = len(_DATE_RE.findall(normalized))
+    score = keyword_hits + dates * 2
+    certification_hits = [k for k in CERTIFICATION_KEYWORDS if k in normalized]
+    attested = any(k in normalized for k in ATTESTATION_PHRASES)
+    if score >= MIN_KOSEKI_SCORE * (2 if attested else 1):
+        return "koseki", score, f"戸籍キーワード{keyword_hits}件・日付{dates}件"
+    if certification_hits:
+        return "certification", score, f"認証文の語（{'、'.join(certification_hits[:3])}）のみで人物の記載がありません"
+    return "other", score, f"戸籍キーワードが{keyword_hits}件しかありません"
+
+
+def shingles(text, k=SHINGLE_SIZE):
+    normalized = normalize_text(text)
+    if len(normalized) <= k: return {normalized} if normalized else set()
+    return {normalized[i:i + k] for i in range(len(normalized) - k + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    MinHash（n-gram集合の最小ハッシュ値の署名）を LSH のバンドごとにバケットへ入れ、
+    同じバケットに入った候補だけ署名を比べる。ページ数が増えても全ペアの比較はしない。
+    """
+
+    def __init__(self, num_perm=NUM_PERMUTATIONS, bands=LSH_BANDS, threshold=DUPLICATE_THRESHOLD, seed=1):
+        rng = random.Random(seed)
+        self.num_perm, self.bands, self.rows, self.threshold = num_perm, bands, num_perm // bands, threshold
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+        self._buckets = [dict() for _ in range(bands)]
+        self._signatures = {}
+
+    def signature(self, text):
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles(text)]
+        if not hashes: return None
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms)
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+    def _bands(self, sig):
+        return [sig[b * self.rows:(b + 1) * self.rows] for b in range(self.bands)]
+
+    def query(self, sig):
+        """登録済みのキーのうち、推定類似度がしきい値以上で最も近いもの (キー, 類似度)。なければ (None, 0.0)"""
+        candidates = set()
+        for bucket, band in zip(self._buckets, self._bands(sig)):
+            candidates.update(bucket.get(band, ()))
+        best, best_sim = None, 0.0
+        for key in sorted(candidates, key=str):
+            sim = self.similarity(sig, self._signatures[key])
+            if sim >= self.threshold and sim > best_sim: best, best_sim = key, sim
+        return best, best_sim
+
+    def add(self, key, sig):
+        self._signatures[key] = sig
+        for bucket, band in zip(self._buckets, self._bands(sig)):
+            bucket.setdefault(band, []).append(key)
+
+
+def triage_pages(page_texts):
+    """
+    [(ページ番号, OCRテキスト), ...] を仕分け、LLMに送らないページを
+    {ページ番号: マニフェスト用の結果} で返す。
+      {"status": "skipped", "kind": "certification", "reason": "..."}
+      {"status": "duplicate", "duplicate_of": 3, "similarity": 0.95}
+    重複は、先に現れた戸籍ページに結び付ける。
+    """
+    index, results = NearDuplicateIndex(), {}
+    for page_num, text in page_texts:
+        kind, score, reason = classify_page(text)
+        if kind != "koseki":
+            results[page_num] = {"status": "skipped", "kind": kind, "score": score, "reason": reason}; continue
+        sig = index.signature(text)
+        original, similarity = index.query(sig)
+        if original is not None:
+            results[page_num] = {"status": "duplicate", "duplicate_of": original, "similarity": round(similarity, 3)}
+        else:
+            index.add(page_num, sig)
+    return results
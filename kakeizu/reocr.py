@@ -0,0 +1,175 @@
+# reocr.py (信頼度の低い段落だけの読み直し)
+#
+#   results = refine_pages(images, results, ocr_backend)   # {ページ番号: OcrResult} -> 読み直しを反映した OcrResult
+#
+# Vision は段落・単語ごとに信頼度を返すが、これまではページ全体のテキストだけをLLMに渡していた。
+# 1. 信頼度が REOCR_CONFIDENCE 未満の段落を探す（氏名・日付・続柄を含む段落を優先し、ページあたり MAX_REGIONS_PER_PAGE 個まで）
+# 2. その段落だけをページ画像から余白付きで切り出し、グレースケール・コントラスト補正・UPSCALE 倍に拡大する
+# 3. 全ページの切り出しを1回の recognize_batch（Vision の batch_annotate_images）でまとめて読む
+# 4. 信頼度が MIN_GAIN 以上よくなった段落だけ、ページのテキストと位置情報の段落を置き換える
+# ページ全体のDPIを上げるのに比べ、送るのは読みにくい段落の分だけで済む。
+
+import re
+from io import BytesIO
+from types import SimpleNamespace
+from dataclasses import dataclass, replace
+
+from . import instrumentation
+from .ocr_backends import annotation_confidence, known_confidence
+from .page_segmentation import paragraph_text
+
+REOCR_CONFIDENCE = 0.8        # これ未満の段落を読み直す
+MIN_GAIN = 0.05               # 読み直した結果の信頼度がこれ以上よくなったときだけ置き換える
+MAX_REGIONS_PER_PAGE = 12
+MAX_REGIONS = 64              # 1回のまとめ読みに送る段落の上限（文書全体）
+UPSCALE = 2                   # 切り出した段落の拡大率
+MAX_CROP_SIDE = 2400          # 拡大後の長辺の上限（画素）
+PADDING_RATIO = 0.15          # 段落の短辺に対する余白の割合
+MIN_REGION_SIDE = 8           # これより小さい段落（画素）は読み直さない
+# 氏名・日付・続柄など、誤読がそのまま家系図の誤りになる項目
+KEY_FIELD_RE = re.compile(r"(明治|大正|昭和|平成|令和|慶応|元治|文久|万延|安政|嘉永)|[年月日]|生|氏名|【名】|続柄|"
+                          r"父|母|夫|妻|長男|長女|二男|二女|三男|三女|養子|養父|養母|筆頭者|戸主")
+
+
+@dataclass
+class Region:
+    page_num: int
+    block_index: int
+    paragraph_index: int
+    text: str
+    confidence: float
+    box: tuple           # (x0, y0, x1, y1)
+    key_field: bool = False
+
+
+def _paragraph_confidence(paragraph):
+    """段落の信頼度。段落になければ単語の信頼度の最小値。不明なら None（0.0 の扱いは known_confidence と同じ）"""
+    confidence = known_confidence(getattr(paragraph, "confidence", None))
+    if confidence is None:
+        words = [known_confidence(getattr(w, "confidence", None)) for w in getattr(paragraph, "words", [])]
+        confidence = min((c for c in words if c is not None), default=None)
+    return confidence
+
+
+def find_regions(page_num, annotation, threshold=REOCR_CONFIDENCE, limit=MAX_REGIONS_PER_PAGE):
+    """信頼度の低い段落を、氏名・日付・続柄を含むもの、信頼度の低いものの順に limit 個まで返す"""
+    regions = []
+    pages = getattr(annotation, "pages", None) or []
+    for b_i, block in enumerate(pages[0].blocks if pages else []):
+        for p_i, paragraph in enumerate(getattr(block, "paragraphs", [])):
+            confidence = _paragraph_confidence(paragraph)
+            vertices = getattr(getattr(paragraph, "bounding_box", None), "vertices", None)
+            if confidence is None or confidence >= threshold or not vertices: continue
+            xs, ys = [v.x for v in vertices], [v.y for v in vertices]
+            if max(xs) - min(xs) < MIN_REGION_SIDE or max(ys) - min(ys) < MIN_REGION_SIDE: continue
+            text = paragraph_text(paragraph)
+            if not text: continue
+            regions.append(Region(page_num, b_i, p_i, text, confidence, (min(xs), min(ys), max(xs), max(ys)),
+                                  bool(KEY_FIELD_RE.search(text))))
+    regions.sort(key=lambda r: (not r.key_field, r.confidence))
+    return regions[:limit]
+
+
+def crop_region(image, box):
+    """段落を余白付きで切り出し、グレースケール・コントラスト補正・拡大したPNGのバイト列を返す"""
+    from PIL import Image, ImageOps
+    x0, y0, x1, y1 = box
+    pad = max(4, int(min(x1 - x0, y1 - y0) * PADDING_RATIO))
+    crop = image.crop((max(0, x0 - pad), max(0, y0 - pad), min(image.width, x1 + pad), min(image.height, y1 + pad)))
+    crop = ImageOps.autocontrast(crop.convert("L"), cutoff=1)
+    scale = min(UPSCALE, MAX_CROP_SIDE / max(crop.width, crop.height))
+    if scale > 1: crop = crop.resize((round(crop.width * scale), round(crop.height * scale)), Image.LANCZOS)
+    with BytesIO() as buf:
+        crop.save(buf, format="PNG")
+        return buf.getvalue()
+
+
+def _recognize_all(ocr_backend, crops):
+    """切り出した画像をまとめて読む。recognize_batch のないエンジンは1枚ずつ読む"""
+    if hasattr(ocr_backend, "recognize_batch"): return ocr_backend.recognize_batch(crops)
+    results = []
+    for crop in crops:
+        try: results.append(ocr_backend.recognize(crop))
+        except Exception as e:
+            print(f"  - 段落の読み直しに失敗しました: {e}"); results.append(None)
+    return results
+
+
+def _improved(region, result):
+    """読み直した結果で置き換えてよいか（信頼度が上がり、文字数が極端に変わっていない）"""
+    if result is None or result.confidence is None: return False
+    text = result.text.strip()
+    return bool(text) and result.confidence >= region.confidence + MIN_GAIN and 0.5 <= len(text) / len(region.text) <= 2
+
+
+def _words(annotation):
+    return [w for page in getattr(annotation, "pages", None) or [] for block in page.blocks
+            for paragraph in block.paragraphs for w in paragraph.words]
+
+
+def splice(result, replacements):
+    """
+    OcrResult の段落を置き換えた新しい OcrResult を返す。replacements は [(Region, 読み直した OcrResult)]。
+    テキストは元の段落のテキストを先頭から順に探して置き換え、位置情報は置き換えた段落だけを作り直す
+    （段落の位置は元のまま、単語・文字は読み直した結果のもの）。
+    """
+    by_paragraph = {(r.block_index, r.paragraph_index): (r, new) for r, new in replacements}
+    page = result.annotation.pages[0]
+    blocks = []
+    for b_i, block in enumerate(page.blocks):
+        paragraphs = list(block.paragraphs)
+        if any((b_i, p_i) in by_paragraph for p_i in range(len(paragraphs))):
+            for p_i, paragraph in enumerate(paragraphs):
+                if (b_i, p_i) not in by_paragraph: continue
+                _, new = by_paragraph[(b_i, p_i)]
+                paragraphs[p_i] = SimpleNamespace(words=_words(new.annotation), bounding_box=paragraph.bounding_box,
+                                                  confidence=new.confidence)
+            chars = [(len(paragraph_text(p)) or 1, _paragraph_confidence(p)) for p in paragraphs]
+            known = [(n, c) for n, c in chars if c is not None]
+            confidence = sum(n * c for n, c in known) / sum(n for n, _ in known) if known else getattr(block, "confidence", None)
+            block = SimpleNamespace(paragraphs=paragraphs, bounding_box=getattr(block, "bounding_box", None), confidence=confidence)
+        blocks.append(block)
+
+    text, cursor = result.text, 0
+    for region, new in sorted(replacements, key=lambda item: (item[0].block_index, item[0].paragraph_index)):
+        at = text.find(region.text, cursor)
+        if at < 0: continue  # 全体のテキストと段落の区切りが一致しない場合は位置情報だけを置き換える
+        new_text = new.text.strip()
+        text = text[:at] + new_text + text[at + len(region.text):]
+        cursor = at + len(new_text)
+
+    pages = [SimpleNamespace(blocks=blocks, width=getattr(page, "width", None), height=getattr(page, "height", None))]
+    pages += list(result.annotation.pages[1:])
+    annotation = SimpleNamespace(text=text, pages=pages)
+    return replace(result, text=text, annotation=annotation, confidence=annotation_confidence(annotation))
+
+
+def refine_pages(images, results, ocr_backend):
+    """
+    {ページ番号: OcrResult} の信頼度の低い段落を読み直し、置き換えたページの OcrResult を差し替えた辞書を返す。
+    images はページ順の画像のリスト（OCRに送ったものと同じ大きさ）。
+    """
+    regions = [r for page_num in sorted(results) for r in find_regions(page_num, results[page_num].annotation)]
+    if len(regions) > MAX_REGIONS:
+        regions = sorted(regions, key=lambda r: (not r.key_field, r.confidence))[:MAX_REGIONS]
+    if not regions: return results
+
+    with instrumentation.span("reocr", regions=len(regions)) as s:
+        crops = [crop_region(images[r.page_num - 1], r.box) for r in regions]
+        s.set(bytes_uploaded=sum(map(len, crops)), pages=len({r.page_num for r in regions}))
+        try:
+            new_results = _recognize_all(ocr_backend, crops)
+        except Exception as e:
+            print(f"  - 信頼度の低い段落の読み直しに失敗したため、元のOCR結果を使います: {e}"); return results
+
+    refined, by_page = dict(results), {}
+    for region, crop, new in zip(regions, crops, new_results):
+        instrumentation.record_page(region.page_num, reocr_regions=1, reocr_bytes=len(crop))
+        if _improved(region, new): by_page.setdefault(region.page_num, []).append((region, new))
+    for page_num, replacements in by_page.items():
+        refined[page_num] = splice(results[page_num], replacements)
+        instrumentation.record_page(page_num, reocr_replaced=len(replacements))
+    replaced = sum(map(len, by_page.values()))
+    instrumentation.count("reocr_replaced", replaced)
+    print(f"  - 信頼度の低い段落 {len(regions)} 個を読み直し、{replaced} 個を置き換えました。")
+    return refined
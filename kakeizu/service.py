@@ -0,0 +1,316 @@
+# service.py (常駐モード: 使い回すクライアントとローカルのジョブキュー)
+#
+#   python -m kakeizu.service --port 8765 --workers 2        # 127.0.0.1:8765 で待ち受ける（kakeizu serve でも同じ）
+#   python -m kakeizu.service --socket /tmp/kakeizu.sock      # Unixソケットで待ち受ける
+#
+# 起動時に vertexai.init・Vision クライアント・GenerativeModel を1回だけ作り（cloud_clients.py）、
+# 以降のジョブはすべてそれを使う。ジョブは SQLite のキュー（output/jobs/jobs.sqlite3）に保存するので、
+# サービスを再起動しても受け付け済みのジョブは失われない（実行中だったジョブは最初からやり直す）。
+#
+# API:
+#   POST /jobs          {"pdf_path": "input/A.pdf", "options": {"backend": "tesseract", "pack": false}}
+#                       または PDF 本体（Content-Type: application/pdf。オプションはクエリ文字列 ?pack=0 など）
+#                       → 202 {"id": "...", "status": "queued"}
+#   GET  /jobs/<id>     ジョブの状態（queued / running / done / failed）と結果のパス
+#   GET  /jobs          最近のジョブの一覧（?status=queued で絞り込み）
+#   GET  /health        状態ごとのジョブ数
+#
+# options: backend（vision / tesseract / local-first）、pack・triage・segment・adaptive_dpi・reocr・routing（既定 true）、
+#          synthesize（"merge": 氏名による統合（既定）/ "ai": synthesize_with_ai / "none": 統合しない）
+
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from socketserver import ThreadingMixIn, UnixStreamServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import instrumentation
+
+JOBS_DIR = "output/jobs"
+DB_FILENAME = "jobs.sqlite3"
+JOB_WORKERS = 2             # 同時に処理するPDFの数（API呼び出しの同時実行数は call_controller が調整する）
+POLL_INTERVAL_SEC = 1.0
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+JOB_OPTIONS = {"backend": None, "pack": True, "triage": True, "segment": True, "adaptive_dpi": True, "reocr": True,
+               "routing": True, "synthesize": "merge"}
+
+
+class JobQueue:
+    """SQLite に保存するジョブキュー。複数のワーカースレッドから使ってよい"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, status TEXT NOT NULL, pdf_path TEXT NOT NULL, options TEXT NOT NULL,
+                created_at REAL NOT NULL, started_at REAL, finished_at REAL, result TEXT, error TEXT)""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            # 前回の終了時に実行中だったジョブは、最初からやり直す
+            self._db.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None: return None
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(self, pdf_path, options=None, job_id=None):
+        job_id = job_id or new_job_id()
+        options = dict(JOB_OPTIONS, **(options or {}))
+        with self._available:
+            self._db.execute("INSERT INTO jobs (id, status, pdf_path, options, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                             (job_id, pdf_path, json.dumps(options, ensure_ascii=False), time.time()))
+            self._available.notify()
+        return job_id
+
+    def claim(self, timeout=POLL_INTERVAL_SEC):
+        """最も古い queued のジョブを running にして返す。timeout 秒待ってもなければ None"""
+        with self._available:
+            for _ in range(2):
+                self._db.execute("BEGIN IMMEDIATE")
+                row = self._db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row["id"]))
+                self._db.execute("COMMIT")
+                if row is not None: return self.get(row["id"], locked=True)
+                self._available.wait(timeout)
+        return None
+
+    def finish(self, job_id, result):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'done', finished_at = ?, result = ? WHERE id = ?",
+                             (time.time(), json.dumps(result, ensure_ascii=False), job_id))
+
+    def fail(self, job_id, error):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                             (time.time(), error, job_id))
+
+    def get(self, job_id, locked=False):
+        if locked: return self._to_dict(self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        with self._lock:
+            return self._to_dict(self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list(self, status=None, limit=100):
+        query, params = "SELECT * FROM jobs", ()
+        if status: query, params = query + " WHERE status = ?", (status,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY created_at DESC LIMIT ?", params + (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+
+def new_job_id():
+    return time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+
+
+class KosekiService:
+    """
+    ジョブキューからPDFを取り出して process_document を実行するワーカーの集まり。
+    ocr_backend / model を渡すとそれを使う（fake_clients.py 参照）。渡さない場合は cloud_clients の共有クライアント。
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, workers=JOB_WORKERS, ocr_backend=None, model=None):
+        self.jobs_dir, self.workers = jobs_dir, workers
+        self.queue = JobQueue(os.path.join(jobs_dir, DB_FILENAME))
+        self._ocr_backend, self._model = ocr_backend, model
+        self._stop = threading.Event()
+        self._threads = []
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def warm_up(self):
+        """最初のジョブを待たずにクライアントを作っておく"""
+        from .cloud_clients import warm_up
+        from .model_router import FAST_MODEL_NAME, ACCURATE_MODEL_NAME
+        if self._ocr_backend is None or self._model is None:
+            started = time.perf_counter()
+            warm_up(JOB_OPTIONS["backend"], model_names=(FAST_MODEL_NAME, ACCURATE_MODEL_NAME))
+            print(f"✅ クライアントを準備しました（{time.perf_counter() - started:.1f}秒）。")
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i + 1}", daemon=True)
+            thread.start(); self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads: thread.join(timeout)
+
+    def _worker(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None: continue
+            print(f"--- ジョブ {job['id']} を開始: {job['pdf_path']} ---")
+            try:
+                result = self.run_job(job)
+            except Exception as e:
+                print(f"エラー: ジョブ {job['id']} が失敗しました: {e}")
+                self.queue.fail(job["id"], f"{type(e).__name__}: {e}")
+            else:
+                self.queue.finish(job["id"], result)
+                print(f"✅ ジョブ {job['id']} が完了しました。")
+
+    def run_job(self, job):
+        """1つのPDFをページごとに解析し、options に従って統合する。結果のパスとページ数を返す"""
+        from .main import process_document, MANIFEST_FILENAME
+        from .cloud_clients import get_model, get_ocr_backend
+
+        options, job_dir = job["options"], self.job_dir(job["id"])
+        pages_dir = os.path.join(job_dir, "pages")
+        # routing が true なら model=None として、ページごとに model_router がモデルを選ぶ
+        model = self._model or (None if options.get("routing", True) else get_model())
+        ocr_backend = self._ocr_backend or get_ocr_backend(options.get("backend"))
+        # 同時に動く他のジョブと同じページ番号の指標が混ざらないよう、ページ指標はジョブIDごとに分ける
+        with instrumentation.document(job["id"]):
+            manifest = process_document(job["pdf_path"], pages_dir, ocr_backend=ocr_backend, model=model,
+                                        pack=options.get("pack", True), triage=options.get("triage", True),
+                                        segment=options.get("segment", True), adaptive_dpi=options.get("adaptive_dpi", True),
+                                        reocr=options.get("reocr", True))
+        if manifest is None: raise RuntimeError("PDFを画像に変換できませんでした")
+
+        statuses = {}
+        for entry in manifest.values(): statuses[entry["status"]] = statuses.get(entry["status"], 0) + 1
+        result = {"pages_dir": pages_dir, "manifest": os.path.join(job_dir, MANIFEST_FILENAME), "pages": statuses}
+
+        merged_path = os.path.join(job_dir, "family_tree_merged.json")
+        if options.get("synthesize") == "ai":
+            from .synthesize import synthesize_with_ai
+            if not synthesize_with_ai(pages_dir, merged_path, model=model):
+                raise RuntimeError("AIによる統合に失敗しました")
+        elif options.get("synthesize", "merge") == "merge":
+            from .page_merge import list_page_files
+            from .external_merge import write_merged
+            json_files = list_page_files(pages_dir)
+            if json_files: write_merged(json_files, merged_path)
+        if os.path.exists(merged_path): result["merged"] = merged_path
+        return result
+
+
+def _query_options(query):
+    """クエリ文字列（?backend=tesseract&pack=0）をジョブの options にする"""
+    options = {}
+    for key, values in parse_qs(query).items():
+        if key not in JOB_OPTIONS: continue
+        value = values[-1]
+        options[key] = value.lower() not in ("0", "false", "no") if isinstance(JOB_OPTIONS[key], bool) else value
+    return options
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    server_version = "kakeizu-service"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service, url = self.server.service, urlparse(self.path)
+        if url.path == "/health":
+            return self._send_json(200, {"status": "ok", "jobs": service.queue.counts()})
+        if url.path == "/jobs":
+            status = parse_qs(url.query).get("status", [None])[-1]
+            return self._send_json(200, {"jobs": service.queue.list(status)})
+        if url.path.startswith("/jobs/"):
+            job = service.queue.get(url.path[len("/jobs/"):])
+            return self._send_json(200, job) if job else self._send_json(404, {"error": "ジョブが見つかりません"})
+        self._send_json(404, {"error": "不明なパスです"})
+
+    def do_POST(self):
+        service, url = self.server.service, urlparse(self.path)
+        if url.path != "/jobs": return self._send_json(404, {"error": "不明なパスです"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_UPLOAD_BYTES: return self._send_json(413, {"error": "PDFが大きすぎます"})
+        body = self.rfile.read(length)
+
+        if self.headers.get("Content-Type", "").split(";")[0].strip() == "application/pdf":
+            # PDF本体を受け取った場合は、ジョブのディレクトリに保存してから登録する
+            job_id = new_job_id()
+            pdf_path = os.path.join(service.job_dir(job_id), "input.pdf")
+            os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+            with open(pdf_path, "wb") as f: f.write(body)
+            options = _query_options(url.query)
+        else:
+            try:
+                payload = json.loads(body or b"{}")
+                pdf_path, options, job_id = payload["pdf_path"], payload.get("options") or {}, None
+            except (ValueError, KeyError, TypeError):
+                return self._send_json(400, {"error": "JSONの pdf_path、または Content-Type: application/pdf のPDF本体が必要です"})
+            unknown = sorted(set(options) - set(JOB_OPTIONS))
+            if unknown: return self._send_json(400, {"error": f"不明なオプションです: {', '.join(unknown)}"})
+            if not os.path.exists(pdf_path): return self._send_json(400, {"error": f"'{pdf_path}' が見つかりません"})
+
+        job_id = service.queue.submit(os.path.abspath(pdf_path), options, job_id=job_id)
+        self._send_json(202, {"id": job_id, "status": "queued"})
+
+    def log_message(self, format, *args):
+        # Unixソケットでは client_address が空文字列になるため、アドレスは出さない
+        print(f"[{self.log_date_time_string()}] {format % args}", file=sys.stderr)
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(host="127.0.0.1", port=8765, socket_path=None, jobs_dir=JOBS_DIR, workers=JOB_WORKERS,
+          ocr_backend=None, model=None):
+    """クライアントを準備してワーカーを起動し、Ctrl+C まで HTTP API を提供する"""
+    service = KosekiService(jobs_dir, workers, ocr_backend=ocr_backend, model=model)
+    service.warm_up()
+    if socket_path:
+        if os.path.exists(socket_path): os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, ServiceRequestHandler)
+        address = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+        address = f"http://{host}:{server.server_address[1]}"
+    server.service = service
+    service.start()
+    print(f"✅ {address} でジョブを受け付けています（ワーカー {workers}、保存先 '{jobs_dir}'）。")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n終了します（実行中のジョブは次回の起動時にやり直します）。")
+    finally:
+        server.server_close()
+        service.stop(timeout=0)
+        if socket_path and os.path.exists(socket_path): os.remove(socket_path)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="戸籍PDFの解析を常駐サービスとして実行します。")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", dest="socket_path", help="TCPの代わりにこのUnixソケットで待ち受けます")
+    parser.add_argument("--jobs-dir", default=JOBS_DIR, help="ジョブキューと結果の保存先")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS, help="同時に処理するPDFの数")
+    return parser
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    args = build_arg_parser().parse_args()
+    serve(args.host, args.port, args.socket_path, args.jobs_dir, args.workers)
@@ -0,0 +1,88 @@
+# stream_json.py (ストリーミング応答の逐次JSONパーサー)
+#
+# {"persons": [...], "relationships": [...]} 形式の応答を、届いたチャンクから順に読み、
+# 配列の要素（人物・関係性）が1件閉じるたびにその要素を返す。
+#
+#   parser = StreamingJsonParser()
+#   for chunk in response_stream:
+#       for kind, item in parser.feed(chunk.text):   # kind は "persons" / "relationships"
+#           ...
+#   parser.complete   # 最上位のオブジェクトが閉じたかどうか
+
+import json
+
+STREAM_KEYS = ("persons", "relationships")
+
+
+class StreamingJsonParser:
+    """
+    文字列・エスケープ・括弧の深さだけを追う状態機械。要素の範囲が確定した時点で
+    その部分だけを json.loads するので、全体を何度も読み直すことはない。
+    最上位の { より前（```json や説明文）は読み飛ばす。
+    """
+
+    def __init__(self, keys=STREAM_KEYS):
+        self.keys = set(keys)
+        self.depth, self.in_string, self.escape = 0, False, False
+        self.complete = False
+        self._key_chars, self._last_key, self._array = None, None, None
+        self._capture = None  # 要素を読み取り中ならそのチャンク片のリスト
+        self.counts = {key: 0 for key in keys}
+
+    def feed(self, chunk):
+        """チャンクを読み、閉じた要素を (キー, 値) のリストで返す"""
+        items = []
+        if self.complete or not chunk: return items
+        start = 0 if self._capture is not None else None
+        for i, c in enumerate(chunk):
+            if self.depth == 0:
+                if c == "{": self.depth = 1
+                continue
+            if self.in_string:
+                if self.escape: self.escape = False
+                elif c == "\\": self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if self._key_chars is not None:
+                        self._last_key, self._key_chars = "".join(self._key_chars), None
+                elif self._key_chars is not None: self._key_chars.append(c)
+                continue
+            if c == '"':
+                self.in_string = True
+                if self.depth == 1: self._key_chars = []
+            elif c in "{[":
+                if self.depth == 1 and c == "[" and self._last_key in self.keys: self._array = self._last_key
+                elif self.depth == 2 and self._array is not None and self._capture is None:
+                    self._capture, start = [], i
+                self.depth += 1
+            elif c in "}]":
+                self.depth -= 1
+                if self.depth == 2 and self._capture is not None:
+                    self._capture.append(chunk[start:i + 1])
+                    text, self._capture, start = "".join(self._capture), None, None
+                    try: item = json.loads(text)
+                    except json.JSONDecodeError: continue
+                    self.counts[self._array] += 1
+                    items.append((self._array, item))
+                elif self.depth == 1: self._array = None
+                elif self.depth == 0:
+                    self.complete = True; break
+        if self._capture is not None and start is not None: self._capture.append(chunk[start:])
+        return items
+
+
+def parse_stream(chunks, on_item=None, keys=STREAM_KEYS):
+    """
+    テキストのチャンク列を最後まで読み、{キー: [要素...]} と最上位が閉じたかどうかを返す。
+    途中で例外が起きた場合は、それまでに読めた要素を error.partial に入れて送出し直す。
+    """
+    parser, result = StreamingJsonParser(keys), {key: [] for key in keys}
+    try:
+        for chunk in chunks:
+            for kind, item in parser.feed(chunk):
+                result[kind].append(item)
+                if on_item: on_item(kind, item)
+    except Exception as e:
+        e.partial = result
+        raise
+    return result, parser.complete
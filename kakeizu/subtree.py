@@ -0,0 +1,166 @@
+# subtree.py (一人を中心にした部分家系図と、保存済みレイアウトの範囲切り出し)
+#
+#   graph = load_graph("output/family_tree_merged.json")          # 同じファイルなら作った索引を使い回す
+#   ids = graph.focus(graph.find_person("山田太郎"), up=2, down=None)   # 祖父母まで上り、子孫はすべて
+#   sub = graph.subgraph(ids)                                        # その人物たちの persons/relationships
+#   visible = clip_layout(positions, (0, 0, 2000, 1200))             # 保存済みレイアウトの矩形内の人物だけ
+#
+# どちらも全体の人物数ではなく、取り出す人物数（とその関係性の数）に比例する時間で動く。
+
+import os
+import json
+import threading
+from collections import OrderedDict, defaultdict
+
+from .page_merge import normalize_name
+from .draw_final_tree import BOX_WIDTH, BOX_HEIGHT, H_SPACING, V_SPACING
+
+PARENT_TYPES = ('parent_child', 'adopted')
+MAX_CACHED_GRAPHS = 4  # load_graph が覚えておく家系データのファイル数
+
+
+class FamilyGraph:
+    """統合済みの家系データの隣接リスト。部分グラフは人物ごとの隣接リストだけをたどって取り出す"""
+
+    def __init__(self, persons_data, relationships_data):
+        self.persons = {p['id']: p for p in persons_data}
+        self.order = {p_id: i for i, p_id in enumerate(self.persons)}
+        self.by_name = {}  # 名寄せした氏名 -> 人物ID（同じ氏名なら先に現れた人物）
+        for p_id, person in self.persons.items(): self.by_name.setdefault(normalize_name(person.get('name')), p_id)
+        self.parents, self.children, self.spouses = defaultdict(list), defaultdict(list), defaultdict(list)
+        self.edges = defaultdict(list)  # 人物ID -> その人物が端にある関係性
+        for rel in relationships_data:
+            s_id, t_id, r_type = rel.get('source'), rel.get('target'), rel.get('type')
+            if s_id not in self.persons or t_id not in self.persons: continue
+            self.edges[s_id].append(rel)
+            if t_id != s_id: self.edges[t_id].append(rel)
+            if r_type in PARENT_TYPES:
+                self.parents[t_id].append(s_id); self.children[s_id].append(t_id)
+            elif r_type == 'spouse':
+                self.spouses[s_id].append(t_id); self.spouses[t_id].append(s_id)
+
+    @classmethod
+    def from_json(cls, json_path):
+        with open(json_path, 'r', encoding='utf-8') as f: data = json.load(f)
+        return cls(data.get("persons", []), data.get("relationships", []))
+
+    def find_person(self, query):
+        """人物ID（数字）または氏名から人物IDを探す"""
+        query = str(query).strip()
+        if query.lstrip('-').isdigit() and int(query) in self.persons: return int(query)
+        return self.by_name.get(normalize_name(query))
+
+    @staticmethod
+    def _walk(start, neighbors, depth):
+        """start から neighbors をたどって depth 世代（None なら無制限）までに届く人物"""
+        found, frontier, level = set(), [start], 0
+        while frontier and (depth is None or level < depth):
+            level += 1
+            frontier = [n for p_id in frontier for n in neighbors.get(p_id, ()) if n not in found and n != start]
+            found.update(frontier)
+        return found
+
+    def focus(self, person_id, up=None, down=None, spouses=True):
+        """
+        person_id の祖先を up 世代、子孫を down 世代まで（None なら無制限、0 ならたどらない）集める。
+        spouses=True なら、集めた人物の配偶者も含める。
+        """
+        ids = {person_id}
+        if up != 0: ids |= self._walk(person_id, self.parents, up)
+        if down != 0: ids |= self._walk(person_id, self.children, down)
+        if spouses: ids |= {sp_id for p_id in list(ids) for sp_id in self.spouses.get(p_id, ())}
+        return ids
+
+    def subgraph(self, ids):
+        """ids の人物と、両端がともに ids に含まれる関係性（元のデータと同じ並び）"""
+        ids = sorted(ids, key=self.order.__getitem__)
+        members, relationships, seen = set(ids), [], set()
+        for p_id in ids:
+            for rel in self.edges.get(p_id, ()):
+                if id(rel) in seen or rel['source'] not in members or rel['target'] not in members: continue
+                seen.add(id(rel)); relationships.append(rel)
+        return {"persons": [self.persons[p_id] for p_id in ids], "relationships": relationships}
+
+
+_graphs = OrderedDict()  # 絶対パス -> ((更新時刻, 大きさ), FamilyGraph)
+_graphs_lock = threading.Lock()
+
+
+def load_graph(json_path):
+    """
+    家系データのファイルから FamilyGraph を作る。同じファイルが変わっていなければ前回作ったものを返す
+    （常駐モードや続けて何人も描くときに、読み込み・隣接リスト・氏名の索引を作り直さない）。
+    """
+    path = os.path.abspath(json_path)
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _graphs_lock:
+        cached = _graphs.get(path)
+        if cached and cached[0] == key:
+            _graphs.move_to_end(path); return cached[1]
+    graph = FamilyGraph.from_json(path)
+    with _graphs_lock:
+        _graphs[path] = (key, graph); _graphs.move_to_end(path)
+        while len(_graphs) > MAX_CACHED_GRAPHS: _graphs.popitem(last=False)
+    return graph
+
+
+class SpatialIndex:
+    """
+    レイアウトの箱（中心座標と BOX_WIDTH×BOX_HEIGHT）を一様な格子に登録し、矩形と重なる箱を探す。
+    格子の大きさは箱と間隔の大きさなので、1つの箱はたかだか2×2のマスにしか入らない。
+    """
+
+    def __init__(self, positions, cell_width=BOX_WIDTH + H_SPACING, cell_height=BOX_HEIGHT + V_SPACING):
+        self.positions, self.cell_width, self.cell_height = positions, cell_width, cell_height
+        self.cells = defaultdict(list)
+        for p_id, (x, y) in positions.items():
+            for cell in self._cells(*self._box(x, y)): self.cells[cell].append(p_id)
+        xs, ys = [p[0] for p in positions.values()], [p[1] for p in positions.values()]
+        self.bounds = (min(xs) - BOX_WIDTH, min(ys) - BOX_HEIGHT, max(xs) + BOX_WIDTH, max(ys) + BOX_HEIGHT) if positions else None
+
+    @staticmethod
+    def _box(x, y):
+        return x - BOX_WIDTH / 2, y - BOX_HEIGHT / 2, x + BOX_WIDTH / 2, y + BOX_HEIGHT / 2
+
+    def _cells(self, x0, y0, x1, y1):
+        for cx in range(int(x0 // self.cell_width), int(x1 // self.cell_width) + 1):
+            for cy in range(int(y0 // self.cell_height), int(y1 // self.cell_height) + 1):
+                yield cx, cy
+
+    def query(self, x0, y0, x1, y1):
+        """矩形 (x0, y0, x1, y1) と重なる箱の人物IDの集合"""
+        if self.bounds is None: return set()
+        # レイアウトの外側のマスは空なので、矩形をレイアウトの範囲に切り詰めてから調べる
+        x0, y0 = max(x0, self.bounds[0]), max(y0, self.bounds[1])
+        x1, y1 = min(x1, self.bounds[2]), min(y1, self.bounds[3])
+        found = set()
+        if x0 > x1 or y0 > y1: return found
+        for cell in self._cells(x0, y0, x1, y1):
+            for p_id in self.cells.get(cell, ()):
+                if p_id in found: continue
+                bx0, by0, bx1, by1 = self._box(*self.positions[p_id])
+                if bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0: found.add(p_id)
+        return found
+
+
+def clip_layout(positions, rect, index=None):
+    """レイアウトを矩形 (x0, y0, x1, y1) と重なる箱だけに絞る。同じレイアウトを何度も切るときは index を使い回す"""
+    ids = (index or SpatialIndex(positions)).query(*rect)
+    return {p_id: positions[p_id] for p_id in ids}
+
+
+def render_focus(json_path, query, output_path, up=None, down=None):
+    """指定した人物を中心にした部分家系図だけをレイアウト・描画する"""
+    from .draw_final_tree import build_tree, calculate_layout, draw_tree
+    try:
+        graph = load_graph(json_path)
+    except FileNotFoundError:
+        print(f"エラー: '{json_path}' が見つかりません。"); return False
+    p_id = graph.find_person(query)
+    if p_id is None: print(f"エラー: 人物 '{query}' が見つかりません。"); return False
+    sub = graph.subgraph(graph.focus(p_id, up=up, down=down))
+    print(f"{graph.persons[p_id].get('name') or p_id} を中心に {len(sub['persons'])} 人を描画します（全体 {len(graph.persons)} 人）。")
+    nodes = build_tree(sub["persons"], sub["relationships"])
+    draw_tree(nodes, calculate_layout(nodes), output_path, annotations={p_id: {"label": "基準", "color": "black"}})
+    return True
@@ -0,0 +1,191 @@
+#synthesis.py (AIによる統合・名寄せ機能付き最終版)
+
+import os
+import json
+import glob
+from dotenv import load_dotenv
+
+from . import instrumentation
+from .call_controller import get_controller
+from .cloud_clients import get_model, LLM_MODEL_NAME
+from .koseki_schema import SchemaError, generation_config, generate_json, validate
+from .page_merge import StreamMerger
+from .stream_json import parse_stream
+
+# --- 設定 ---
+PAGES_INPUT_DIR = "output/pages"
+MERGED_JSON_OUTPUT_PATH = "output/family_tree_merged.json"
+
+def _open_stream(model, prompt, config):
+    """ストリームを開いて最初のチャンクまで受け取る（接続時の429などは call_controller が再試行する）"""
+    stream = iter(model.generate_content(prompt, generation_config=config, stream=True))
+    return stream, next(stream, None)
+
+def stream_synthesis(model, prompt, config, on_item=None):
+    """
+    統合の応答をストリーミングで受け取り、人物・関係性が1件閉じるたびに on_item(種類, 要素) を呼ぶ。
+    ({"persons": [...], "relationships": [...]}, 最後まで受け取れたか) を返す。
+    ストリームが途中で切れた場合は、それまでの要素を error.partial に入れた例外を送出する。
+    """
+    with instrumentation.span("synthesis_llm", stream=True) as s:
+        stream, first = get_controller().call("vertex", _open_stream, model, prompt, config, model=LLM_MODEL_NAME)
+        last = [first]
+
+        def texts():
+            chunk = first
+            while chunk is not None:
+                last[0] = chunk
+                yield chunk.text
+                chunk = next(stream, None)
+
+        data, complete = parse_stream(texts(), on_item)
+        prompt_tokens, response_tokens = instrumentation.token_usage(last[0])
+        s.set(prompt_chars=len(prompt), prompt_tokens=prompt_tokens, response_tokens=response_tokens,
+              persons=len(data["persons"]), relationships=len(data["relationships"]))
+    return data, complete
+
+def save_partial(data, output_path):
+    """途中までの統合結果を <出力名>.partial.json に保存する（両端がそろっていない関係性は除く）"""
+    partial_path = os.path.splitext(output_path)[0] + ".partial.json"
+    ids = {p.get("id") for p in data["persons"]}
+    relationships = [r for r in data["relationships"] if r.get("source") in ids and r.get("target") in ids]
+    with open(partial_path, 'w', encoding='utf-8') as f:
+        json.dump({"persons": data["persons"], "relationships": relationships}, f, ensure_ascii=False, indent=2)
+    print(f"途中までに受信した人物 {len(data['persons'])} 人・関係性 {len(relationships)} 件を '{partial_path}' に保存しました。")
+
+def _print_progress(counts):
+    def on_item(kind, item):
+        counts[kind] += 1
+        print(f"\r  受信済み: 人物 {counts['persons']} 人 / 関係性 {counts['relationships']} 件", end="", flush=True)
+    return on_item
+
+def synthesize_with_ai(pages_dir, output_path, model=None, stream=True, on_item=None):
+    """
+    AIの能力を使って、ページごとの断片的なJSONデータを
+    名寄せ・統合し、最終的な単一のJSONを生成する。
+    model を渡すと Vertex AI を初期化せずにそれを使う（fake_clients.py 参照）。
+    stream=True では応答をストリーミングで受け取り、人物・関係性が届くたびに進捗を表示し、
+    page_merge.StreamMerger で応答のIDを振り直しながら統合データに加え、on_item(種類, 要素) を呼ぶ。
+    応答が最後まで届いてスキーマに合えば、その統合データを保存する（応答全体を受け取ってから統合し直さない）。
+    ストリームが途中で切れた場合は、それまでに統合した分を保存する。
+    統合データを保存できれば True、失敗した（途中までの保存を含む）ときは False を返す。
+    """
+    print("--- AIによる統合・名寄せ処理を開始 ---")
+    if model is None:
+        load_dotenv()
+        try:
+            model = get_model(LLM_MODEL_NAME)
+        except Exception as e:
+            print(f"Google Cloudの初期化に失敗: {e}"); return False
+
+    json_files = sorted(glob.glob(os.path.join(pages_dir, "page_*_data.json")))
+    if not json_files:
+        print(f"エラー: '{pages_dir}' に解析済みJSONファイルが見つかりません。"); return False
+
+    # 全ページの情報を一つのテキストにまとめる
+    all_pages_text = ""
+    for file_path in json_files:
+        page_num = os.path.basename(file_path).split('_')[1]
+        all_pages_text += f"\n\n--- ページ {page_num} の抽出結果 ---\n"
+        with open(file_path, 'r', encoding='utf-8') as f:
+            all_pages_text += f.read()
+
+    # AIへの最終統合を依頼するプロンプト
+    prompt = f"""
+# 命令書
+あなたは、戸籍情報を整理するデータアナリストです。以下に、複数ページから抽出された、重複を含む人物と関係性のJSONデータ群が提示されます。あなたの仕事は、これらの断片的な情報を分析し、**同一人物を特定（名寄せ）**し、**最終的な一つのクリーンな家系データ**としてJSON形式で出力することです。
+
+# 重要ルール
+- **名寄せ**: 「妻 ハナコ」と「阿吹 ハナコ」のように、文脈（関係性や日付）から同一人物だと判断できるものは、一つの人物情報に統合してください。
+- **情報統合**: 同一人物の情報が複数ある場合、それぞれの情報を補完しあって、最も完全な人物データを作成してください。（例：あるページには生年月日、別のページには死亡日が記載されている場合、両方を一つのデータにまとめる）
+- **IDの再採番**: 最終的な人物リストでは、各人物に1から始まるユニークな整数IDを振り直してください。
+- **関係性の再構築**: 関係性リストの`source`と`target`も、新しい整数IDを使って再構築してください。
+
+# 入力データ（複数ページのJSONデータ群）:
+---
+{all_pages_text}
+---
+
+# 出力形式 (最終的な単一のJSONのみを出力すること):
+{{
+  "persons": [
+    {{
+      "id": 1,
+      "name": "阿吹 利三郎",
+      "gender": "M",
+      "birth_date": "...",
+      "death_date": "...",
+      "notes": "..."
+    }},
+    ...
+  ],
+  "relationships": [
+    {{
+      "source": 1,
+      "target": 2,
+      "type": "spouse"
+    }},
+    ...
+  ]
+}}
+"""
+
+    print("AIに最終的な統合を依頼しています。これには少し時間がかかる場合があります...")
+    config = generation_config(id_type=int)
+
+    def generate(prompt):
+        with instrumentation.span("synthesis_llm") as s:
+            response = get_controller().call("vertex", model.generate_content, prompt, generation_config=config,
+                                             model=LLM_MODEL_NAME)
+            prompt_tokens, response_tokens = instrumentation.token_usage(response)
+            s.set(prompt_chars=len(prompt), prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+        return response
+
+    final_data = None
+    if stream:
+        show_progress, merger = _print_progress({"persons": 0, "relationships": 0}), StreamMerger()
+        callbacks = [show_progress, merger] + ([on_item] if on_item else [])
+
+        def callback(kind, item):
+            for f in callbacks: f(kind, item)
+
+        try:
+            data, complete = stream_synthesis(model, prompt, config, callback)
+        except Exception as e:
+            print(f"\nAIによる最終統合処理中にストリームが中断しました: {e}")
+            if merger.persons: save_partial(merger.to_dict(), output_path)
+            return False
+        print()
+        if not complete:
+            print("エラー: 統合の応答が途中で終わりました（出力トークンの上限に達した可能性があります）。")
+            save_partial(merger.to_dict(), output_path); return False
+        try:
+            validate(data, id_type=int)
+            final_data = merger.to_dict()
+            if merger.waiting_relationships():
+                print(f"  - 応答にない人物IDを指す関係性 {merger.waiting_relationships()} 件を除きました。")
+            if merger.self_loops:
+                print(f"  - 自分自身を指す関係性 {len(merger.self_loops)} 件を除きました。")
+        except SchemaError as e:
+            print(f"  - ストリーミングの応答がスキーマに合わないため、修正を依頼します: {e}")
+
+    try:
+        if final_data is None: final_data = generate_json(generate, prompt, id_type=int)
+    except SchemaError as e:
+        print(f"AIによる最終統合処理中にエラーが発生しました: {e}")
+        # 応答は得られたが解析できなかった場合、生の応答を保存してデバッグしやすくする
+        error_path = os.path.join(os.path.dirname(output_path) or ".", "synthesis_error_response.txt")
+        with open(error_path, "w", encoding="utf-8") as f:
+            f.write(getattr(e, "text", None) or "")
+        print(f"エラー応答を '{error_path}' に保存しました。")
+        return False
+    except Exception as e:
+        print(f"AIによる最終統合処理中にエラーが発生しました: {e}"); return False
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(final_data, f, ensure_ascii=False, indent=2)
+    print(f"✅ AIによる統合完了！名寄せされた最終データを '{output_path}' に保存しました。")
+    return True
+
+if __name__ == "__main__":
+    synthesize_with_ai(PAGES_INPUT_DIR, MERGED_JSON_OUTPUT_PATH)
\ No newline at end of file
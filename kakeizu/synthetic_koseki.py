@@ -0,0 +1,211 @@
+# synthetic_koseki.py (ベンチマーク用の架空戸籍データ生成)
+
+import os
+import json
+import random
+import argparse
+from collections import deque, defaultdict
+
+from .wareki import ERAS
+
+SURNAMES = ["阿吹", "佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺", "山本", "中村", "小林", "加藤", "吉田",
+            "山田", "佐々木", "山口", "松本", "井上", "木村", "林", "斎藤", "清水", "山崎", "森", "池田",
+            "橋本", "阿部", "石川", "山下", "中島", "石井", "小川", "前田", "岡田", "長谷川", "藤田", "後藤",
+            "近藤", "村上", "遠藤", "青木", "坂本", "斉藤", "福田", "太田", "西村", "藤井", "金子", "岡本"]
+MALE_HEADS = ["軍", "利", "太", "正", "清", "茂", "勝", "義", "秀", "和", "健", "博", "弘", "昭", "孝",
+              "信", "幸", "隆", "英", "武", "光", "直", "修", "誠", "徳", "政", "重", "芳", "喜", "静"]
+MALE_TAILS = ["一", "一郎", "二郎", "三郎", "吉", "蔵", "治", "雄", "夫", "男", "之助", "次", "平", "作", "彦"]
+FEMALE_OLD = ["ハナ", "キク", "ウメ", "マツ", "トメ", "ミツ", "タケ", "ツル", "カメ", "シヅ", "フミ", "ヨシ",
+              "ハル", "ナツ", "アキ", "フユ", "イネ", "スエ", "サダ", "チヨ"]
+FEMALE_NEW_HEADS = ["花", "和", "幸", "美", "恵", "明", "京", "典", "洋", "久", "由", "真", "智", "裕", "直",
+                    "佳", "優", "理", "香", "陽"]
+FEMALE_NEW_TAILS = ["子", "美", "恵", "代", "江", "枝", "香", "奈"]
+PREFECTURES = ["東京都", "大阪府", "愛知県", "福岡県", "北海道", "宮城県", "広島県", "静岡県", "長野県", "新潟県"]
+
+CURRENT_YEAR = 2026
+
+
+def to_wareki(year, month, day, kanji=False):
+    """西暦の年月日を和暦の文字列にする（古い戸籍の雰囲気を出すため漢数字も選べる）"""
+    era, start = max(((e, s) for e, s in ERAS.items() if s <= year), key=lambda x: x[1])
+    n = year - start + 1
+    if kanji:
+        return f"{era}{'元' if n == 1 else _kanji_number(n)}年{_kanji_number(month)}月{_kanji_number(day)}日"
+    return f"{era}{'元' if n == 1 else n}年{month}月{day}日"
+
+
+def _kanji_number(n):
+    digits = "〇一二三四五六七八九"
+    tens, ones = divmod(n, 10)
+    return (("" if tens == 1 else digits[tens]) + "十" if tens else "") + (digits[ones] if ones or not tens else "")
+
+
+class KosekiGenerator:
+    """
+    再現性のある架空の家系データを生成する。
+    出力は family_tree_merged.json と同じ persons/relationships 形式。
+    """
+
+    def __init__(self, seed=0, generations=6, fan_out=2.5, marriage_rate=0.8, remarriage_rate=0.08,
+                 adoption_rate=0.03, missing_date_rate=0.1, start_year=1840):
+        self.rng = random.Random(seed)
+        self.generations, self.fan_out = generations, fan_out
+        self.marriage_rate, self.remarriage_rate = marriage_rate, remarriage_rate
+        self.adoption_rate, self.missing_date_rate = adoption_rate, missing_date_rate
+        self.start_year = start_year
+        self.persons, self.relationships, self.used_names = [], [], set()
+
+    # --- 人物の生成 ---
+
+    def _given_name(self, gender, birth_year):
+        rng = self.rng
+        if gender == 'M':
+            return rng.choice(MALE_HEADS) + rng.choice(MALE_TAILS if rng.random() < 0.6 else MALE_HEADS)
+        if birth_year < 1930 and rng.random() < 0.7: return rng.choice(FEMALE_OLD)
+        return rng.choice(FEMALE_NEW_HEADS) + rng.choice(FEMALE_NEW_TAILS if rng.random() < 0.6 else FEMALE_NEW_HEADS)
+
+    def _date(self, year):
+        if self.rng.random() < self.missing_date_rate: return None
+        return to_wareki(year, self.rng.randint(1, 12), self.rng.randint(1, 28), kanji=year < 1945 and self.rng.random() < 0.5)
+
+    def _add_person(self, surname, gender, birth_year, notes=None, adult=False):
+        for _ in range(20):
+            given = self._given_name(gender, birth_year)
+            if (surname, given) not in self.used_names: break
+        self.used_names.add((surname, given))
+        # 幼くして亡くなる子も一定の割合で含める（始祖や配偶者は成人まで生きている）
+        lifespan = self.rng.randint(40, 98) if adult or self.rng.random() > 0.06 else self.rng.randint(0, 5)
+        death_year = birth_year + lifespan
+        person = {
+            "id": len(self.persons) + 1,
+            "name": f"{surname} {given}",
+            "gender": gender,
+            "birth_date": self._date(birth_year),
+            "death_date": self._date(death_year) if death_year < CURRENT_YEAR else None,
+            "notes": notes,
+        }
+        person["_birth_year"], person["_death_year"] = birth_year, death_year
+        self.persons.append(person)
+        return person
+
+    def _relate(self, source, target, r_type):
+        self.relationships.append({"source": source["id"], "target": target["id"], "type": r_type})
+
+    def _marry(self, person):
+        """配偶者を外から迎え、婚姻関係を追加する（妻は夫の氏を称する）"""
+        gender = 'F' if person["gender"] == 'M' else 'M'
+        year = person["_birth_year"] + self.rng.randint(-5, 5)
+        surname = person["name"].split(" ")[0] if gender == 'F' else self.rng.choice(SURNAMES)
+        spouse = self._add_person(surname, gender, year, notes=f"{self.rng.choice(PREFECTURES)}より婚姻により入籍", adult=True)
+        self._relate(*((person, spouse) if person["gender"] == 'M' else (spouse, person)), "spouse")
+        return spouse
+
+    # --- 家系の生成 ---
+
+    def generate(self, n_persons):
+        """n_persons 人に達するまで、始祖の夫婦から世代を下って家系を広げる"""
+        queue = deque()
+        while len(self.persons) < n_persons:
+            if not queue:
+                founder = self._add_person(self.rng.choice(SURNAMES), 'M', self.start_year + self.rng.randint(0, 30), adult=True)
+                queue.append((founder, self._marry(founder), 0))
+            husband_or_head, spouse, generation = queue.popleft()
+            husband, wife = (husband_or_head, spouse) if husband_or_head["gender"] == 'M' else (spouse, husband_or_head)
+            self._add_children(husband, wife, generation, queue, n_persons)
+            if self.rng.random() < self.remarriage_rate and len(self.persons) < n_persons:
+                # 再婚: 後妻（または後夫）との間にも子をもうける
+                second = self._marry(husband_or_head)
+                second["notes"] = (second["notes"] or "") + "（再婚）"
+                pair = (husband_or_head, second) if husband_or_head["gender"] == 'M' else (second, husband_or_head)
+                self._add_children(pair[0], pair[1], generation, queue, n_persons)
+        for person in self.persons:
+            person.pop("_birth_year", None); person.pop("_death_year", None)
+        return {"persons": self.persons, "relationships": self.relationships}
+
+    def _add_children(self, husband, wife, generation, queue, n_persons):
+        count = max(0, round(self.rng.gauss(self.fan_out, 1.2)))
+        base_year = max(husband["_birth_year"], wife["_birth_year"]) + 20
+        surname = husband["name"].split(" ")[0]
+        for i in range(count):
+            if len(self.persons) >= n_persons: return
+            adopted = self.rng.random() < self.adoption_rate
+            child = self._add_person(surname if not adopted else self.rng.choice(SURNAMES), self.rng.choice('MF'),
+                                     base_year + i * self.rng.randint(1, 3) + self.rng.randint(0, 5),
+                                     notes="養子縁組" if adopted else None)
+            r_type = "adopted" if adopted else "parent_child"
+            self._relate(husband, child, r_type); self._relate(wife, child, r_type)
+            grows_up = child["_death_year"] - child["_birth_year"] >= 18
+            if grows_up and generation + 1 < self.generations and self.rng.random() < self.marriage_rate and len(self.persons) < n_persons:
+                queue.append((child, self._marry(child), generation + 1))
+
+
+def generate_family(n_persons, seed=0, **options):
+    return KosekiGenerator(seed=seed, **options).generate(n_persons)
+
+
+def split_into_pages(data, seed=0):
+    """
+    家系データを、LLMがページごとに出力するような氏名IDのJSON群に分割する。
+    人物は親の戸籍と自分の戸籍の両方に現れ、片方では項目の一部が欠ける。
+    """
+    rng = random.Random(seed)
+    persons = {p["id"]: p for p in data["persons"]}
+    households, rels_by_person = {}, defaultdict(list)
+    for rel in data["relationships"]:
+        rels_by_person[rel["source"]].append(rel)
+        if rel["type"] == "spouse":
+            households.setdefault(rel["source"], {rel["source"]}).add(rel["target"])
+    for rel in data["relationships"]:
+        if rel["type"] in ("parent_child", "adopted") and persons[rel["source"]]["gender"] == 'M':
+            households.setdefault(rel["source"], {rel["source"]}).add(rel["target"])
+    pages = []
+    for head, members in households.items():
+        names = {}
+        page_persons = []
+        for p_id in sorted(members):
+            person = dict(persons[p_id])
+            del person["id"]
+            separator = rng.choice([" ", " ", "", "　"])
+            person["name"] = person["name"].replace(" ", separator)
+            if p_id != head and rng.random() < 0.3: person["death_date"] = None
+            if rng.random() < 0.2: person["birth_date"] = None
+            person["id"] = names[p_id] = person["name"]
+            page_persons.append(person)
+        page_rels = [{"type": r["type"], "source": names[r["source"]], "target": names[r["target"]]}
+                     for p_id in names for r in rels_by_person[p_id] if r["target"] in names]
+        pages.append({"persons": page_persons, "relationships": page_rels})
+    return pages
+
+
+def write_pages(pages, pages_dir):
+    os.makedirs(pages_dir, exist_ok=True)
+    paths = []
+    for i, page in enumerate(pages, start=1):
+        path = os.path.join(pages_dir, f"page_{i}_data.json")
+        with open(path, "w", encoding="utf-8") as f: json.dump(page, f, ensure_ascii=False, indent=2)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="架空の戸籍データ（family_tree_merged.json形式）を生成します。")
+    parser.add_argument("persons", type=int, help="生成する人数（10〜100000程度）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--generations", type=int, default=6)
+    parser.add_argument("--fan-out", type=float, default=2.5, help="夫婦あたりの子の数の平均")
+    parser.add_argument("--remarriage-rate", type=float, default=0.08)
+    parser.add_argument("--adoption-rate", type=float, default=0.03)
+    parser.add_argument("--missing-date-rate", type=float, default=0.1)
+    parser.add_argument("-o", "--output", default="output/family_tree_synthetic.json")
+    parser.add_argument("--pages-dir", help="指定するとページ単位のJSONも書き出します")
+    args = parser.parse_args()
+
+    data = generate_family(args.persons, seed=args.seed, generations=args.generations, fan_out=args.fan_out,
+                           remarriage_rate=args.remarriage_rate, adoption_rate=args.adoption_rate,
+                           missing_date_rate=args.missing_date_rate)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"✅ {len(data['persons'])}人分の架空データを '{args.output}' に保存しました。")
+    if args.pages_dir:
+        paths = write_pages(split_into_pages(data, seed=args.seed), args.pages_dir)
+        print(f"✅ {len(paths)}ページ分のJSONを '{args.pages_dir}' に保存しました。")
@@ -1,13 +1,29 @@
 # visualize_tree.py (属性名修正版)
 
 import json
-import networkx as nx
-import matplotlib.pyplot as plt
 from collections import defaultdict
+from functools import cached_property
 
-# Macで日本語表示するためのフォント設定
-plt.rcParams['font.family'] = 'AppleGothic'
-plt.rcParams['axes.unicode_minus'] = False 
+# --- visualize_fast の設定 ---
+UNIT_INCHES = 1.2          # レイアウトの1単位（1人分の幅・1世代の高さ）の最大の大きさ
+FAST_DPI = 100
+MAX_FIGURE_PX = 8000       # 図の長辺の上限。人数が多いほど1人分が小さくなる
+NODE_RADIUS = 0.35         # レイアウトの単位で
+LABEL_MIN_PX = 40          # 1人分がこれ未満のピクセル数なら名前を描かない
+LABEL_FULL_PX = 100        # これ未満なら名前だけ、以上なら生没年も描く
+LABEL_FONT_PT = 9
+
+def setup_japanese_font(pyplot=True):
+    """
+    Macで日本語表示するためのフォント設定（matplotlibは描画するときに初めて読み込む）。
+    pyplot=False なら pyplot（GUIバックエンド）は読み込まず、設定だけ行う。
+    """
+    import matplotlib
+    matplotlib.rcParams['font.family'] = 'AppleGothic'
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    if pyplot:
+        import matplotlib.pyplot as plt
+        return plt
 
 class Person:
     def __init__(self, id, name, gender=None, birth_date=None, death_date=None, **kwargs):
@@ -39,9 +55,14 @@ class FamilyTree:
 class FamilyTreeVisualizer:
     def __init__(self, family_tree):
         self.family_tree = family_tree
-        self.graph = self._to_networkx_graph()
+
+    @cached_property
+    def graph(self):
+        """networkx のグラフ（visualize_basic で初めて使うときに作る。visualize_fast では読み込まない）"""
+        return self._to_networkx_graph()
 
     def _to_networkx_graph(self):
+        import networkx as nx
         G = nx.DiGraph()
         for id, person in self.family_tree.persons.items():
             label = f"{person.name}\n{person.birth_date or ''}"
@@ -57,6 +78,8 @@ class FamilyTreeVisualizer:
         return G
 
     def visualize_basic(self, figsize=(32, 24)):
+        import networkx as nx
+        plt = setup_japanese_font()
         plt.figure(figsize=figsize)
         pos = self._hierarchical_layout()
         
@@ -85,6 +108,66 @@ class FamilyTreeVisualizer:
         plt.axis('off')
         return plt.gcf()
 
+    def visualize_fast(self, pos=None, dpi=FAST_DPI, headless=True):
+        """
+        人物・親子の線・夫婦の線をそれぞれ1つの PatchCollection / LineCollection で描く高速版。
+        図の大きさはレイアウトの範囲から決め（1人分・1世代が最大 UNIT_INCHES、各辺は最大 MAX_FIGURE_PX）、
+        1人分が LABEL_MIN_PX 未満なら名前を省き、LABEL_FULL_PX 未満なら名前だけを描く。
+        headless=True では pyplot を使わずに Agg で描く（GUIのないサーバー向け）。
+        """
+        from matplotlib.patches import Ellipse
+        from matplotlib.collections import PatchCollection, LineCollection
+        setup_japanese_font(pyplot=not headless)
+        if headless:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            fig = Figure(dpi=dpi); FigureCanvasAgg(fig)
+        else:
+            import matplotlib.pyplot as plt
+            fig = plt.figure(dpi=dpi)
+
+        pos = pos if pos is not None else self._hierarchical_layout()
+        persons = self.family_tree.persons
+        ids = [p_id for p_id in persons if p_id in pos]
+        if not ids: return fig
+        min_x, max_x = min(pos[i][0] for i in ids) - 1, max(pos[i][0] for i in ids) + 1
+        min_y, max_y = min(pos[i][1] for i in ids) - 1, max(pos[i][1] for i in ids) + 1
+        # 横（1人分）と縦（1世代）は別々に縮める。人物の円はどちらか小さい方に合わせた大きさで描く
+        unit_px = min(UNIT_INCHES * dpi, MAX_FIGURE_PX / (max_x - min_x))
+        level_px = min(UNIT_INCHES * dpi, MAX_FIGURE_PX / (max_y - min_y))
+        fig.set_size_inches((max_x - min_x) * unit_px / dpi, (max_y - min_y) * level_px / dpi)
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_xlim(min_x, max_x); ax.set_ylim(min_y, max_y); ax.axis('off')
+        radius_px = NODE_RADIUS * min(unit_px, level_px)
+        rx, ry = radius_px / unit_px, radius_px / level_px
+
+        colors = {'M': 'lightblue', 'F': 'lightpink'}
+        nodes = PatchCollection([Ellipse(pos[i], 2 * rx, 2 * ry) for i in ids], alpha=0.9, linewidths=0, zorder=2,
+                                facecolors=[colors.get(persons[i].gender, 'lightgray') for i in ids])
+        parent_child, spouse = [], []
+        for rel in self.family_tree.relationships:
+            if rel.source not in pos or rel.target not in pos: continue
+            (sx, sy), (tx, ty) = pos[rel.source], pos[rel.target]
+            if rel.type in ['parent_child', 'adopted']:
+                parent_child.append(((sx, sy - ry), (tx, ty + ry)))
+            elif rel.type == 'spouse':
+                spouse.append(((sx, sy), (tx, ty)))
+        ax.add_collection(LineCollection(parent_child, colors='gray', linewidths=1.5, zorder=1))
+        ax.add_collection(LineCollection(spouse, colors='red', linestyles='dashed', linewidths=1, zorder=1))
+        ax.add_collection(nodes)
+
+        if unit_px >= LABEL_MIN_PX:
+            full = unit_px >= LABEL_FULL_PX
+            font_size = LABEL_FONT_PT * min(1.0, unit_px / LABEL_FULL_PX)
+            for i in ids:
+                person = persons[i]
+                label = person.name or ''
+                if full:
+                    label += f"\n{person.birth_date or ''}" + (f"\n- {person.death_date}" if person.death_date else '')
+                ax.text(pos[i][0], pos[i][1], label, fontsize=font_size, ha='center', va='center', zorder=3)
+        fig.suptitle("Generated Family Tree", fontsize=20)
+        return fig
+
     def _hierarchical_layout(self):
         if not self.family_tree.persons: return {}
         # ▼▼▼▼▼ 属性名を target, type に統一 ▼▼▼▼▼
@@ -97,20 +180,25 @@ class FamilyTreeVisualizer:
         levels = defaultdict(list)
         visited = set()
 
+        # 人物ごとの配偶者・子を関係性の並び順のまま引けるようにしておく
+        spouses_out, spouses_in, children_of = defaultdict(list), defaultdict(list), defaultdict(list)
+        for rel in self.family_tree.relationships:
+            if rel.type == 'spouse':
+                spouses_out[rel.source].append(rel.target); spouses_in[rel.target].append(rel.source)
+            elif rel.type in ['parent_child', 'adopted']:
+                children_of[rel.source].append(rel.target)
+
         def assign_level(p_id, level):
             if p_id in visited: return
             visited.add(p_id)
             levels[level].append(p_id)
             
             # ▼▼▼▼▼ 属性名を source, target, type に統一 ▼▼▼▼▼
-            spouses = [rel.target for rel in self.family_tree.relationships if rel.source == p_id and rel.type == 'spouse'] + \
-                      [rel.source for rel in self.family_tree.relationships if rel.target == p_id and rel.type == 'spouse']
-            for sp_id in spouses:
+            for sp_id in spouses_out[p_id] + spouses_in[p_id]:
                 if sp_id not in visited:
                     assign_level(sp_id, level)
 
-            children = [rel.target for rel in self.family_tree.relationships if rel.source == p_id and rel.type in ['parent_child', 'adopted']]
-            for ch_id in children:
+            for ch_id in children_of[p_id]:
                 assign_level(ch_id, level + 1)
             # ▲▲▲▲▲ ここまでを修正 ▲▲▲▲▲
         
@@ -135,10 +223,15 @@ def build_tree_from_json(json_path):
         print(f"エラー: '{json_path}' が見つかりません。先に run_analysis.py と run_synthesis.py を実行してください。")
         return None
 
+    from .graph_validation import validate_graph, summarize
+    persons, relationships, report = validate_graph(data.get("persons", []), data.get("relationships", []))
+    message = summarize(report)
+    if message: print(f"警告: {message}")
+
     tree = FamilyTree()
-    for person_data in data.get("persons", []):
+    for person_data in persons:
         tree.add_person(Person(**person_data))
-    for rel_data in data.get("relationships", []):
+    for rel_data in relationships:
         # ▼▼▼▼▼ 属性名を source, target, type に統一 ▼▼▼▼▼
         if rel_data.get("source") and rel_data.get("target"):
             tree.add_relationship(Relationship(rel_data.get("source"), rel_data.get("target"), rel_data.get("type")))
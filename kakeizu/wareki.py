@@ -0,0 +1,56 @@
+# wareki.py (和暦日付の解析)
+
+import re
+
+# 元号 -> 元年の西暦（明治初期の戸籍に現れる江戸末期の元号も含める）
+ERAS = {"天保": 1830, "弘化": 1844, "嘉永": 1848, "安政": 1854, "万延": 1860, "文久": 1861, "元治": 1864,
+        "慶応": 1865, "明治": 1868, "大正": 1912, "昭和": 1926, "平成": 1989, "令和": 2019}
+ERA_INITIALS = {"M": "明治", "T": "大正", "S": "昭和", "H": "平成", "R": "令和"}
+KANJI_DIGITS = {"〇": 0, "零": 0, "一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+KANJI_UNITS = {"十": 10, "拾": 10, "百": 100, "千": 1000}
+
+_NUM = r"[0-9０-９〇零一二三四五六七八九十拾百千元]+"
+_ERA_RE = re.compile(rf"({'|'.join(ERAS)}|[MTSHR])\s*({_NUM})\s*[年.．/]\s*(?:({_NUM})\s*[月.．/]\s*(?:({_NUM})\s*日?)?)?")
+_WESTERN_RE = re.compile(rf"({_NUM})\s*[年\-/.]\s*(?:({_NUM})\s*[月\-/.]\s*(?:({_NUM})\s*日?)?)?")
+
+
+def kanji_to_int(text):
+    """「三十五」「35」「３５」「元」のような数字表記を整数にする"""
+    text = text.translate(str.maketrans("０１２３４５６７８９", "0123456789"))
+    if text == "元": return 1
+    if text.isdigit(): return int(text)
+    total, current = 0, 0
+    for ch in text:
+        if ch in KANJI_DIGITS:
+            current = current * 10 + KANJI_DIGITS[ch]
+        elif ch in KANJI_UNITS:
+            total += (current or 1) * KANJI_UNITS[ch]; current = 0
+        else:
+            return None
+    return total + current
+
+
+def parse_date(text):
+    """
+    「昭和五十年三月一日」「S50.3.1」「1975年3月1日」などを (年, 月, 日) のタプルにする。
+    月日が読み取れない部分は0とするため、タプル同士をそのまま大小比較できる。
+    解析できない場合はNone。
+    """
+    if not text or not isinstance(text, str): return None
+    match = _ERA_RE.search(text)
+    if match:
+        era = ERA_INITIALS.get(match.group(1), match.group(1))
+        year = kanji_to_int(match.group(2))
+        if year is None: return None
+        year += ERAS[era] - 1
+        month, day = match.group(3), match.group(4)
+    else:
+        match = _WESTERN_RE.search(text)
+        if not match: return None
+        year = kanji_to_int(match.group(1))
+        if year is None or year < 1000: return None
+        month, day = match.group(2), match.group(3)
+    month = kanji_to_int(month) if month else 0
+    day = kanji_to_int(day) if day else 0
+    if month is None or day is None or not (0 <= month <= 12 and 0 <= day <= 31): return None
+    return (year, month, day)
@@ -0,0 +1,95 @@
+# tests/test_call_controller.py (トークンバケットによるモデルごとの流量)
+
+import pytest
+
+from kakeizu import call_controller
+from kakeizu.call_controller import CallController, DEFAULT_LIMITS
+
+
+class FakeClock:
+    """
+    time.monotonic / time.sleep の代わり。sleep は待たずに時刻だけ進める。
+    実際の sleep と同じく必ず少しは進める（丸め誤差で待ち時間がごく小さくなっても止まらないように）
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(1e-6, seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(call_controller, "time", clock)
+    return clock
+
+
+def achieved_rates(controller, clock, models, calls):
+    """models の順に繰り返し呼び、バーストを使い切った後の区間でのモデルごとの毎秒呼び出し数を返す"""
+    times = {model: [] for model in models}
+    for i in range(calls):
+        model = models[i % len(models)]
+        controller.call("vertex", lambda: times[model].append(clock.now), model=model)
+    half = {model: t[len(t) // 2:] for model, t in times.items()}
+    return {model: (len(t) - 1) / (t[-1] - t[0]) for model, t in half.items()}
+
+
+def test_api_bucket_is_at_least_the_sum_of_model_rates():
+    for api in {key.split(":")[0] for key in DEFAULT_LIMITS if ":" in key}:
+        models = [limits[0] for key, limits in DEFAULT_LIMITS.items() if key.startswith(f"{api}:")]
+        assert DEFAULT_LIMITS[api][0] >= sum(models)
+
+
+@pytest.mark.parametrize("model", ["gemini-1.5-flash", "gemini-1.5-pro"])
+def test_each_model_reaches_its_own_rate(clock, model):
+    rates = achieved_rates(CallController(), clock, [model], 200)
+    assert rates[model] == pytest.approx(DEFAULT_LIMITS[f"vertex:{model}"][0], rel=0.02)
+
+
+def test_models_share_the_api_bucket_without_slowing_each_other(clock):
+    # pro 1回に flash 3回の割合なら、どちらもモデルごとの上限で流れる（合計は毎秒4回）
+    models = ["gemini-1.5-pro", "gemini-1.5-flash", "gemini-1.5-flash", "gemini-1.5-flash"]
+    rates = achieved_rates(CallController(), clock, models, 400)
+    assert rates["gemini-1.5-pro"] == pytest.approx(1.0, rel=0.05)
+    assert rates["gemini-1.5-flash"] == pytest.approx(3.0, rel=0.05)
+
+
+def test_api_bucket_still_caps_the_total(clock):
+    controller = CallController(limits={"vertex": (2.0, 2, 8)})
+    rates = achieved_rates(controller, clock, ["gemini-1.5-flash"], 100)
+    assert rates["gemini-1.5-flash"] == pytest.approx(2.0, rel=0.02)
+
+
+def test_retries_after_rate_limit(clock):
+    class ResourceExhausted(Exception): pass
+    outcomes = iter([ResourceExhausted("429"), ResourceExhausted("429"), "ok"])
+
+    def flaky():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception): raise outcome
+        return outcome
+
+    controller = CallController(base_delay=0.5)
+    assert controller.call("vertex", flaky, model="gemini-1.5-flash") == "ok"
+
+
+def test_timed_out_calls_do_not_use_up_tokens():
+    # 実時間で動かす（同時実行枠の待ちは Condition.wait なので時計を差し替えられない）
+    controller = CallController(limits={"x": (1.0, 2, 1), "x:m": (0.001, 1, 1)})
+    controller._limiter("x:m").acquire()  # 同時実行枠をふさいでおく
+    with pytest.raises(TimeoutError):
+        controller.call("x", lambda: None, model="m", deadline_sec=0.05)
+    assert controller._bucket("x").tokens == pytest.approx(2, abs=0.01)
+    assert controller._bucket("x:m").tokens == pytest.approx(1, abs=0.01)
+
+    controller._limiter("x:m").release("cancelled")
+    controller.call("x", lambda: None, model="m")
+    with pytest.raises(TimeoutError):  # モデルのバケットが空なら、API のバケットから取ったトークンは返す
+        controller.call("x", lambda: None, model="m", deadline_sec=0.05)
+    assert controller._bucket("x").tokens == pytest.approx(1, abs=0.01)
+    assert controller._limiter("x:m").in_flight == 0
@@ -0,0 +1,60 @@
+# tests/test_cli.py (kakeizu コマンドのサブコマンドと終了コード)
+
+import json
+
+import pytest
+
+from kakeizu.cli import main
+from kakeizu.synthetic_koseki import generate_family
+
+
+def test_failed_ai_synthesis_exits_nonzero_even_with_a_stale_output(tmp_path):
+    pytest.importorskip("dotenv")
+    output = tmp_path / "merged.json"
+    output.write_text('{"persons": [], "relationships": []}', encoding="utf-8")  # 前回の実行の結果
+    (tmp_path / "pages").mkdir()
+    assert main(["synthesize", "--ai", "--pages-dir", str(tmp_path / "pages"), "-o", str(output)]) == 1
+
+
+def write_family(tmp_path, data):
+    path = tmp_path / "merged.json"
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def test_kinship_prints_the_relation(tmp_path, capsys):
+    persons = [{"id": 1, "name": "山田 太郎", "gender": "M"}, {"id": 2, "name": "山田 一郎", "gender": "M"},
+               {"id": 3, "name": "山田 花子", "gender": "F"}]
+    relationships = [{"source": 1, "target": 2, "type": "parent_child"}, {"source": 2, "target": 3, "type": "parent_child"}]
+    path = write_family(tmp_path, {"persons": persons, "relationships": relationships})
+    assert main(["kinship", "山田太郎", "3", "-i", path]) == 0
+    assert "山田 花子 は 山田 太郎 の孫（血族 2親等）です。" in capsys.readouterr().out
+    assert main(["kinship", "山田太郎", "鈴木 次郎", "-i", path]) == 1
+
+
+def test_kinship_on_generated_family(tmp_path, capsys):
+    data = generate_family(60, seed=26)
+    path = write_family(tmp_path, data)
+    child = next(r["target"] for r in data["relationships"] if r["type"] == "parent_child" and r["source"] == 1)
+    assert main(["kinship", "1", str(child), "-i", path]) == 0
+    assert "1親等" in capsys.readouterr().out
+
+
+def test_heirs_for_one_decedent(tmp_path, capsys):
+    persons = [{"id": 1, "name": "山田 太郎", "gender": "M", "death_date": "令和2年1月1日"},
+               {"id": 2, "name": "山田 花子", "gender": "F"}, {"id": 3, "name": "山田 一郎", "gender": "M"}]
+    relationships = [{"source": 1, "target": 2, "type": "spouse"}, {"source": 1, "target": 3, "type": "parent_child"}]
+    path, output = write_family(tmp_path, {"persons": persons, "relationships": relationships}), tmp_path / "heirs.json"
+    assert main(["heirs", "山田太郎", "-i", path, "-o", str(output), "--no-image"]) == 0
+    assert "山田 花子 (配偶者): 1/2" in capsys.readouterr().out
+    results = json.loads(output.read_text(encoding="utf-8"))["results"]
+    assert [(h["id"], h["share"]) for h in results[0]["heirs"]] == [(2, "1/2"), (3, "1/2")]
+    assert main(["heirs", "鈴木 次郎", "-i", path, "-o", str(output), "--no-image"]) == 1
+
+
+def test_heirs_for_every_decedent(tmp_path):
+    data = generate_family(80, seed=27)
+    output = tmp_path / "heirs.json"
+    assert main(["heirs", "-i", write_family(tmp_path, data), "-o", str(output)]) == 0
+    results = json.loads(output.read_text(encoding="utf-8"))["results"]
+    assert {r["decedent"] for r in results} == {p["id"] for p in data["persons"] if p.get("death_date")}
@@ -0,0 +1,57 @@
+# tests/test_external_merge.py (外部マージが merge_page_files と同じ結果になること)
+
+import json
+
+import pytest
+
+from kakeizu import external_merge
+from kakeizu.external_merge import merge_page_files_external, write_merged
+from kakeizu.page_merge import merge_page_files
+from kakeizu.synthetic_koseki import generate_family, split_into_pages, write_pages
+
+EDGE_PAGES = [
+    {"persons": [{"id": "山田 太郎", "name": "山田 太郎", "gender": "M", "birth_date": None},
+                 {"id": "山田 花子", "name": "山田 花子", "gender": "F"}],
+     "relationships": [{"source": "山田 太郎", "target": "山田 花子", "type": "spouse"},
+                       {"source": "山田 太郎", "target": "山田 一郎", "type": "parent_child"}]},
+    {"persons": [{"id": "山田　太郎", "name": "山田　太郎", "birth_date": "昭和10年1月1日"},
+                 {"id": "山田 一郎", "name": "山田 一郎", "gender": "M"}, {"id": "", "name": ""}],
+     "relationships": [{"source": "山田 花子", "target": "山田 太郎", "type": "spouse"},
+                       {"source": "山田 太郎", "target": "山田 一郎", "type": "parent_child"},
+                       {"source": "山田 花子", "target": "山田 一郎", "type": None},
+                       {"source": "山田　花子", "target": "山田 一郎", "type": "parent_child"},
+                       {"source": "不明", "target": "山田 一郎", "type": "parent_child"}]},
+]
+
+
+def merged_both(pages, tmp_path, run_size):
+    paths = write_pages(pages, str(tmp_path / "pages"))
+    out = tmp_path / "merged.json"
+    stats = merge_page_files_external(paths, str(out), run_size=run_size)
+    with open(out, encoding="utf-8") as f: external = json.load(f)
+    return merge_page_files(paths), external, stats
+
+
+@pytest.mark.parametrize("run_size", [1, 3, 1000])
+def test_edge_cases_match_in_memory_merge(tmp_path, run_size):
+    expected, external, stats = merged_both(EDGE_PAGES, tmp_path, run_size)
+    assert external == expected
+    assert stats == {"persons": len(expected["persons"]), "relationships": len(expected["relationships"])}
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_generated_pages_match_with_small_runs(tmp_path, monkeypatch, seed):
+    # ランを小さくし、MAX_FAN_IN を超えて段階的にマージする経路も通す
+    monkeypatch.setattr(external_merge, "MAX_FAN_IN", 4)
+    pages = split_into_pages(generate_family(300, seed=seed), seed=seed)
+    expected, external, _ = merged_both(pages, tmp_path, run_size=17)
+    assert external == expected
+    assert not [p for p in (tmp_path).iterdir() if p.name.startswith("kakeizu_merge_")]
+
+
+def test_write_merged_gives_the_same_file_either_way(tmp_path):
+    paths = write_pages(split_into_pages(generate_family(80, seed=5), seed=5), str(tmp_path / "pages"))
+    in_memory, external = tmp_path / "a.json", tmp_path / "b.json"
+    assert write_merged(paths, str(in_memory)) == write_merged(paths, str(external), min_files=1)
+    with open(in_memory, encoding="utf-8") as a, open(external, encoding="utf-8") as b:
+        assert json.load(a) == json.load(b)
@@ -0,0 +1,103 @@
+# tests/test_graph_validation.py (レイアウト前の家系データの検査と修復)
+
+import random
+from graphlib import TopologicalSorter, CycleError
+
+import pytest
+
+from kakeizu.graph_validation import validate_graph, summarize, PARENT_TYPES
+from kakeizu.synthetic_koseki import generate_family
+
+
+def person(p_id, birth=None):
+    return {"id": p_id, "name": f"人物{p_id}", "gender": "M", "birth_date": birth}
+
+
+def rel(source, target, r_type="parent_child"):
+    return {"source": source, "target": target, "type": r_type}
+
+
+def reasons(report):
+    return [(item["reason"], item["relationship"]["source"], item["relationship"]["target"]) for item in report["quarantined"]]
+
+
+def assert_acyclic(persons, relationships):
+    graph = {p["id"]: set() for p in persons}
+    for r in relationships:
+        if r["type"] in PARENT_TYPES: graph[r["target"]].add(r["source"])
+    try: list(TopologicalSorter(graph).static_order())
+    except CycleError as e: pytest.fail(f"親子関係が循環しています: {e.args[1]}")
+
+
+def test_two_cycle_is_cut_at_the_younger_end():
+    persons = [person(1, "昭和10年1月1日"), person(2)]
+    _, relationships, report = validate_graph(persons, [rel(1, 2), rel(2, 1)])
+    assert reasons(report) == [("cycle", 2, 1)]
+    assert relationships == [rel(1, 2)]
+    assert report["cycles"] == [[1, 2]] or report["cycles"] == [[2, 1]]
+
+
+def test_three_cycle_inside_a_larger_component():
+    # 1→2→3→1 の循環と 3→4→5→3 の循環が1つの強連結成分になる。6 は成分の外の子
+    persons = [person(i) for i in range(1, 7)]
+    relationships = [rel(1, 2), rel(2, 3), rel(3, 1), rel(3, 4), rel(4, 5), rel(5, 3), rel(5, 6)]
+    _, kept, report = validate_graph(persons, relationships)
+    assert report["counts"] == {"cycle": 2}
+    assert all(item["cycle_size"] == 5 for item in report["quarantined"])
+    assert sorted(map(sorted, report["cycles"])) == [[1, 2, 3, 4, 5]]
+    assert rel(5, 6) in kept
+    assert_acyclic(persons, kept)
+
+
+def test_self_loop_and_dangling_and_unknown_type():
+    persons = [person(1), person(2)]
+    _, kept, report = validate_graph(persons, [rel(1, 1, "spouse"), rel(1, 9), rel(1, 2, "friend"), rel(1, 2)])
+    assert reasons(report) == [("self_loop", 1, 1), ("dangling", 1, 9), ("unknown_type", 1, 2)]
+    assert report["quarantined"][1]["missing_ids"] == [9]
+    assert kept == [rel(1, 2)]
+
+
+@pytest.mark.parametrize("second", [rel(1, 2, "spouse"), rel(2, 1, "spouse")])
+def test_duplicate_spouse_in_either_direction(second):
+    _, kept, report = validate_graph([person(1), person(2)], [rel(1, 2, "spouse"), second])
+    assert reasons(report) == [("duplicate", second["source"], second["target"])]
+    assert kept == [rel(1, 2, "spouse")]
+
+
+def test_reversed_parent_child_is_not_a_duplicate():
+    _, kept, report = validate_graph([person(1), person(2)], [rel(1, 2), rel(2, 1)])
+    assert report["counts"] == {"cycle": 1} and len(kept) == 1
+
+
+@pytest.mark.parametrize("parent_birth, child_birth, quarantined", [
+    ("昭和50年", "昭和40年1月1日", True),       # 年だけの日付でも年が違えば比べる
+    ("昭和40年", "昭和40年1月1日", False),      # 同じ年で月日が不明なら比べない
+    ("昭和40年3月", "昭和40年1月1日", False),
+    ("昭和40年3月1日", "昭和40年1月1日", True),
+    (None, "昭和40年1月1日", False),
+])
+def test_parent_born_after_child(parent_birth, child_birth, quarantined):
+    _, kept, report = validate_graph([person(1, parent_birth), person(2, child_birth)], [rel(1, 2, "adopted")])
+    assert (reasons(report) == [("parent_born_after_child", 1, 2)]) == quarantined
+    assert (kept == []) == quarantined
+    if quarantined: assert report["quarantined"][0]["dates"] == [parent_birth, child_birth]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_remaining_parent_edges_are_acyclic(seed):
+    rng = random.Random(seed)
+    data = generate_family(300, seed=seed)
+    ids = [p["id"] for p in data["persons"]]
+    relationships = list(data["relationships"])
+    relationships += [rel(rng.choice(ids), rng.choice(ids), rng.choice(PARENT_TYPES + ("spouse",))) for _ in range(200)]
+    persons, kept, report = validate_graph(data["persons"], relationships)
+    assert_acyclic(persons, kept)
+    assert len(kept) + len(report["quarantined"]) == len(relationships)
+    assert report["relationships"] == len(kept)
+
+
+def test_summarize():
+    _, _, clean = validate_graph([person(1), person(2)], [rel(1, 2)])
+    assert summarize(clean) is None
+    _, _, report = validate_graph([person(1), person(2)], [rel(1, 1), rel(1, 2), rel(2, 1)])
+    assert summarize(report) == "関係性 2 件を隔離しました（cycle 1件、self_loop 1件）。"
@@ -0,0 +1,90 @@
+# tests/test_heirs.py (法定相続人と法定相続分の判定)
+
+from fractions import Fraction
+
+import pytest
+
+from kakeizu.heirs import HeirEngine, RANK_LABELS
+from kakeizu.synthetic_koseki import generate_family
+
+DEATH = "令和2年1月1日"        # 被相続人の死亡日
+EARLIER = "平成30年5月1日"     # 被相続人より先に死亡
+LONG_AGO = "昭和50年3月3日"
+
+
+def person(p_id, gender="M", death=None):
+    return {"id": p_id, "name": f"人物{p_id}", "gender": gender, "birth_date": None, "death_date": death}
+
+
+def parent(source, *targets):
+    return [{"source": source, "target": t, "type": "parent_child"} for t in targets]
+
+
+def spouse(a, b):
+    return [{"source": a, "target": b, "type": "spouse"}]
+
+
+def shares(result):
+    return {heir["id"]: Fraction(heir["share"]) for heir in result["heirs"]}
+
+
+def test_spouse_and_children():
+    persons = [person(1, death=DEATH), person(2, "F"), person(3), person(4, "F")]
+    relationships = spouse(1, 2) + parent(1, 3, 4) + parent(2, 3, 4)
+    result = HeirEngine(persons, relationships).determine(1)
+    assert result["rank"] == RANK_LABELS[1]
+    assert shares(result) == {2: Fraction(1, 2), 3: Fraction(1, 4), 4: Fraction(1, 4)}
+
+
+def test_representation_by_grandchildren():
+    # 子3が被相続人より先に死亡し、その子5・6が代襲する
+    persons = [person(1, death=DEATH), person(2, "F"), person(3, death=EARLIER), person(4, "F"), person(5), person(6, "F")]
+    relationships = spouse(1, 2) + parent(1, 3, 4) + parent(2, 3, 4) + parent(3, 5, 6)
+    result = HeirEngine(persons, relationships).determine(1)
+    assert shares(result) == {2: Fraction(1, 2), 4: Fraction(1, 4), 5: Fraction(1, 8), 6: Fraction(1, 8)}
+    assert {heir["id"]: heir.get("represents") for heir in result["heirs"]} == {2: None, 4: None, 5: 3, 6: 3}
+
+
+def test_nested_representation_stops_at_nephews_and_nieces():
+    # 兄弟姉妹の代襲はおい・めいまで（その子は再代襲しない）
+    persons = [person(1, death=DEATH), person(10, death=LONG_AGO), person(11, "F", death=LONG_AGO),
+               person(3, death=EARLIER), person(4, death=EARLIER), person(5)]
+    relationships = parent(10, 1, 3) + parent(11, 1, 3) + parent(3, 4) + parent(4, 5)
+    assert HeirEngine(persons, relationships).determine(1)["heirs"] == []
+
+
+@pytest.mark.parametrize("with_spouse, expected", [
+    (False, {3: Fraction(2, 3), 4: Fraction(1, 3)}),
+    (True, {2: Fraction(3, 4), 3: Fraction(1, 6), 4: Fraction(1, 12)}),
+])
+def test_full_and_half_blood_siblings(with_spouse, expected):
+    # 3は父10・母11が同じ全血、4は母12が違う半血の兄弟姉妹（相続分は 2:1）
+    persons = [person(1, death=DEATH), person(2, "F"), person(3), person(4),
+               person(10, death=LONG_AGO), person(11, "F", death=LONG_AGO), person(12, "F", death=LONG_AGO)]
+    relationships = parent(10, 1, 3, 4) + parent(11, 1, 3) + parent(12, 4) + (spouse(1, 2) if with_spouse else [])
+    result = HeirEngine(persons, relationships).determine(1)
+    assert result["rank"] == RANK_LABELS[3]
+    assert shares(result) == expected
+
+
+def test_spouse_and_parents():
+    persons = [person(1, death=DEATH), person(2, "F"), person(10), person(11, "F")]
+    relationships = spouse(1, 2) + parent(10, 1) + parent(11, 1)
+    result = HeirEngine(persons, relationships).determine(1)
+    assert shares(result) == {2: Fraction(2, 3), 10: Fraction(1, 6), 11: Fraction(1, 6)}
+
+
+def test_shares_sum_to_one_on_generated_families():
+    data = generate_family(600, seed=27)
+    engine = HeirEngine(data["persons"], data["relationships"])
+    results = engine.determine_all()
+    assert results
+    for result in results:
+        if result["heirs"]: assert sum(shares(result).values()) == 1, result["decedent"]
+
+
+def test_find_person_by_id_or_name():
+    engine = HeirEngine([{"id": 7, "name": "山田 太郎"}], [])
+    assert engine.find_person("7") == 7
+    assert engine.find_person("山田　太郎") == 7
+    assert engine.find_person("佐藤花子") is None
@@ -0,0 +1,53 @@
+# tests/test_instrumentation.py (ページ指標のジョブごとの分離)
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from kakeizu import instrumentation
+
+
+@pytest.fixture(autouse=True)
+def enabled():
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+
+
+def run_job(name, pages, barrier):
+    """ページ番号が同じ2つのジョブを並行に動かす（ページの処理はスレッドプールで行う）"""
+    def page(page_num):
+        barrier.wait()
+        instrumentation.record_page(page_num, ocr_chars=100 * page_num, llm_model=name)
+        with instrumentation.span("llm", page=page_num): pass
+
+    with instrumentation.document(name), ThreadPoolExecutor(max_workers=pages) as pool:
+        for future in [pool.submit(instrumentation.in_context(page), n) for n in range(1, pages + 1)]: future.result()
+
+
+def test_concurrent_jobs_keep_separate_page_metrics():
+    barrier = threading.Barrier(6)
+    jobs = [threading.Thread(target=run_job, args=(name, 3, barrier)) for name in ("job-a", "job-b")]
+    for job in jobs: job.start()
+    for job in jobs: job.join()
+
+    for name in ("job-a", "job-b"):
+        pages = instrumentation.page_metrics(name)
+        assert sorted(pages) == [1, 2, 3]
+        assert all(pages[n]["ocr_chars"] == 100 * n and pages[n]["llm_model"] == name for n in pages)
+        assert all("llm_sec" in metrics for metrics in pages.values())
+    assert instrumentation.page_metrics() == {}
+
+
+def test_pages_outside_a_document_are_keyed_by_page_number(tmp_path):
+    instrumentation.record_page(1, retries=1)
+    instrumentation.record_page(1, retries=2)
+    with instrumentation.document("job-a"): instrumentation.record_page(1, retries=5)
+    assert instrumentation.page_metrics() == {1: {"retries": 3}}
+
+    jsonl_path, _ = instrumentation.write_reports(str(tmp_path))
+    with open(jsonl_path, encoding="utf-8") as f: pages = [json.loads(line) for line in f]
+    assert {"type": "page", "page": 1, "retries": 3} in pages
+    assert {"type": "page", "document": "job-a", "page": 1, "retries": 5} in pages
@@ -0,0 +1,93 @@
+# tests/test_kinship.py (親等・続柄クエリエンジンと総当たりの幅優先探索の比較)
+
+import random
+from collections import deque
+
+import pytest
+
+from kakeizu.kinship import KinshipIndex, PARENT_TYPES
+from kakeizu.synthetic_koseki import generate_family
+
+
+def _with_extra_parents(data, rate, seed):
+    """実親のある子に養親を足し、家系内の別の人物を親にもする（親の番号は子より小さくして循環は作らない）"""
+    rng = random.Random(seed)
+    relationships = list(data["relationships"])
+    ids = [p["id"] for p in data["persons"]]
+    for child in ids[10:]:
+        if rng.random() < rate:
+            parent = rng.choice([i for i in ids if i < child])
+            relationships.append({"source": parent, "target": child, "type": rng.choice(PARENT_TYPES)})
+    return dict(data, relationships=relationships)
+
+
+def _ancestors(parents, start):
+    """start から全祖先への最短世代数（すべての親子関係を辿る）"""
+    dist, queue = {start: 0}, deque([start])
+    while queue:
+        node = queue.popleft()
+        for parent in parents.get(node, ()):
+            if parent not in dist: dist[parent] = dist[node] + 1; queue.append(parent)
+    return dist
+
+
+def _brute_force(data):
+    """全組の (最小の親等, その親等になる (上る世代数, 下る世代数) の集合)"""
+    parents = {}
+    for rel in data["relationships"]:
+        if rel["type"] in PARENT_TYPES and rel["source"] != rel["target"]:
+            parents.setdefault(rel["target"], set()).add(rel["source"])
+    ancestors = {p["id"]: _ancestors(parents, p["id"]) for p in data["persons"]}
+    expected = {}
+    for a, up in ancestors.items():
+        for b, down in ancestors.items():
+            common = [(up[c], down[c]) for c in up.keys() & down.keys()]
+            if not common: continue
+            degree = min(u + d for u, d in common)
+            expected[a, b] = degree, {(u, d) for u, d in common if u + d == degree}
+    return expected
+
+
+@pytest.mark.parametrize("seed, extra_rate", [(0, 0.0), (1, 0.0), (2, 0.05), (3, 0.15)])
+def test_blood_relation_matches_brute_force(seed, extra_rate):
+    data = _with_extra_parents(generate_family(180, seed=seed), extra_rate, seed)
+    index = KinshipIndex(data["persons"], data["relationships"])
+    expected = _brute_force(data)
+    for a in index.persons:
+        for b in index.persons:
+            result = index.blood_relation(a, b)
+            if (a, b) not in expected:
+                assert result is None, (a, b); continue
+            degree, shapes = expected[a, b]
+            assert result["degree"] == degree, (a, b)
+            assert result["label"] in {index.relation_label(u, d, b) for u, d in shapes}, (a, b)
+
+
+def test_blood_relation_respects_max_degree():
+    data = _with_extra_parents(generate_family(150, seed=4), 0.1, 4)
+    index = KinshipIndex(data["persons"], data["relationships"])
+    for (a, b), (degree, _) in _brute_force(data).items():
+        result = index.blood_relation(a, b, max_degree=3)
+        assert (result is None) == (degree > 3), (a, b)
+
+
+def test_marry_in_parents_do_not_force_the_slow_path():
+    data = generate_family(2000, seed=5)
+    index = KinshipIndex(data["persons"], data["relationships"])
+    assert not any(index.multi_parent.values())
+
+
+def test_birth_and_adoptive_parents_are_multi_parent():
+    persons = [{"id": i, "name": f"人物{i}", "gender": "M"} for i in range(1, 7)]
+    relationships = [
+        {"source": 1, "target": 2, "type": "parent_child"},  # 実父1 → 2
+        {"source": 3, "target": 4, "type": "parent_child"},  # 養父4の実父3
+        {"source": 4, "target": 2, "type": "adopted"},       # 養父4 → 2
+        {"source": 2, "target": 5, "type": "parent_child"},
+        {"source": 1, "target": 6, "type": "parent_child"},
+    ]
+    index = KinshipIndex(persons, relationships)
+    assert index.primary_parent[2] == 1
+    assert index.multi_parent[2] and index.multi_parent[5] and not index.multi_parent[6]
+    result = index.blood_relation(5, 3)
+    assert result["degree"] == 3 and result["via_adoption"]
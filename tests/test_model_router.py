@@ -0,0 +1,54 @@
+# tests/test_model_router.py (OCRの信頼度によるモデルの選択)
+
+import pytest
+
+from kakeizu.fake_clients import FakeVisionClient, render_page_text
+from kakeizu.model_router import FAST_MODEL_NAME, MIN_FAST_CONFIDENCE, ModelRouter
+from kakeizu.ocr_backends import VisionBackend, annotation_confidence, known_confidence
+from kakeizu.synthetic_koseki import generate_family, split_into_pages
+
+PAGE_TEXT = render_page_text(split_into_pages(generate_family(6, seed=1), seed=1)[0])
+
+
+class RecordingVisionClient(FakeVisionClient):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    def document_text_detection(self, image=None, **kwargs):
+        self.calls.append(kwargs)
+        return super().document_text_detection(image, **kwargs)
+
+
+def recognize(confidence):
+    client = RecordingVisionClient([PAGE_TEXT], latency="constant:0", confidence=confidence)
+    result = VisionBackend(client).recognize(b"png", page_num=1)
+    return result, client
+
+
+def choose(result):
+    return ModelRouter(load_model=lambda name: name).choose(result.text, result.confidence)
+
+
+def test_clear_page_is_routed_to_the_fast_model():
+    result, client = recognize(0.97)
+    assert client.calls == [{"image_context": {"language_hints": ["ja"]}}]
+    assert result.confidence == pytest.approx(0.97)
+    assert choose(result).model_name == FAST_MODEL_NAME
+
+
+def test_blurred_page_is_routed_to_the_accurate_model():
+    # 1行だけかすれていても、文字数で重み付けした信頼度が下がれば高精度モデル
+    lines = [l for l in PAGE_TEXT.splitlines() if l.strip()]
+    result, _ = recognize(lambda line: 0.2 if line == max(lines, key=len) else 0.95)
+    assert result.confidence < MIN_FAST_CONFIDENCE
+    assert choose(result).model_name != FAST_MODEL_NAME
+
+
+def test_missing_confidences_are_unknown():
+    # text_detection は信頼度を 0.0 で返す。信頼度が低いとは扱わない
+    response = FakeVisionClient([PAGE_TEXT], latency="constant:0").text_detection()
+    assert annotation_confidence(response.full_text_annotation) is None
+    assert known_confidence(0.0) is None and known_confidence(None) is None and known_confidence(0.5) == 0.5
+    route = ModelRouter(load_model=lambda name: name).choose(PAGE_TEXT, annotation_confidence(response.full_text_annotation))
+    assert route.model_name == FAST_MODEL_NAME
@@ -0,0 +1,79 @@
+# tests/test_page_merge.py (追加統合 MergeIndex と一括統合 merge_pages の一致)
+
+import copy
+
+import pytest
+
+from kakeizu import page_merge
+from kakeizu.page_merge import MergeIndex, merge_pages, normalize_name
+from kakeizu.synthetic_koseki import generate_family, split_into_pages
+
+
+def _by_name(data):
+    """IDの振り方によらずに比べられるよう、人物は氏名ごとの項目、関係性は氏名の組にする"""
+    names = {p["id"]: normalize_name(p["name"]) for p in data["persons"]}
+    persons = {names[p["id"]]: {k: v for k, v in p.items() if k != "id"} for p in data["persons"]}
+    relationships = set()
+    for rel in data["relationships"]:
+        s, t = names[rel["source"]], names[rel["target"]]
+        relationships.add((rel["type"], *sorted((s, t))) if rel["type"] == "spouse" else (rel["type"], s, t))
+    return persons, relationships
+
+
+@pytest.mark.parametrize("batches", [1, 3, 6, 17])
+def test_incremental_merge_equals_full_merge(batches):
+    pages = split_into_pages(generate_family(300, seed=batches), seed=batches)
+    chunks = [pages[i::batches] for i in range(batches)]
+    # 人物の項目は先に現れたページのものが基準になるので、一括統合も同じページの順で行う
+    expected = _by_name(merge_pages(copy.deepcopy([page for chunk in chunks for page in chunk])))
+
+    index = MergeIndex()
+    for chunk in chunks:
+        index.add_pages(copy.deepcopy(chunk))
+    assert _by_name(index.to_dict()) == expected
+    assert len({p["id"] for p in index.persons}) == len(index.persons)
+
+
+def test_pending_holds_only_relationships_waiting_for_unseen_names():
+    pages = split_into_pages(generate_family(300, seed=1), seed=1)
+    index = MergeIndex()
+    for i in range(6):
+        stats = index.add_pages(copy.deepcopy(pages[i::6]))
+        assert stats["pending_relationships"] == len(index.pending_relationships())
+        # 保留の鍵は、まだ人物として現れていない氏名だけ
+        assert not set(index.pending) & set(index.by_name)
+    assert index.pending == {}
+    # 全角スペースの入った氏名の関係性は保留せずに報告へ回る
+    assert index.unresolvable_count > 0
+    assert all(item["reason"] == "name_mismatch" for item in index.unresolvable)
+
+
+def test_pending_is_retried_only_when_the_missing_name_appears():
+    index = MergeIndex()
+    index.add_pages([{"persons": [{"name": "山田太郎"}], "relationships": [{"type": "parent_child", "source": "山田太郎", "target": "山田一郎"}]}])
+    assert list(index.pending) == ["山田一郎"]
+    stats = index.add_pages([{"persons": [{"name": "佐藤花子"}], "relationships": []}])
+    assert stats == dict(stats, new_relationships=0, pending_relationships=1)
+    stats = index.add_pages([{"persons": [{"name": "山田 一郎"}], "relationships": []}])
+    assert stats["new_relationships"] == 1 and index.pending == {}
+
+
+def test_pending_is_bounded(monkeypatch):
+    monkeypatch.setattr(page_merge, "MAX_PENDING_RELATIONSHIPS", 5)
+    index = MergeIndex()
+    rels = [{"type": "parent_child", "source": "親", "target": f"子{i}"} for i in range(12)]
+    stats = index.add_pages([{"persons": [{"name": "親"}], "relationships": rels}])
+    assert stats["pending_relationships"] == 5 and stats["unresolvable_relationships"] == 7
+    assert all(item["reason"] == "pending_limit" for item in index.unresolvable)
+
+
+def test_index_round_trip(tmp_path):
+    pages = split_into_pages(generate_family(120, seed=3), seed=3)
+    chunks = [pages[i::4] for i in range(4)]
+    merged_path = str(tmp_path / "merged.json")
+    for chunk in chunks:
+        index = MergeIndex.load(merged_path)
+        index.add_pages(copy.deepcopy(chunk))
+        index.save(merged_path)
+    expected = merge_pages(copy.deepcopy([page for chunk in chunks for page in chunk]))
+    assert _by_name(MergeIndex.load(merged_path).to_dict()) == _by_name(expected)
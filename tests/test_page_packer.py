@@ -0,0 +1,24 @@
+# tests/test_page_packer.py (短いページのまとめ方)
+
+from kakeizu.page_packer import pack_pages
+
+
+def page_nums(packs):
+    return [[n for n, _ in pack] for pack in packs]
+
+
+def test_packs_consecutive_short_pages_up_to_the_limits():
+    pages = [(n, "短" * 100) for n in range(1, 12)]
+    assert page_nums(pack_pages(pages, max_pages=4)) == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11]]
+    assert page_nums(pack_pages(pages, budget=350)) == [[1, 2, 3], [4, 5, 6], [7, 8, 9], [10, 11]]
+
+
+def test_long_pages_are_sent_alone():
+    pages = [(1, "短" * 100), (2, "長" * 800), (3, "短" * 100), (4, "短" * 100)]
+    assert page_nums(pack_pages(pages)) == [[1], [2], [3, 4]]
+
+
+def test_gaps_in_page_numbers_split_packs():
+    # 空・重複・分割済みで抜けたページをまたいではまとめない
+    pages = [(n, "短" * 100) for n in (1, 2, 4, 5, 6, 9, 11, 12)]
+    assert page_nums(pack_pages(pages)) == [[1, 2], [4, 5, 6], [9], [11, 12]]
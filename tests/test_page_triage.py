@@ -0,0 +1,38 @@
+# tests/test_page_triage.py (戸籍の記載があるページと認証文のページの仕分け)
+
+from kakeizu.fake_clients import render_page_text
+from kakeizu.page_triage import classify_page, triage_pages
+from kakeizu.synthetic_koseki import generate_family, split_into_pages
+
+# 電算化された戸籍の最後のページ。見出しに「全部事項証明」があり、人物は1人だけ
+SPARSE_LAST_PAGE = """\
+全部事項証明
+本籍　東京都千代田区千代田一番
+戸籍に記録されている者
+【名】一郎
+【生年月日】平成元年４月１日
+【父】山田太郎
+"""
+
+ATTESTATION_PAGE = """\
+これは、戸籍に記録されている事項の全部を証明した書面である。
+令和５年１０月１日
+東京都千代田区長　千代田　花子
+発行番号 12345 手数料 450円 請求者 山田 一郎（長男）
+"""
+
+
+def test_sparse_page_with_the_computerized_header_is_koseki():
+    kind, score, _ = classify_page(SPARSE_LAST_PAGE)
+    assert kind == "koseki" and score < 8
+
+
+def test_attestation_page_is_certification():
+    kind, _, reason = classify_page(ATTESTATION_PAGE)
+    assert kind == "certification" and "証明した書面" in reason
+
+
+def test_generated_pages_are_kept():
+    pages = [render_page_text(p) for p in split_into_pages(generate_family(40, seed=4), seed=4)]
+    page_texts = [(n, text) for n, text in enumerate(pages + [ATTESTATION_PAGE], start=1)]
+    assert {n: entry.get("kind") for n, entry in triage_pages(page_texts).items()} == {len(page_texts): "certification"}
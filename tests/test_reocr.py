@@ -0,0 +1,48 @@
+# tests/test_reocr.py (読み直す段落の選び方)
+
+from kakeizu.fake_clients import FakeVisionClient, render_page_text
+from kakeizu.ocr_backends import VisionBackend
+from kakeizu.reocr import find_regions, splice
+from kakeizu.synthetic_koseki import generate_family, split_into_pages
+
+PAGE_TEXT = render_page_text(split_into_pages(generate_family(6, seed=2), seed=2)[0])
+LINES = [l for l in PAGE_TEXT.splitlines() if l.strip()]
+BLURRED = {LINES[1], LINES[-1]}
+
+
+def blurred(line):
+    return 0.4 if line in BLURRED else 0.95
+
+
+def recognize(confidence, text=PAGE_TEXT):
+    # document_text_detection の経路（VisionBackend.recognize）で読んだ結果
+    return VisionBackend(FakeVisionClient([text], latency="constant:0", confidence=confidence)).recognize(b"png", page_num=1)
+
+
+def test_low_confidence_paragraphs_are_found():
+    regions = find_regions(1, recognize(blurred).annotation)
+    assert {r.text for r in regions} == BLURRED
+    assert all(r.confidence == 0.4 for r in regions)
+
+
+def test_unknown_confidences_select_nothing():
+    # text_detection は信頼度を 0.0 で返す。不明として扱い、読み直しの対象にしない
+    response = FakeVisionClient([PAGE_TEXT], latency="constant:0").text_detection()
+    assert find_regions(1, response.full_text_annotation) == []
+
+
+def test_word_confidences_are_used_when_the_paragraph_has_none():
+    annotation = recognize(blurred).annotation
+    for block in annotation.pages[0].blocks:
+        for paragraph in block.paragraphs: paragraph.confidence = 0.0
+    assert {r.text for r in find_regions(1, annotation)} == BLURRED
+
+
+def test_splice_replaces_text_and_raises_the_page_confidence():
+    result = recognize(blurred)
+    region = next(r for r in find_regions(1, result.annotation) if r.text == LINES[1])
+    reread = recognize(0.99, text=region.text)
+    refined = splice(result, [(region, reread)])
+    assert refined.text == result.text
+    assert refined.confidence > result.confidence
+    assert {r.text for r in find_regions(1, refined.annotation)} == BLURRED - {LINES[1]}
@@ -0,0 +1,42 @@
+# tests/test_service.py (ジョブの完了・失敗の記録)
+
+import time
+
+import pytest
+
+from kakeizu.service import KosekiService
+
+pytest.importorskip("dotenv")  # kakeizu.main / kakeizu.synthesize が読み込む
+
+
+def run_one(service, options):
+    job_id = service.queue.submit("a.pdf", options)
+    service.start()
+    try:
+        for _ in range(200):
+            job = service.queue.get(job_id)
+            if job["status"] in ("done", "failed"): return job
+            time.sleep(0.05)
+    finally:
+        service.stop(timeout=5)
+    raise AssertionError("ジョブが終わりませんでした")
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    from kakeizu import main
+    from kakeizu.fake_clients import FakeGenerativeModel
+    # OCRとページ解析は済んだが、解析済みのページJSONが1つもなかったことにする
+    monkeypatch.setattr(main, "process_document", lambda pdf_path, pages_dir, **kwargs: {1: {"status": "failed"}})
+    return KosekiService(jobs_dir=str(tmp_path / "jobs"), workers=1, ocr_backend=object(),
+                         model=FakeGenerativeModel(latency="constant:0"))
+
+
+def test_failed_ai_synthesis_fails_the_job(service):
+    job = run_one(service, {"synthesize": "ai"})
+    assert job["status"] == "failed" and "AIによる統合に失敗しました" in job["error"]
+
+
+def test_merge_without_pages_still_finishes(service):
+    job = run_one(service, {"synthesize": "merge"})
+    assert job["status"] == "done" and "merged" not in job["result"]
@@ -0,0 +1,118 @@
+# tests/test_stream_json.py (ストリーミング応答の逐次JSONパーサーと、届いた要素からの統合)
+
+import copy
+import json
+import random
+
+import pytest
+
+from kakeizu.page_merge import StreamMerger, merge_pages, normalize_name
+from kakeizu.stream_json import StreamingJsonParser, parse_stream
+from kakeizu.synthetic_koseki import generate_family, split_into_pages
+
+
+def chunked(text, sizes):
+    i = 0
+    for size in sizes:
+        yield text[i:i + size]; i += size
+    if i < len(text): yield text[i:]
+
+
+TRICKY = {
+    "persons": [
+        {"id": 1, "name": "山田 \"太郎\"", "gender": "M", "notes": "{括弧} と [角括弧] と \\ を含む"},
+        {"id": 2, "name": "山田 花子", "gender": "F", "notes": None, "extra": {"nested": [1, {"a": "}"}]}},
+    ],
+    "note": {"persons": "ここは配列ではない"},
+    "relationships": [{"source": 1, "target": 2, "type": "spouse"}],
+}
+
+
+@pytest.mark.parametrize("prefix", ["", "```json\n", "以下が結果です。\n```json\n"])
+def test_every_split_position_gives_the_same_items(prefix):
+    text = prefix + json.dumps(TRICKY, ensure_ascii=False) + ("\n```" if prefix else "")
+    for cut in range(1, len(text)):
+        data, complete = parse_stream([text[:cut], text[cut:]])
+        assert complete
+        assert data == {"persons": TRICKY["persons"], "relationships": TRICKY["relationships"]}
+
+
+def test_random_chunking_of_generated_data():
+    rng = random.Random(33)
+    expected = generate_family(200, seed=33)
+    text = json.dumps(expected, ensure_ascii=False, indent=rng.choice([None, 2]))
+    for _ in range(20):
+        data, complete = parse_stream(chunked(text, [rng.randint(1, 40) for _ in range(len(text))]))
+        assert complete and data == {"persons": expected["persons"], "relationships": expected["relationships"]}
+
+
+def test_items_are_emitted_as_soon_as_they_close():
+    parser = StreamingJsonParser()
+    assert parser.feed('{"persons": [{"id": 1, "name": "A"}, {"id": 2,') == [("persons", {"id": 1, "name": "A"})]
+    assert parser.feed(' "name": "B"}], "relationships": [') == [("persons", {"id": 2, "name": "B"})]
+    assert not parser.complete
+    assert parser.feed('{"source": 1, "target": 2, "type": "spouse"}]}') == [("relationships", {"source": 1, "target": 2, "type": "spouse"})]
+    assert parser.complete and parser.counts == {"persons": 2, "relationships": 1}
+    assert parser.feed('{"persons": [{"id": 3}]}') == []
+
+
+def test_truncated_stream_is_incomplete():
+    text = json.dumps(TRICKY, ensure_ascii=False)
+    data, complete = parse_stream([text[:text.index('"relationships"')]])
+    assert not complete and len(data["persons"]) == 2 and data["relationships"] == []
+
+
+def test_broken_stream_keeps_the_parsed_items():
+    def chunks():
+        yield '{"persons": [{"id": 1, "name": "A"}, {"id": 2'
+        raise ConnectionError("切断")
+
+    with pytest.raises(ConnectionError) as excinfo:
+        parse_stream(chunks())
+    assert excinfo.value.partial == {"persons": [{"id": 1, "name": "A"}], "relationships": []}
+
+
+def _names(data):
+    names = {p["id"]: normalize_name(p["name"]) for p in data["persons"]}
+    return ({names[p["id"]]: p.get("birth_date") for p in data["persons"]},
+            {(r["type"], names[r["source"]], names[r["target"]]) for r in data["relationships"]})
+
+
+def test_stream_merger_matches_merge_pages():
+    pages = split_into_pages(generate_family(150, seed=8), seed=8)
+    merged = merge_pages(copy.deepcopy(pages))
+    # 応答としては、関係性が人物より先に届く場合も含めて混ぜる
+    items = [("persons", p) for p in merged["persons"]] + [("relationships", r) for r in merged["relationships"]]
+    random.Random(8).shuffle(items)
+    merger = StreamMerger()
+    for kind, item in items: merger(kind, copy.deepcopy(item))
+    assert merger.waiting_relationships() == 0
+    assert _names(merger.to_dict()) == _names(merged)
+
+
+def test_stream_merger_keeps_same_name_persons_apart():
+    # 応答は名寄せ済みなので、同じ氏名でもIDが違えば別人（親子で同名の場合など）
+    merger = StreamMerger()
+    merger("persons", {"id": 1, "name": "山田 太郎", "gender": "M", "birth_date": "明治30年1月1日"})
+    merger("persons", {"id": 2, "name": "山田 太郎", "gender": "M", "birth_date": "大正10年2月2日"})
+    merger("relationships", {"source": 1, "target": 2, "type": "parent_child"})
+    merger("relationships", {"source": 2, "target": 2, "type": "parent_child"})
+    data = merger.to_dict()
+    assert [(p["id"], p["birth_date"]) for p in data["persons"]] == [(1, "明治30年1月1日"), (2, "大正10年2月2日")]
+    assert data["relationships"] == [{"source": 1, "target": 2, "type": "parent_child"}]
+    assert merger.self_loops == [{"source": 2, "target": 2, "type": "parent_child"}]
+
+
+def test_stream_merger_renumbers_ids_and_skips_invalid_items():
+    merger = StreamMerger()
+    merger("persons", {"id": 10, "name": "山田 太郎", "gender": "M"})
+    merger("relationships", {"source": 10, "target": 30, "type": "parent_child"})
+    merger("persons", {"id": 10, "name": "山田 次郎"})
+    merger("persons", {"id": 4, "name": ""})
+    merger("relationships", {"source": 10, "target": 30, "type": "friend"})
+    assert merger.waiting_relationships() == 1 and merger.invalid == 3
+    merger("persons", {"id": 30, "name": "山田 一郎"})
+    merger("relationships", {"source": 10, "target": 30, "type": "parent_child"})
+    data = merger.to_dict()
+    assert [(p["id"], p["name"]) for p in data["persons"]] == [(1, "山田 太郎"), (2, "山田 一郎")]
+    assert data["relationships"] == [{"source": 1, "target": 2, "type": "parent_child"}]
@@ -0,0 +1,61 @@
+# tests/test_subtree.py (一人を中心にした部分家系図と、家系データの索引の使い回し)
+
+import json
+import os
+
+from kakeizu import subtree
+from kakeizu.subtree import FamilyGraph, load_graph, clip_layout
+from kakeizu.synthetic_koseki import generate_family
+
+
+def family():
+    persons = [{"id": i, "name": name} for i, name in enumerate(["祖父 一", "祖母 ハナ", "父 太郎", "母 花子", "本人 次郎", "子 三郎", "孫 四郎"], 1)]
+    rels = [{"source": 1, "target": 2, "type": "spouse"}, {"source": 3, "target": 4, "type": "spouse"}]
+    rels += [{"source": s, "target": t, "type": "parent_child"} for s, t in [(1, 3), (2, 3), (3, 5), (4, 5), (5, 6), (6, 7)]]
+    return {"persons": persons, "relationships": rels}
+
+
+def write(path, data):
+    with open(path, "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False)
+
+
+def test_find_person_by_id_or_name():
+    graph = FamilyGraph(*family().values())
+    assert graph.find_person("5") == 5
+    assert graph.find_person("本人　次郎") == 5 and graph.find_person("本人次郎") == 5
+    assert graph.find_person("誰か") is None
+
+
+def test_focus_and_subgraph():
+    graph = FamilyGraph(*family().values())
+    assert graph.focus(5, up=1, down=1) == {3, 4, 5, 6}
+    assert graph.focus(5, up=None, down=0, spouses=False) == {1, 2, 3, 4, 5}
+    assert graph.focus(6, up=1, down=None, spouses=False) == {5, 6, 7}
+    sub = graph.subgraph({3, 4, 5})
+    assert [p["id"] for p in sub["persons"]] == [3, 4, 5]
+    assert {(r["source"], r["target"]) for r in sub["relationships"]} == {(3, 4), (3, 5), (4, 5)}
+
+
+def test_load_graph_reuses_the_index_until_the_file_changes(tmp_path, monkeypatch):
+    path = str(tmp_path / "merged.json")
+    write(path, family())
+    graph = load_graph(path)
+    assert load_graph(path) is graph
+
+    data = family(); data["persons"][0]["name"] = "曾祖父 一"
+    write(path, data)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+    changed = load_graph(path)
+    assert changed is not graph and changed.find_person("曾祖父一") == 1
+
+    monkeypatch.setattr(subtree, "MAX_CACHED_GRAPHS", 1)
+    other = str(tmp_path / "other.json")
+    write(other, generate_family(50, seed=1))
+    load_graph(other)
+    assert load_graph(path) is not changed
+
+
+def test_clip_layout():
+    positions = {1: (0, 0), 2: (1000, 0), 3: (5000, 5000)}
+    assert set(clip_layout(positions, (-10, -10, 1010, 10))) == {1, 2}
+    assert clip_layout(positions, (20000, 20000, 30000, 30000)) == {}